@@ -0,0 +1,271 @@
+"""Apply transactions in parallel while respecting their dependencies
+
+Schedulers take Transaction objects in binlog order and run an apply
+coroutine on several of them at once when they can not conflict.
+"""
+import asyncio
+import collections
+
+from .event import QueryEvent
+from .row_event import RowsEvent, UpdateRowsEvent
+
+
+__all__ = ['LogicalClockScheduler', 'WritesetScheduler']
+
+
+class _Scheduler(object):
+
+    def __init__(self, apply, *, workers=4, loop):
+        self._apply = apply
+        self._workers = workers
+        self._loop = loop
+        self._cond = asyncio.Condition(loop=loop)
+        self._running = 0
+        # scheduled transactions in binlog order with their done flag
+        self._order = collections.deque()
+        self._error = None
+        self.committed_position = None
+
+    def _prepare(self, transaction):
+        pass
+
+    def _can_start(self, transaction):
+        raise NotImplementedError()
+
+    def _started(self, transaction):
+        pass
+
+    def _finished(self, transaction):
+        pass
+
+    def _check_error(self):
+        if self._error is not None:
+            raise self._error
+
+    @asyncio.coroutine
+    def schedule(self, transaction):
+        """Start applying transaction, wait while it depends on
+        transactions in progress or all workers are busy"""
+        self._prepare(transaction)
+        yield from self._cond.acquire()
+        try:
+            while True:
+                self._check_error()
+                if (self._running < self._workers
+                        and self._can_start(transaction)):
+                    break
+                yield from self._cond.wait()
+            self._running += 1
+            entry = [transaction, False]
+            self._order.append(entry)
+            self._started(transaction)
+        finally:
+            self._cond.release()
+        self._loop.create_task(self._run(entry))
+
+    @asyncio.coroutine
+    def _run(self, entry):
+        transaction = entry[0]
+        applied = False
+        try:
+            yield from self._apply(transaction)
+            applied = True
+        except Exception as error:
+            if self._error is None:
+                self._error = error
+        yield from self._cond.acquire()
+        try:
+            self._running -= 1
+            # a failed transaction stays not done, committed_position never
+            # moves past it
+            entry[1] = applied
+            self._finished(transaction)
+            while self._order and self._order[0][1]:
+                done, _ = self._order.popleft()
+                self.committed_position = (done.log_file, done.end_pos)
+            self._cond.notify_all()
+        finally:
+            self._cond.release()
+
+    @asyncio.coroutine
+    def join(self):
+        """Wait until the scheduled transactions are applied, raise the
+        first error of apply"""
+        yield from self._cond.acquire()
+        try:
+            while self._running:
+                yield from self._cond.wait()
+        finally:
+            self._cond.release()
+        self._check_error()
+
+    @asyncio.coroutine
+    def run(self, transactions):
+        """Schedule every transaction of a TransactionReader until its end"""
+        while True:
+            transaction = yield from transactions.fetchone()
+            if transaction is None:
+                break
+            yield from self.schedule(transaction)
+        yield from self.join()
+
+
+class LogicalClockScheduler(_Scheduler):
+    """Parallel apply following the logical clock written by MySQL 5.7+
+
+    A transaction starts once every transaction of its binlog file with a
+    sequence_number up to its last_committed is applied, like a multi
+    threaded MySQL slave with slave_parallel_type=LOGICAL_CLOCK.
+    Transactions without logical clock are applied alone.
+
+    committed_position is the end of the last transaction applied with
+    every transaction before it.
+    """
+
+    def __init__(self, apply, *, workers=4, loop):
+        """
+        Attributes:
+        apply: Coroutine function applying a Transaction
+        workers: Maximum number of transactions applied at once
+        """
+        super().__init__(apply, workers=workers, loop=loop)
+        self._clock_file = None
+        self._last_sequence_number = None
+        # highest sequence number applied with all the ones below it
+        self._low_water_mark = 0
+        self._applied = set()
+        self._exclusive = False
+
+    def _new_clock(self, transaction):
+        # sequence numbers restart with every binlog file
+        return (transaction.log_file != self._clock_file
+                or transaction.sequence_number <= self._last_sequence_number)
+
+    def _can_start(self, transaction):
+        if self._exclusive:
+            return False
+        if (transaction.sequence_number is None
+                or self._new_clock(transaction)):
+            return self._running == 0
+        return transaction.last_committed <= self._low_water_mark
+
+    def _started(self, transaction):
+        if transaction.sequence_number is None:
+            self._exclusive = True
+            return
+        if self._new_clock(transaction):
+            self._clock_file = transaction.log_file
+            # a stream may start in the middle of a file, transactions
+            # before the first one seen are applied already
+            self._low_water_mark = transaction.sequence_number - 1
+            self._applied = set()
+        self._last_sequence_number = transaction.sequence_number
+
+    def _finished(self, transaction):
+        if transaction.sequence_number is None:
+            self._exclusive = False
+            return
+        if transaction.log_file != self._clock_file:
+            return
+        self._applied.add(transaction.sequence_number)
+        while self._low_water_mark + 1 in self._applied:
+            self._low_water_mark += 1
+            self._applied.remove(self._low_water_mark)
+
+
+def _row_key(schema, table, primary_key, values):
+    if not primary_key:
+        # without primary key any row may conflict with any other
+        return hash((schema, table))
+    if isinstance(primary_key, tuple):
+        key = (schema, table) + tuple(values.get(k) for k in primary_key)
+    else:
+        key = (schema, table, values.get(primary_key))
+    return hash(repr(key))
+
+
+class WritesetScheduler(_Scheduler):
+    """Parallel apply of transactions touching different rows
+
+    The writeset of a transaction is the set of hashes of (schema, table,
+    primary key) of the rows it changes, before and after the change for
+    updates. A transaction starts once its writeset does not intersect the
+    writesets of the transactions in progress, so conflicting transactions
+    are applied in binlog order. Rows of tables without primary key conflict
+    with every change of their table. Transactions with statements, like
+    DDL, or with more than max_writeset_size rows are applied alone.
+
+    The stream must keep the rows of RowsEvent, writesets are computed
+    from the decoded rows. committed_position is the end of the last
+    transaction applied with every transaction before it.
+    """
+
+    def __init__(self, apply, *, workers=4, max_writeset_size=10000, loop):
+        """
+        Attributes:
+        apply: Coroutine function applying a Transaction
+        workers: Maximum number of transactions applied at once
+        max_writeset_size: Number of row hashes above which a transaction
+            is applied alone
+        """
+        super().__init__(apply, workers=workers, loop=loop)
+        self._max_writeset_size = max_writeset_size
+        # writeset by id of scheduled transaction, None to apply it alone
+        self._writesets = {}
+        # number of transactions in progress by row hash
+        self._window = collections.Counter()
+        self._exclusive = False
+
+    def writeset(self, transaction):
+        """Return the set of row hashes of transaction, None when it must be
+        applied alone"""
+        writeset = set()
+        for event in transaction:
+            if isinstance(event, QueryEvent):
+                if event.query not in ('BEGIN', 'COMMIT', 'ROLLBACK'):
+                    return None
+                continue
+            if not isinstance(event, RowsEvent):
+                continue
+            keys = event.primary_key
+            for row in event.rows:
+                if isinstance(event, UpdateRowsEvent):
+                    writeset.add(_row_key(event.schema, event.table, keys,
+                                          row["before_values"]))
+                    writeset.add(_row_key(event.schema, event.table, keys,
+                                          row["after_values"]))
+                else:
+                    writeset.add(_row_key(event.schema, event.table, keys,
+                                          row["values"]))
+            if len(writeset) > self._max_writeset_size:
+                return None
+        return writeset
+
+    def _prepare(self, transaction):
+        self._writesets[id(transaction)] = self.writeset(transaction)
+
+    def _can_start(self, transaction):
+        if self._exclusive:
+            return False
+        writeset = self._writesets[id(transaction)]
+        if writeset is None:
+            return self._running == 0
+        window = self._window
+        return not any(window[h] for h in writeset)
+
+    def _started(self, transaction):
+        writeset = self._writesets[id(transaction)]
+        if writeset is None:
+            self._exclusive = True
+        else:
+            self._window.update(writeset)
+
+    def _finished(self, transaction):
+        writeset = self._writesets.pop(id(transaction))
+        if writeset is None:
+            self._exclusive = False
+        else:
+            self._window.subtract(writeset)
+            for h in writeset:
+                if not self._window[h]:
+                    del self._window[h]
@@ -0,0 +1,192 @@
+"""Decode many binlog files at once in worker processes
+
+Files are cut into segments at transaction boundaries found by their
+index, every segment is decoded by a BinLogFileReader in a process of an
+executor and its events come back pickled. Segments are merged back in
+binlog order, or delivered as soon as they are decoded when only the
+order inside each file matters.
+"""
+import asyncio
+import collections
+import os
+
+from .binlogfile import BinLogFileReader
+from .index import load_index
+from .utils import PY_35
+
+
+__all__ = ['Backfill', 'BackfillSegment', 'plan_segments']
+
+
+BackfillSegment = collections.namedtuple('BackfillSegment',
+                                         'path start end')
+BackfillSegment.__doc__ = """Part of a binlog file decoded by one task
+
+    path: Path of the binlog file
+    start: Offset of the first event
+    end: Offset where the segment ends, None for the end of the file
+    """
+
+
+def plan_segments(paths, segment_size, *, write_index=True):
+    """Cut the binlog files at paths into segments of about segment_size
+    bytes ending at transaction boundaries"""
+    segments = []
+    for path in paths:
+        index = load_index(path, write=write_index)
+        start = 4
+        for entry in index.entries:
+            if entry.end - start >= segment_size:
+                segments.append(BackfillSegment(path, start, entry.end))
+                start = entry.end
+        segments.append(BackfillSegment(path, start, None))
+    return segments
+
+
+@asyncio.coroutine
+def _read_segment(segment, reader_kwargs, loop):
+    reader = BinLogFileReader(
+        [segment.path], log_file=os.path.basename(segment.path),
+        log_pos=segment.start, end_pos=segment.end, loop=loop,
+        **reader_kwargs)
+    try:
+        yield from reader._connect()
+        events = []
+        while True:
+            event = yield from reader.fetchone()
+            if event is None:
+                return events
+            events.append(event)
+    finally:
+        reader.close()
+
+
+def _decode_segment(segment, reader_kwargs):
+    # runs in a worker process
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(
+            _read_segment(segment, reader_kwargs, loop))
+    finally:
+        loop.close()
+
+
+class Backfill(object):
+    """Read binlog files with segments decoded in parallel by executor
+
+    fetchone returns (log_file, event) tuples. With ordered, events come
+    in binlog order across files. Without, segments of different files
+    are interleaved as they are decoded, events of one file keep their
+    order.
+
+    Reader keyword arguments go to the worker processes, they must be
+    picklable: table_information must be a module level coroutine
+    function, snapshot a path.
+    """
+
+    def __init__(self, files, executor, *, ordered=True,
+                 segment_size=16 * 1024 * 1024, max_pending=8, loop,
+                 **kwargs):
+        """
+        Attributes:
+        files: Paths of binlog files in binlog order
+        executor: concurrent.futures executor, usually a
+                  ProcessPoolExecutor, decoding the segments
+        ordered: Deliver events in binlog order across files
+        segment_size: Approximate bytes of binlog decoded by one task
+        max_pending: Maximum number of segments decoded ahead of the
+                     consumer
+        Other keyword arguments are passed to BinLogFileReader.
+        """
+        self._files = list(files)
+        self._executor = executor
+        self._ordered = ordered
+        self._segment_size = segment_size
+        self._max_pending = max_pending
+        self._loop = loop
+        self._reader_kwargs = kwargs
+        self._segments = None
+        # futures of submitted segments by path, in binlog order
+        self._pending = collections.OrderedDict()
+        self._pending_count = 0
+        # events of the segment being delivered
+        self._current = collections.deque()
+        self._current_file = None
+
+    def _plan(self):
+        # reading the indexes is disk bound, done in the default executor
+        return self._loop.run_in_executor(
+            None, plan_segments, self._files, self._segment_size)
+
+    def _submit(self):
+        while (self._segments and
+               self._pending_count < self._max_pending):
+            segment = self._segments.popleft()
+            future = self._loop.run_in_executor(
+                self._executor, _decode_segment, segment,
+                self._reader_kwargs)
+            self._pending.setdefault(segment.path, collections.deque()) \
+                .append(future)
+            self._pending_count += 1
+
+    def _pop(self, path):
+        futures = self._pending[path]
+        future = futures.popleft()
+        if not futures:
+            del self._pending[path]
+        self._pending_count -= 1
+        return future
+
+    @asyncio.coroutine
+    def _next_segment(self):
+        """Return (path, events) of the next segment, None at the end"""
+        self._submit()
+        if not self._pending:
+            return None
+        if self._ordered:
+            path = next(iter(self._pending))
+            events = yield from self._pending[path][0]
+            self._pop(path)
+            return path, events
+
+        heads = [futures[0] for futures in self._pending.values()]
+        done, _ = yield from asyncio.wait(
+            heads, return_when=asyncio.FIRST_COMPLETED, loop=self._loop)
+        # oldest file first among the decoded ones
+        path = next(path for path, futures in self._pending.items()
+                    if futures[0] in done)
+        return path, self._pop(path).result()
+
+    @asyncio.coroutine
+    def fetchone(self):
+        """Return next (log_file, event), None after the last file"""
+        if self._segments is None:
+            self._segments = collections.deque((yield from self._plan()))
+        while not self._current:
+            segment = yield from self._next_segment()
+            if segment is None:
+                return None
+            path, events = segment
+            self._current_file = os.path.basename(path)
+            self._current.extend(events)
+        return self._current_file, self._current.popleft()
+
+    if PY_35:
+        def __aiter__(self):
+            return self
+
+        @asyncio.coroutine
+        def __anext__(self):
+            item = yield from self.fetchone()
+            if item is None:
+                raise StopAsyncIteration  # noqa
+            return item
+
+    def close(self):
+        for futures in self._pending.values():
+            for future in futures:
+                future.cancel()
+        self._pending.clear()
+        self._pending_count = 0
+        self._segments = collections.deque()
+        self._current.clear()
@@ -0,0 +1,255 @@
+import asyncio
+import mmap
+import os
+import struct
+
+from .binlogstream import BinLogStreamReader, _ControlConnection
+from .consts import BinLog
+from .packet import RawPacket
+from .snapshot import read_snapshot
+
+
+__all__ = ['create_binlog_file_reader', 'BinLogFileReader']
+
+BINLOG_MAGIC = b'\xfebin'
+
+# timestamp (4) event_type (1) server_id (4) event_size (4) log_pos (4)
+# flags (2)
+EVENT_HEADER_SIZE = 19
+EVENT_TYPE_OFFSET = 4
+EVENT_SIZE_OFFSET = 9
+# binlog_version (2) then server_version (50) in a format description event
+SERVER_VERSION_OFFSET = EVENT_HEADER_SIZE + 2
+SERVER_VERSION_LENGTH = 50
+# format description events of MySQL 5.6.1+ end with the checksum
+# algorithm (1) and the checksum (4)
+CHECKSUM_VERSION = (5, 6, 1)
+CHECKSUM_ALG_CRC32 = 1
+
+# answer of _read_packet after the last event of the last file
+_EOF_PACKET = b'\xfe\x00\x00\x00\x00'
+
+# events read between two switches to other tasks of the loop
+_YIELD_EVERY = 1000
+
+
+def create_binlog_file_reader(*args, **kwargs):
+    reader = BinLogFileReader(*args, **kwargs)
+    yield from reader._connect()
+    return reader
+
+
+def _server_version(event):
+    version = event[SERVER_VERSION_OFFSET:
+                    SERVER_VERSION_OFFSET + SERVER_VERSION_LENGTH]
+    version = version.split(b'\0', 1)[0].split(b'-', 1)[0]
+    numbers = []
+    for part in version.split(b'.'):
+        digits = b''
+        for c in part:
+            if not 0x30 <= c <= 0x39:
+                break
+            digits += bytes([c])
+        if not digits:
+            break
+        numbers.append(int(digits))
+    return tuple(numbers)
+
+
+def _is_format_description(event):
+    return event[EVENT_TYPE_OFFSET] == BinLog.FORMAT_DESCRIPTION_EVENT
+
+
+def _checksum_enabled(format_description_event):
+    """Return True if the events following a format description event end
+    with a CRC32 checksum"""
+    if _server_version(format_description_event) < CHECKSUM_VERSION:
+        return False
+    return format_description_event[-5] == CHECKSUM_ALG_CRC32
+
+
+class _BinLogFiles(object):
+    """Events of binlog files read in turn through memory maps"""
+
+    def __init__(self, paths, start_offset, end_offset=None):
+        self._paths = list(paths)
+        self._index = -1
+        self._start_offset = start_offset
+        self._end_offset = end_offset
+        self._file = None
+        self._map = None
+        self._offset = 0
+        # size of the file being read, or offset to stop at in the last one
+        self._size = 0
+        self.path = None
+        self.use_checksum = False
+
+    def _open_next(self):
+        self.close()
+        self._index += 1
+        if self._index >= len(self._paths):
+            return False
+        path = self._paths[self._index]
+        self._file, self._map = self._open(path)
+        if self._map[:len(BINLOG_MAGIC)] != BINLOG_MAGIC:
+            self.close()
+            raise ValueError("%s is not a binlog file" % path)
+        self.path = path
+
+        self.use_checksum = False
+        offset = len(BINLOG_MAGIC)
+        self._size = len(self._map)
+        event = self._event_at(offset)
+        if event is not None and _is_format_description(event):
+            # also known when the file is not read from its start
+            self.use_checksum = _checksum_enabled(event)
+        if self._start_offset is not None:
+            offset, self._start_offset = self._start_offset, None
+        self._offset = offset
+        if (self._end_offset is not None
+                and self._index == len(self._paths) - 1):
+            self._size = min(self._size, self._end_offset)
+        return True
+
+    def _open(self, path):
+        """Return the file at path and its content, any object supporting
+        len and slices"""
+        f = open(path, 'rb')
+        try:
+            return f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty file
+            return f, b''
+
+    def _event_at(self, offset):
+        if offset + EVENT_HEADER_SIZE > self._size:
+            return None
+        header = self._map[offset:offset + EVENT_HEADER_SIZE]
+        size, = struct.unpack_from('<I', header, EVENT_SIZE_OFFSET)
+        if size < EVENT_HEADER_SIZE or offset + size > self._size:
+            # event still being written
+            return None
+        return self._map[offset:offset + size]
+
+    def read_event(self):
+        """Return the bytes of the next event, None after the last one"""
+        while True:
+            if self._map is not None:
+                event = self._event_at(self._offset)
+                if event is not None:
+                    self._offset += len(event)
+                    if _is_format_description(event):
+                        self.use_checksum = _checksum_enabled(event)
+                    return event
+            if not self._open_next():
+                return None
+
+    def close(self):
+        if self._map is not None and not isinstance(self._map, bytes):
+            self._map.close()
+        self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class BinLogFileReader(BinLogStreamReader):
+    """Read events from local binlog or relay log files
+
+    Files are memory mapped and read in the given order, their events are
+    decoded like the ones of a replication stream and fetchone returns
+    None after the last event of the last file. There is no server to
+    query column schemas, they come from schema_cache, snapshot or the
+    table_information coroutine function.
+
+    Like for a stream, log_pos is the position written in the event
+    headers, which is the offset in the file for binlog files but a
+    position of the master for relay logs.
+    """
+
+    _files_class = _BinLogFiles
+
+    def __init__(self, files, *, table_information=None, snapshot=None,
+                 log_file=None, log_pos=None, end_pos=None, loop, **kwargs):
+        """
+        Attributes:
+        files: Paths of binlog files in binlog order
+        table_information: Coroutine function (schema, table) returning
+                           information_schema.columns rows of the table,
+                           see BinLogStreamReader
+        snapshot: Path of a snapshot_file written by a BinLogStreamReader,
+                  its schema cache is used, the file is not written
+        log_file: Name of the file of files to start with
+        log_pos: Offset of the first event read in log_file
+        end_pos: Offset in the last file where reading stops
+        Other keyword arguments are passed to BinLogStreamReader, the ones
+        about the connection to the master do not apply.
+        """
+        super().__init__({}, 0, blocking=False, log_file=log_file,
+                         log_pos=log_pos, loop=loop, **kwargs)
+        self._files = list(files)
+        self._end_pos = end_pos
+        self._table_information = table_information
+        self._schema_snapshot = snapshot
+        self._packets_read = 0
+
+    @asyncio.coroutine
+    def _connect_to_stream(self):
+        if self._schema_snapshot is not None:
+            snapshot = read_snapshot(self._schema_snapshot)
+            if snapshot is not None:
+                self._schema_cache.update_from_data(
+                    snapshot.schema_cache.serializable_data())
+            self._schema_snapshot = None
+
+        paths, start_offset = self._start_files()
+        self._stream_connection = self._files_class(paths, start_offset,
+                                                    self._end_pos)
+        self._connected_stream = True
+
+    def _start_files(self):
+        """Return the paths of the files to read and the offset of the
+        first event in the first one, None for its start"""
+        if self.log_file is None:
+            return self._files, None
+        names = [os.path.basename(path) for path in self._files]
+        if self.log_file not in names:
+            raise ValueError("%s is not in files" % self.log_file)
+        return self._files[names.index(self.log_file):], self.log_pos
+
+    @asyncio.coroutine
+    def _connect_to_ctl(self):
+        self._ctl_connection = _ControlConnection(
+            None, "utf8", self._get_table_information)
+        self._connected_ctl = True
+
+    @asyncio.coroutine
+    def _query_table_information(self, schema, table):
+        if self._table_information is None:
+            raise ValueError("No column schemas for %s.%s, give a snapshot "
+                             "or table_information" % (schema, table))
+        return (yield from self._table_information(schema, table))
+
+    @asyncio.coroutine
+    def _read_packet(self):
+        files = self._stream_connection
+        self._packets_read += 1
+        if self._packets_read % _YIELD_EVERY == 0:
+            # reading a file never waits, let other tasks run
+            yield from asyncio.sleep(0, loop=self._loop)
+
+        path = files.path
+        event = files.read_event()
+        if event is None:
+            return RawPacket(_EOF_PACKET)
+        if files.path != path:
+            self._file_changed(files.path)
+        self._use_checksum = files.use_checksum
+        return RawPacket(b'\0' + event)
+
+    def _file_changed(self, path):
+        # table ids are only valid in their file
+        self.log_file = os.path.basename(path)
+        self.table_map = {}
+        self._table_decisions = {}
+        self._table_descriptors = {}
@@ -1,4 +1,7 @@
 import asyncio
+import collections
+import random
+import time
 
 import struct
 import aiomysql
@@ -6,16 +9,26 @@ import aiomysql
 from pymysql.constants.COMMAND import COM_BINLOG_DUMP
 from pymysql.constants.COMMAND import COM_BINLOG_DUMP_GTID
 
-from .packet import BinLogPacketWrapper
+from .packet import (
+    BinLogPacketWrapper, ROWS_EVENT_TYPES, peek_event_type, peek_log_pos,
+    peek_table_id, peek_timestamp)
+from .checkpoint import Checkpoint, Checkpointer
 from .consts import BinLog
+from .filters import TableFilter
 from .gtid import GtidSet
+from .parallel import decode_rows, table_descriptor
+from .readahead import ReadAheadBuffer
 from .event import (
     QueryEvent, RotateEvent, FormatDescriptionEvent,
-    XidEvent, GtidEvent, StopEvent, NotImplementedEvent)
+    XidEvent, GtidEvent, StopEvent, HeartbeatLogEvent, NotImplementedEvent)
 from .row_event import (
-    UpdateRowsEvent, WriteRowsEvent, DeleteRowsEvent, TableMapEvent)
+    RowsEvent, UpdateRowsEvent, WriteRowsEvent, DeleteRowsEvent,
+    TableMapEvent)
+from .schema import SchemaCache, ddl_tables
+from .snapshot import Snapshot, read_snapshot, write_snapshot
+from .transaction import _TransactionBoundaries
 
-from .utils import int2byte
+from .utils import PY_35, int2byte
 
 __all__ = ['create_binlog_stream', 'BinLogStreamReader']
 
@@ -24,6 +37,22 @@ __all__ = ['create_binlog_stream', 'BinLogStreamReader']
 MYSQL_EXPECTED_ERROR_CODES = [2013, 2006]
 
 
+class _ControlConnection(object):
+    """Control side handed over to events: connection charset and table
+    information lookups served from a pool of information_schema
+    connections
+    """
+
+    def __init__(self, pool, charset, get_table_information):
+        self.pool = pool
+        self.charset = charset
+        self._get_table_information = get_table_information
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+
+
 def create_binlog_stream(*args, **kwargs):
     reader = BinLogStreamReader(*args, **kwargs)
     yield from reader._connect()
@@ -32,14 +61,24 @@ def create_binlog_stream(*args, **kwargs):
 
 class BinLogStreamReader(object):
     """Connect to replication stream and read event
+
+    Events are read with fetchone, in batches with fetchmany or, on
+    Python 3.5+, with ``async for event in reader``.
     """
 
     def __init__(self, connection_settings, server_id, *, resume_stream=False,
                  blocking=True, only_events=None, log_file=None, log_pos=None,
                  filter_non_implemented_events=True,
                  ignored_events=None, auto_position=None,
-                 only_tables=None, only_schemas=None,
-                 freeze_schema=False, loop):
+                 only_tables=None, only_schemas=None, table_filter=None,
+                 freeze_schema=False, schema_cache=None, snapshot_file=None,
+                 snapshot_interval=10.0, ctl_pool_size=2, read_ahead=None,
+                 read_ahead_bytes=None, decode_executor=None,
+                 decode_window=64, checkpoint_store=None,
+                 checkpoint_events=1000, checkpoint_interval=1.0,
+                 reconnect_attempts=10, reconnect_delay=0.1,
+                 reconnect_max_delay=10.0, heartbeat_period=None,
+                 heartbeat_timeout=None, spool=None, loop):
         """
         Attributes:
         resume_stream: Start for event from position or the latest event of
@@ -49,10 +88,52 @@ class BinLogStreamReader(object):
         ignored_events: Array of ignored events
         log_file: Set replication start log file
         log_pos: Set replication start log pos
-        auto_position: Use master_auto_position gtid to set position
+        auto_position: Use master_auto_position gtid to set position, a
+                       GTID set string or GtidSet, the transactions read
+                       are added to gtid_executed and checkpoints save it
         only_tables: An array with the tables you want to watch
         only_schemas: An array with the schemas you want to watch
+        table_filter: TableFilter with include/exclude patterns, replaces
+                      only_tables and only_schemas
         freeze_schema: If true do not support ALTER TABLE. It's faster.
+        schema_cache: SchemaCache with information_schema rows, can be
+                      shared between readers
+        snapshot_file: Path of a snapshot with table metadata and the
+                       position after the last transaction delivered,
+                       loaded on connect and rewritten periodically
+        snapshot_interval: Seconds between two snapshot writes
+        ctl_pool_size: Number of control connections used for concurrent
+                       information_schema lookups
+        read_ahead: Read up to this number of packets ahead of the consumer
+                    in a background task
+        read_ahead_bytes: Read up to this number of bytes ahead of the
+                          consumer in a background task
+        decode_executor: concurrent.futures executor, usually a
+                         ProcessPoolExecutor, decoding rows of rows events
+                         in parallel. Events are still returned in binlog
+                         order with their rows already decoded.
+        decode_window: Maximum number of events read ahead of the consumer
+                       while rows are decoded by decode_executor
+        checkpoint_store: CheckpointStore the position is resumed from on
+                          connect and saved to at transaction boundaries.
+                          A transaction counts as processed once all its
+                          events were returned and the next fetch starts.
+        checkpoint_events: Save the checkpoint after this number of
+                           processed events
+        checkpoint_interval: Seconds a processed position may wait before
+                             it is saved
+        reconnect_attempts: Consecutive attempts to reconnect the
+                            replication connection after it was lost, 0 to
+                            raise the error instead
+        reconnect_delay: Base of the exponential backoff between attempts
+        reconnect_max_delay: Maximum seconds between two attempts
+        heartbeat_period: Seconds without events after which the master
+                          sends a heartbeat
+        heartbeat_timeout: Seconds without any packet after which the
+                           replication connection is considered dead and
+                           reconnected, should exceed heartbeat_period
+        spool: Spool the raw events read are appended to, to replay them
+               later with a SpoolReader
         """
         self._connection_settings = connection_settings
         self._connection_settings["charset"] = "utf8"
@@ -62,29 +143,119 @@ class BinLogStreamReader(object):
         self._resume_stream = resume_stream
         self._blocking = blocking
 
-        self._only_tables = only_tables
-        self._only_schemas = only_schemas
+        if only_tables is not None or only_schemas is not None:
+            if table_filter is not None:
+                raise ValueError("table_filter can not be combined with "
+                                 "only_tables or only_schemas")
+            table_filter = TableFilter.from_names(only_tables, only_schemas)
+        self._table_filter = table_filter
         self._freeze_schema = freeze_schema
         self._allowed_events = self._allowed_event_list(
             only_events, ignored_events, filter_non_implemented_events)
 
         # We can't filter on packet level TABLE_MAP and rotate event because
         # we need them for handling other operations
+        # QueryEvent and XidEvent mark the transaction boundaries used for
+        # checkpoints and reconnects, GtidEvent updates gtid_executed
         self._allowed_events_in_packet = frozenset(
-            [TableMapEvent, RotateEvent]).union(self._allowed_events)
+            [TableMapEvent, RotateEvent, QueryEvent, XidEvent, GtidEvent,
+             HeartbeatLogEvent]).union(self._allowed_events)
 
         self._server_id = server_id
         self._use_checksum = False
 
         # Store table meta information
         self.table_map = {}
+        # Filter decision for table ids of the current binlog file, events
+        # of rejected tables are dropped by looking at the header only
+        self._table_decisions = {}
+        self._schema_cache = (schema_cache if schema_cache is not None
+                              else SchemaCache())
         self.log_pos = log_pos
         self.log_file = log_file
         self.auto_position = auto_position
         self._loop = loop
 
+        self._ctl_pool_size = ctl_pool_size
+        # table map loads started but not awaited yet, see fetchone
+        self._pending_table_loads = []
+        # read interrupted by fetchmany timeout, resumed by next fetch
+        self._pending_fetch = None
+        self._read_ahead_packets = read_ahead
+        self._read_ahead_bytes = read_ahead_bytes
+        self._read_ahead = None
+
+        self._decode_executor = decode_executor
+        self._decode_window_size = decode_window
+        # events in binlog order with the future of their decoded rows
+        self._decode_window = collections.deque()
+        self._decode_read = None
+        self._decode_eof = False
+        self._table_descriptors = {}
+
+        self._snapshot_file = snapshot_file
+        self._snapshot_interval = snapshot_interval
+        self._snapshot_loaded = False
+        self._last_snapshot_time = None
+
+        self._checkpoint_store = checkpoint_store
+        self._checkpoint_loaded = False
+        self._checkpointer = None
+        if checkpoint_store is not None:
+            self._checkpointer = Checkpointer(
+                checkpoint_store, max_events=checkpoint_events,
+                interval=checkpoint_interval, loop=loop)
+        # events returned by _read_event and to the consumer, transaction
+        # boundaries are tagged with the former and saved once the latter
+        # caught up
+        self._events_read = 0
+        self._events_delivered = 0
+        self._boundaries = collections.deque()
+        self._last_checkpoint_seq = 0
+
+        # transactions read up to the last boundary and the ones delivered,
+        # saved by checkpoints and snapshots. Only known when the stream
+        # starts from auto_position.
+        self._gtid_executed = None
+        self._gtid_delivered = None
+        # position after the last transaction delivered, saved by snapshots
+        self._delivered_file = None
+        self._delivered_pos = None
+        # GTID of the transaction being read
+        self._pending_gtid = None
+        self._transactions = _TransactionBoundaries()
+
+        self._reconnect_attempts = reconnect_attempts
+        self._reconnect_delay = reconnect_delay
+        self._reconnect_max_delay = reconnect_max_delay
+        # position after the last transaction read, the stream is dumped
+        # again from there after a reconnect, or from gtid_executed with
+        # auto_position. None before the first one, the initial dump is
+        # repeated then.
+        self._boundary_file = None
+        self._boundary_pos = None
+        # events returned since the boundary, skipped when dumped again
+        self._events_since_boundary = 0
+        self._skip_events = 0
+        self._replaying = False
+
+        self._heartbeat_period = heartbeat_period
+        self._heartbeat_timeout = heartbeat_timeout
+        # creation time of the last event read and whether a heartbeat
+        # told there was nothing newer, see lag_seconds
+        self._last_event_timestamp = None
+        self._caught_up = False
+
+        self._spool = spool
+
     @asyncio.coroutine
     def _connect(self):
+        if (self._checkpoint_store is not None
+                and not self._checkpoint_loaded):
+            self._load_checkpoint()
+        if self._snapshot_file is not None and not self._snapshot_loaded:
+            self._load_snapshot()
+
         if not self._connected_stream:
             yield from self._connect_to_stream()
 
@@ -92,6 +263,28 @@ class BinLogStreamReader(object):
             yield from self._connect_to_ctl()
 
     def close(self):
+        if self._snapshot_file is not None and self._snapshot_loaded:
+            self.write_snapshot()
+        if self._checkpointer is not None:
+            self._checkpointer.flush()
+        if self._spool is not None:
+            self._spool.flush()
+        for load in self._pending_table_loads:
+            load.cancel()
+        self._pending_table_loads = []
+        if self._pending_fetch is not None:
+            self._pending_fetch.cancel()
+            self._pending_fetch = None
+        if self._decode_read is not None:
+            self._decode_read.cancel()
+            self._decode_read = None
+        for event, future in self._decode_window:
+            if future is not None:
+                future.cancel()
+        self._decode_window.clear()
+        if self._read_ahead is not None:
+            self._read_ahead.close()
+            self._read_ahead = None
         if self._connected_stream:
             self._stream_connection.close()
             self._connected_stream = False
@@ -102,14 +295,125 @@ class BinLogStreamReader(object):
             self._ctl_connection.close()
             self._connected_ctl = False
 
+    def _load_checkpoint(self):
+        self._checkpoint_loaded = True
+        checkpoint = self._checkpoint_store.load()
+        if checkpoint is None:
+            return
+        # explicit start position wins over the checkpoint
+        if self.log_file is not None or self.auto_position is not None:
+            return
+        if checkpoint.gtid_set is not None:
+            # a GtidSet, used as is without parsing its text form
+            self.auto_position = checkpoint.gtid_set
+        else:
+            self.log_file = checkpoint.log_file
+            self.log_pos = checkpoint.log_pos
+            self._resume_stream = True
+
+    @property
+    def gtid_executed(self):
+        """GtidSet of auto_position and the transactions read since, up to
+        the last transaction boundary. None without auto_position."""
+        return self._gtid_executed
+
+    def _add_boundary(self, returned, gtid):
+        # position after a committed transaction, safe once the events read
+        # up to it, itself included when returned, were delivered
+        seq = self._events_read + (1 if returned else 0)
+        self._boundaries.append((seq, self.log_file, self.log_pos, gtid))
+
+    def _track_boundaries(self):
+        return (self._checkpointer is not None or
+                self._snapshot_file is not None)
+
+    def _boundaries_delivered(self, processed):
+        """Checkpoint and snapshot transactions whose events are within the
+        processed events, the ones returned before the current fetch
+        started"""
+        if not self._boundaries:
+            return
+        boundary = None
+        while self._boundaries and self._boundaries[0][0] <= processed:
+            boundary = self._boundaries.popleft()
+            gtid = boundary[3]
+            if gtid is not None and self._gtid_delivered is not None:
+                self._gtid_delivered.add(gtid)
+        if boundary is None:
+            return
+        seq, log_file, log_pos, _ = boundary
+        self._delivered_file = log_file
+        self._delivered_pos = log_pos
+        self._maybe_write_snapshot()
+        if self._checkpointer is None:
+            return
+        gtid_set = None
+        if self._gtid_delivered is not None:
+            # the checkpoint keeps its own copy, encoded once when saved
+            gtid_set = self._gtid_delivered.copy()
+        self._checkpointer.add(Checkpoint(log_file, log_pos, gtid_set),
+                               events=seq - self._last_checkpoint_seq)
+        self._last_checkpoint_seq = seq
+
+    def _load_snapshot(self):
+        self._snapshot_loaded = True
+        self._last_snapshot_time = self._loop.time()
+        snapshot = read_snapshot(self._snapshot_file)
+        if snapshot is None:
+            return
+        self._schema_cache.update_from_data(
+            snapshot.schema_cache.serializable_data())
+        # explicit start position wins over the one stored in snapshot
+        if (self.log_file is None and self.auto_position is None
+                and snapshot.log_file is not None):
+            self.log_file = snapshot.log_file
+            self.log_pos = snapshot.log_pos
+            self._resume_stream = True
+        if self.auto_position is None and self.log_file is None:
+            self.auto_position = snapshot.auto_position
+        # table ids are only meaningful inside the binlog file they come from
+        if snapshot.log_file == self.log_file:
+            for table_id, table in snapshot.table_map.items():
+                if (self._table_filter is None or
+                        self._table_filter.matches(table.schema,
+                                                   table.table)):
+                    self.table_map[table_id] = table
+
+    def write_snapshot(self):
+        """Persist table metadata and the position after the last
+        transaction delivered to snapshot_file"""
+        auto_position = self.auto_position
+        if self._gtid_delivered is not None:
+            auto_position = self._gtid_delivered
+        if auto_position is not None:
+            auto_position = str(auto_position)
+        # table ids read ahead in a later file are not valid in the one of
+        # the delivered position
+        table_map = (self.table_map if self._delivered_file == self.log_file
+                     else {})
+        snapshot = Snapshot(self._delivered_file, self._delivered_pos,
+                            auto_position, table_map, self._schema_cache)
+        write_snapshot(self._snapshot_file, snapshot)
+        self._last_snapshot_time = self._loop.time()
+
+    def _maybe_write_snapshot(self):
+        if self._snapshot_file is None:
+            return
+        if (self._loop.time() - self._last_snapshot_time
+                >= self._snapshot_interval):
+            self.write_snapshot()
+
+    @asyncio.coroutine
     def _connect_to_ctl(self):
         self._ctl_connection_settings = dict(self._connection_settings)
         self._ctl_connection_settings["db"] = "information_schema"
         self._ctl_connection_settings["cursorclass"] = aiomysql.DictCursor
-        self._ctl_connection = yield from aiomysql.connect(
+        pool = yield from aiomysql.create_pool(
+            minsize=1, maxsize=self._ctl_pool_size,
             **self._ctl_connection_settings)
-        self._ctl_connection._get_table_information = \
-            self._get_table_information
+        self._ctl_connection = _ControlConnection(
+            pool, self._ctl_connection_settings["charset"],
+            self._get_table_information)
         self._connected_ctl = True
 
     @asyncio.coroutine
@@ -136,7 +440,7 @@ class BinLogStreamReader(object):
         self._stream_connection = yield from aiomysql.connect(
             **self._connection_settings)
 
-        self._use_checksum = self._checksum_enabled()
+        self._use_checksum = yield from self._checksum_enabled()
 
         # If checksum is enabled we need to inform the server about the that
         # we support it
@@ -146,6 +450,13 @@ class BinLogStreamReader(object):
                                    " @@global.binlog_checksum")
             yield from cur.close()
 
+        if self._heartbeat_period is not None:
+            # period in nanoseconds
+            cur = yield from self._stream_connection.cursor()
+            yield from cur.execute("SET @master_heartbeat_period = %d" %
+                                   int(self._heartbeat_period * 1000000000))
+            yield from cur.close()
+
         if not self.auto_position:
             # only when log_file and log_pos both provided, the position info
             # is valid, if not, get the current position from master
@@ -208,7 +519,15 @@ class BinLogStreamReader(object):
             # of the first interval
             # 3 is the stop position of the first interval.
 
-            gtid_set = GtidSet(self.auto_position)
+            if self._gtid_executed is None:
+                gtid_set = GtidSet(self.auto_position)
+                self._gtid_executed = gtid_set.copy()
+                if self._track_boundaries():
+                    self._gtid_delivered = gtid_set.copy()
+            else:
+                # dumped again after a reconnect, the master skips the
+                # transactions read up to the last boundary
+                gtid_set = self._gtid_executed
             encoded_data_size = gtid_set.encoded_length
 
             header_size = (2 +  # binlog_flags
@@ -240,16 +559,235 @@ class BinLogStreamReader(object):
         self._stream_connection._write_bytes(prelude)
         self._connected_stream = True
 
+        if self._boundary_file is None and not self.auto_position:
+            self._boundary_file = self.log_file
+            self._boundary_pos = self.log_pos if self._resume_stream else 4
+        if self._delivered_file is None and not self.auto_position:
+            self._delivered_file = self._boundary_file
+            self._delivered_pos = self._boundary_pos
+
+        if (self._read_ahead_packets is not None
+                or self._read_ahead_bytes is not None):
+            self._read_ahead = ReadAheadBuffer(
+                self._stream_connection._read_packet,
+                max_packets=self._read_ahead_packets,
+                max_bytes=self._read_ahead_bytes, loop=self._loop)
+            self._read_ahead.start()
+
+    @asyncio.coroutine
+    def _reconnect(self, error):
+        """Dump the stream again from the last transaction boundary, by
+        position or with gtid_executed in GTID mode"""
+        if self._read_ahead is not None:
+            self._read_ahead.close()
+            self._read_ahead = None
+        if self._connected_stream:
+            self._stream_connection.close()
+            self._connected_stream = False
+
+        if self._gtid_executed is None and self._boundary_file is not None:
+            self.log_file = self._boundary_file
+            self.log_pos = self._boundary_pos
+            self._resume_stream = True
+        # the events of the partially read transaction come again
+        self._skip_events = self._events_since_boundary
+        self._replaying = True
+
+        for attempt in range(self._reconnect_attempts):
+            delay = min(self._reconnect_max_delay,
+                        self._reconnect_delay * 2 ** attempt)
+            yield from asyncio.sleep(random.uniform(0, delay),
+                                     loop=self._loop)
+            try:
+                yield from self._connect_to_stream()
+            except (aiomysql.OperationalError, OSError) as connect_error:
+                error = connect_error
+                if self._connected_stream:
+                    self._stream_connection.close()
+                    self._connected_stream = False
+                continue
+            return
+        raise error
+
+    @property
+    def lag_seconds(self):
+        """Seconds between the creation of the last event read and now, 0
+        once a heartbeat told the reader is caught up with the master. None
+        before the first event."""
+        if self._caught_up:
+            return 0.0
+        if self._last_event_timestamp is None:
+            return None
+        return max(time.time() - self._last_event_timestamp, 0.0)
+
+    @asyncio.coroutine
+    def _read_packet(self):
+        if self._read_ahead is not None:
+            read = self._read_ahead.get()
+        else:
+            read = self._stream_connection._read_packet()
+        if self._heartbeat_timeout is None:
+            return (yield from read)
+        try:
+            return (yield from asyncio.wait_for(
+                read, self._heartbeat_timeout, loop=self._loop))
+        except asyncio.TimeoutError:
+            raise aiomysql.OperationalError(
+                2013, "No packet from the master for %s seconds" %
+                self._heartbeat_timeout)
+
+    @asyncio.coroutine
     def fetchone(self):
+        """Return next event, None at the end of a non blocking stream"""
+        processed = self._events_delivered
+        self._boundaries_delivered(processed)
+        event = yield from self._fetch_next()
+        # boundaries read meanwhile may close already processed events
+        self._boundaries_delivered(processed)
+        return event
+
+    @asyncio.coroutine
+    def _fetch_next(self):
+        if self._pending_fetch is not None:
+            fetch, self._pending_fetch = self._pending_fetch, None
+            event = yield from fetch
+        else:
+            event = yield from self._fetchone()
+        if event is not None:
+            self._events_delivered += 1
+        return event
+
+    @asyncio.coroutine
+    def fetchmany(self, size, *, timeout=None):
+        """Return a list of up to size decoded events
+
+        Without timeout waits for size events, or less at the end of a non
+        blocking stream. With timeout returns the events read within
+        timeout seconds, the list may be empty. A read interrupted by the
+        timeout is not lost, it is resumed by the next fetch.
+        """
+        processed = self._events_delivered
+        self._boundaries_delivered(processed)
+        events = []
+        if timeout is None:
+            while len(events) < size:
+                event = yield from self._fetch_next()
+                if event is None:
+                    break
+                events.append(event)
+            self._boundaries_delivered(processed)
+            return events
+
+        deadline = self._loop.time() + timeout
+        while len(events) < size:
+            if self._pending_fetch is None:
+                self._pending_fetch = self._loop.create_task(
+                    self._fetchone())
+            remaining = max(deadline - self._loop.time(), 0)
+            done, _ = yield from asyncio.wait(
+                [self._pending_fetch], timeout=remaining, loop=self._loop)
+            if not done:
+                break
+            fetch, self._pending_fetch = self._pending_fetch, None
+            event = fetch.result()
+            if event is None:
+                break
+            self._events_delivered += 1
+            events.append(event)
+        self._boundaries_delivered(processed)
+        return events
+
+    if PY_35:
+        def __aiter__(self):
+            return self
+
+        @asyncio.coroutine
+        def __anext__(self):
+            event = yield from self.fetchone()
+            if event is None:
+                raise StopAsyncIteration  # noqa
+            return event
+
+    @asyncio.coroutine
+    def _fetchone(self):
+        if self._decode_executor is None:
+            return (yield from self._read_event())
+        return (yield from self._fetch_decoded())
+
+    @asyncio.coroutine
+    def _fetch_decoded(self):
+        window = self._decode_window
+        while True:
+            head_future = None
+            if window:
+                event, head_future = window[0]
+                if head_future is None or head_future.done():
+                    window.popleft()
+                    if head_future is not None:
+                        event._rows = head_future.result()
+                    return event
+
+            if self._decode_eof or len(window) >= self._decode_window_size:
+                if not window:
+                    self._decode_eof = False
+                    return None
+                yield from asyncio.wait([head_future], loop=self._loop)
+                continue
+
+            if not window:
+                # nothing to deliver meanwhile, read inline
+                self._enqueue_decode((yield from self._read_event()))
+                continue
+
+            # keep reading while rows are decoded, but do not hold the
+            # head of the window back once its rows are ready
+            if self._decode_read is None:
+                self._decode_read = self._loop.create_task(
+                    self._read_event())
+            yield from asyncio.wait([self._decode_read, head_future],
+                                    return_when=asyncio.FIRST_COMPLETED,
+                                    loop=self._loop)
+            if self._decode_read.done():
+                read, self._decode_read = self._decode_read, None
+                self._enqueue_decode(read.result())
+
+    def _enqueue_decode(self, event):
+        if event is None:
+            self._decode_eof = True
+            return
+        future = None
+        if isinstance(event, RowsEvent):
+            future = self._loop.run_in_executor(
+                self._decode_executor, decode_rows,
+                event.packet.get_all_data(),
+                self._table_descriptor(event.table_id), self._use_checksum)
+        self._decode_window.append((event, future))
+
+    def _table_descriptor(self, table_id):
+        table = self.table_map[table_id]
+        try:
+            cached_table, descriptor = self._table_descriptors[table_id]
+        except KeyError:
+            pass
+        else:
+            if cached_table is table or cached_table == table:
+                return descriptor
+        descriptor = table_descriptor(table)
+        self._table_descriptors[table_id] = (table, descriptor)
+        return descriptor
+
+    @asyncio.coroutine
+    def _read_event(self):
         while True:
 
             try:
-                pkt = yield from self._stream_connection._read_packet()
+                pkt = yield from self._read_packet()
             except aiomysql.OperationalError as error:
                 code, message = error.args
-                if code in MYSQL_EXPECTED_ERROR_CODES:
-                    self._connected_stream = False
-                    continue
+                if code not in MYSQL_EXPECTED_ERROR_CODES:
+                    raise
+                yield from self._reconnect(error)
+                continue
 
             if pkt.is_eof_packet():
                 return None
@@ -257,23 +795,65 @@ class BinLogStreamReader(object):
             if not pkt.is_ok_packet():
                 continue
 
+            data = pkt.get_all_data()
+            if self._spool is not None:
+                self._spool.append(memoryview(data)[1:])
+            event_type = peek_event_type(data)
+
+            timestamp = peek_timestamp(data)
+            if event_type == BinLog.HEARTBEAT_LOG_EVENT:
+                self._caught_up = True
+            elif timestamp:
+                # artificial events have no timestamp
+                self._last_event_timestamp = timestamp
+                self._caught_up = False
+
+            table_id = None
+            if (event_type in ROWS_EVENT_TYPES
+                    or event_type == BinLog.TABLE_MAP_EVENT):
+                table_id = peek_table_id(data)
+                if self._table_decisions.get(table_id) is False:
+                    self.log_pos = peek_log_pos(data)
+                    continue
+
+            # Table schemas are loaded concurrently while consecutive
+            # TableMapEvents are read, any other event may depend on them.
+            if (self._pending_table_loads and
+                    event_type != BinLog.TABLE_MAP_EVENT):
+                yield from self._finish_table_loads()
+
             binlog_event = BinLogPacketWrapper(pkt, self.table_map,
                                                self._ctl_connection,
                                                self._use_checksum,
                                                self._allowed_events_in_packet,
-                                               self._only_tables,
-                                               self._only_schemas,
+                                               self._table_filter,
                                                self._freeze_schema)
 
-            if (binlog_event.event_type == BinLog.TABLE_MAP_EVENT
-                    and binlog_event.event is not None):
+            if event_type == BinLog.HEARTBEAT_LOG_EVENT:
+                self._handle_heartbeat(binlog_event.event)
+                if HeartbeatLogEvent not in self._allowed_events:
+                    continue
+                self._events_read += 1
+                return binlog_event.event
 
-                yield from binlog_event.event.load_table_schema()
+            if event_type == BinLog.TABLE_MAP_EVENT:
+                if binlog_event.event is not None:
+                    self._table_decisions[table_id] = True
+                elif table_id not in self.table_map:
+                    # not a frozen schema, the table is filtered out
+                    self._table_decisions[table_id] = False
 
-                self.table_map[binlog_event.event.table_id] = \
-                    binlog_event.event.get_table()
+            if (binlog_event.event_type == BinLog.TABLE_MAP_EVENT
+                    and binlog_event.event is not None):
+                load = self._loop.create_task(
+                    self._load_table(binlog_event.event))
+                if TableMapEvent in self._allowed_events:
+                    yield from load
+                else:
+                    self._pending_table_loads.append(load)
 
             if binlog_event.event_type == BinLog.ROTATE_EVENT:
+                same_file = self.log_file == binlog_event.event.next_binlog
                 self.log_pos = binlog_event.event.position
                 self.log_file = binlog_event.event.next_binlog
                 # Table Id in binlog are NOT persistent in MySQL - they are
@@ -292,18 +872,101 @@ class BinLogStreamReader(object):
                 # again for each logfile which is potentially wasted effort
                 # but we can't really do much better
                 # without being broken in restart case
-                self.table_map = {}
+                # A rotate to the file we are already reading is sent when
+                # the dump starts, table ids of that file are still valid.
+                if not same_file:
+                    self.table_map = {}
+                    self._table_decisions = {}
+                    self._table_descriptors = {}
             elif binlog_event.log_pos:
                 self.log_pos = binlog_event.log_pos
 
             # event is none if we have filter it on packet level
             # we filter also not allowed events
-            if binlog_event.event is None or (binlog_event.event.__class__ not
-                                              in self._allowed_events):
+            returned = (binlog_event.event is not None and
+                        binlog_event.event.__class__ in self._allowed_events)
+
+            if (event_type == BinLog.GTID_LOG_EVENT
+                    and binlog_event.event is not None):
+                self._pending_gtid = binlog_event.event.gtid
+
+            if event_type == BinLog.QUERY_EVENT:
+                self._invalidate_schemas(binlog_event.event)
+
+            if self._transactions.ends_transaction(binlog_event.event):
+                gtid, self._pending_gtid = self._pending_gtid, None
+                if gtid is not None and self._gtid_executed is not None:
+                    self._gtid_executed.add(gtid)
+                if self._track_boundaries():
+                    self._add_boundary(returned, gtid)
+                self._boundary_file = self.log_file
+                self._boundary_pos = self.log_pos
+                self._events_since_boundary = 0
+                self._replaying = False
+            elif ((event_type == BinLog.ROTATE_EVENT
+                   and binlog_event.timestamp == 0) or
+                  (event_type == BinLog.FORMAT_DESCRIPTION_EVENT
+                   and binlog_event.log_pos == 0) or
+                  (self._replaying and event_type in (
+                      BinLog.FORMAT_DESCRIPTION_EVENT,
+                      BinLog.PREVIOUS_GTIDS_LOG_EVENT))):
+                # artificial events sent at the start of each dump, a dump
+                # by GTID starts with the header events of the file
+                self._transactions.reset()
+                if self._replaying:
+                    continue
+            elif returned:
+                self._replaying = False
+                if self._skip_events:
+                    # delivered before the stream was dumped again
+                    self._skip_events -= 1
+                    continue
+                self._events_since_boundary += 1
+
+            if not returned:
                 continue
 
+            self._events_read += 1
             return binlog_event.event
 
+    def _invalidate_schemas(self, query_event):
+        # DDL keeping the column types is not seen in the TableMapEvents
+        matches = ddl_tables(query_event.schema.decode(), query_event.query)
+        if matches is None:
+            return
+        self._schema_cache.invalidate_matching(matches)
+        for table_id, table in list(self.table_map.items()):
+            if matches(table.schema, table.table):
+                del self.table_map[table_id]
+                self._table_decisions.pop(table_id, None)
+                self._table_descriptors.pop(table_id, None)
+
+    def _handle_heartbeat(self, heartbeat):
+        # the master had nothing after log_pos, between two transactions
+        if (heartbeat.ident != self.log_file or not heartbeat.packet.log_pos
+                or heartbeat.packet.log_pos < self.log_pos):
+            return
+        self.log_pos = heartbeat.packet.log_pos
+        if self._events_since_boundary == 0 and not self._replaying:
+            self._boundary_file = self.log_file
+            self._boundary_pos = self.log_pos
+
+    @asyncio.coroutine
+    def _load_table(self, table_map_event):
+        yield from table_map_event.load_table_schema()
+        self.table_map[table_map_event.table_id] = table_map_event.get_table()
+
+    @asyncio.coroutine
+    def _finish_table_loads(self):
+        loads, self._pending_table_loads = self._pending_table_loads, []
+        # every load is awaited, a failed one does not leave the others
+        # unretrieved
+        results = yield from asyncio.gather(*loads, loop=self._loop,
+                                            return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
     def _allowed_event_list(self,
                             only_events,
                             ignored_events,
@@ -334,31 +997,36 @@ class BinLogStreamReader(object):
         return frozenset(events)
 
     @asyncio.coroutine
-    def _get_table_information(self, schema, table):
+    def _get_table_information(self, schema, table, fingerprint=None):
+        return (yield from self._schema_cache.lookup(
+            schema, table, fingerprint, self._query_table_information,
+            loop=self._loop))
+
+    @asyncio.coroutine
+    def _query_table_information(self, schema, table):
         for i in range(1, 3):
-            try:
-                if not self._connected_ctl:
-                    self._connect_to_ctl()
-
-                cur = yield from self._ctl_connection.cursor()
-                yield from cur.execute("""
-                    SELECT
-                        COLUMN_NAME, COLLATION_NAME, CHARACTER_SET_NAME,
-                        COLUMN_COMMENT, COLUMN_TYPE, COLUMN_KEY
-                    FROM
-                        columns
-                    WHERE
-                        table_schema = %s AND table_name = %s
-                    """, (schema, table))
-
-                return (yield from cur.fetchall())
-            except aiomysql.OperationalError as error:
-                code, message = error.args
-                if code in MYSQL_EXPECTED_ERROR_CODES:
-                    self._connected_ctl = False
-                    continue
-                else:
-                    raise error
-                    # TODO: fix  PEP492
-                    # def __iter__(self):
-                    # return iter(self.fetchone, None)
+            if not self._connected_ctl:
+                yield from self._connect_to_ctl()
+
+            with (yield from self._ctl_connection.pool) as conn:
+                try:
+                    cur = yield from conn.cursor()
+                    yield from cur.execute("""
+                        SELECT
+                            COLUMN_NAME, COLLATION_NAME, CHARACTER_SET_NAME,
+                            COLUMN_COMMENT, COLUMN_TYPE, COLUMN_KEY
+                        FROM
+                            columns
+                        WHERE
+                            table_schema = %s AND table_name = %s
+                        """, (schema, table))
+
+                    return (yield from cur.fetchall())
+                except aiomysql.OperationalError as error:
+                    code, message = error.args
+                    if code in MYSQL_EXPECTED_ERROR_CODES:
+                        # pool drops closed connections on release
+                        conn.close()
+                        continue
+                    else:
+                        raise error
@@ -0,0 +1,232 @@
+import json
+import os
+import sqlite3
+import struct
+
+from .gtid import GtidSet
+
+
+__all__ = ['Checkpoint', 'CheckpointStore', 'FileCheckpointStore',
+           'SQLiteCheckpointStore', 'Checkpointer']
+
+
+# flags, length of log_file, log_pos
+_HEADER = struct.Struct('<BHQ')
+_HAS_POSITION = 1
+_HAS_GTID_SET = 2
+
+
+class Checkpoint(object):
+    """Position of the last transaction processed by the consumer
+
+    Attributes:
+        log_file: Binlog file of the position
+        log_pos: Position of the event following the transaction
+        gtid_set: Executed GtidSet, None without GTID mode
+    """
+
+    def __init__(self, log_file, log_pos, gtid_set=None):
+        """
+        Attributes:
+        gtid_set: GtidSet, kept as is, or its text form
+        """
+        if isinstance(gtid_set, str):
+            gtid_set = GtidSet(gtid_set)
+        self.log_file = log_file
+        self.log_pos = log_pos
+        self.gtid_set = gtid_set
+
+    def __eq__(self, other):
+        return self.serializable_data() == other.serializable_data()
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return '<Checkpoint %s:%s gtid_set=%r>' % (
+            self.log_file, self.log_pos, self._gtid_text())
+
+    def _gtid_text(self):
+        return str(self.gtid_set) if self.gtid_set is not None else None
+
+    def serializable_data(self):
+        return {
+            "log_file": self.log_file,
+            "log_pos": self.log_pos,
+            "gtid_set": self._gtid_text(),
+        }
+
+    def to_bytes(self):
+        """Compact binary form, the GTID set is written like in
+        COM_BINLOG_DUMP_GTID"""
+        flags = 0
+        log_file = b''
+        if self.log_file is not None:
+            flags |= _HAS_POSITION
+            log_file = self.log_file.encode()
+        gtid_set = b''
+        if self.gtid_set is not None:
+            flags |= _HAS_GTID_SET
+            gtid_set = self.gtid_set.encoded()
+        return (_HEADER.pack(flags, len(log_file), self.log_pos or 0) +
+                log_file + gtid_set)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if len(data) < _HEADER.size:
+            raise ValueError('Checkpoint data is truncated')
+        flags, length, log_pos = _HEADER.unpack_from(data)
+        offset = _HEADER.size + length
+        log_file = gtid_set = None
+        if flags & _HAS_POSITION:
+            log_file = bytes(data[_HEADER.size:offset]).decode()
+        else:
+            log_pos = None
+        if flags & _HAS_GTID_SET:
+            gtid_set = GtidSet.decode(data[offset:])
+        return cls(log_file, log_pos, gtid_set)
+
+
+class CheckpointStore(object):
+    """Durable storage of a single Checkpoint
+
+    Subclasses implement load and save, save must only return once the
+    checkpoint is durable.
+    """
+
+    def load(self):
+        """Return the saved Checkpoint, None if nothing was saved"""
+        raise NotImplementedError()
+
+    def save(self, checkpoint):
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+
+class FileCheckpointStore(CheckpointStore):
+    """Checkpoint stored as JSON in a file, replaced atomically
+
+    With binary, the file holds Checkpoint.to_bytes instead, smaller with
+    large GTID sets.
+    """
+
+    def __init__(self, path, *, binary=False):
+        self._path = path
+        self._binary = binary
+
+    def load(self):
+        try:
+            if self._binary:
+                with open(self._path, 'rb') as f:
+                    return Checkpoint.from_bytes(f.read())
+            with open(self._path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        return Checkpoint(data["log_file"], data["log_pos"],
+                          data.get("gtid_set"))
+
+    def save(self, checkpoint):
+        tmp_path = self._path + '.tmp'
+        with open(tmp_path, 'wb' if self._binary else 'w') as f:
+            if self._binary:
+                f.write(checkpoint.to_bytes())
+            else:
+                json.dump(checkpoint.serializable_data(), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._path)
+        if os.name == 'posix':
+            # make the rename itself durable
+            directory = os.path.dirname(os.path.abspath(self._path))
+            fd = os.open(directory, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+
+class SQLiteCheckpointStore(CheckpointStore):
+    """Checkpoints stored in a SQLite database, one row per name
+
+    Several readers can share a database with different names.
+    """
+
+    def __init__(self, path, name='default'):
+        self._name = name
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA synchronous = FULL")
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS checkpoint (
+                    name TEXT PRIMARY KEY,
+                    log_file TEXT,
+                    log_pos INTEGER,
+                    gtid_set TEXT
+                )""")
+
+    def load(self):
+        row = self._conn.execute(
+            "SELECT log_file, log_pos, gtid_set FROM checkpoint "
+            "WHERE name = ?", (self._name,)).fetchone()
+        if row is None:
+            return None
+        return Checkpoint(*row)
+
+    def save(self, checkpoint):
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoint "
+                "(name, log_file, log_pos, gtid_set) VALUES (?, ?, ?, ?)",
+                (self._name, checkpoint.log_file, checkpoint.log_pos,
+                 checkpoint.serializable_data()["gtid_set"]))
+
+    def close(self):
+        self._conn.close()
+
+
+class Checkpointer(object):
+    """Batch checkpoints before saving them to a CheckpointStore
+
+    Only the latest checkpoint is kept, it is saved once max_events events
+    were processed since the last save or interval seconds after it was
+    added, whichever comes first.
+    """
+
+    def __init__(self, store, *, max_events=1000, interval=1.0, loop):
+        self._store = store
+        self._max_events = max_events
+        self._interval = interval
+        self._loop = loop
+        self._pending = None
+        self._pending_events = 0
+        self._timer = None
+
+    @property
+    def pending(self):
+        """Checkpoint waiting to be saved"""
+        return self._pending
+
+    def add(self, checkpoint, events=1):
+        self._pending = checkpoint
+        self._pending_events += events
+        if self._pending_events >= self._max_events:
+            self.flush()
+        elif self._timer is None:
+            self._timer = self._loop.call_later(self._interval, self.flush)
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._pending is None:
+            return
+        checkpoint, self._pending = self._pending, None
+        self._pending_events = 0
+        self._store.save(checkpoint)
+
+    def close(self):
+        self.flush()
+        self._store.close()
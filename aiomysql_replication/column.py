@@ -6,94 +6,133 @@ from .consts import FieldType
 __all__ = ['Column']
 
 
+# Attributes read from table map event and information_schema, they are
+# the serialized form of a column
+_DATA_ATTRIBUTES = (
+    'type', 'name', 'collation_name', 'character_set_name', 'comment',
+    'unsigned', 'type_is_bool', 'is_primary', 'max_length', 'length_size',
+    'precision', 'decimals', 'size', 'bits', 'bytes', 'fsp', 'enum_values',
+    'set_values')
+
+# MySQL character sets whose name is not a Python codec
+_CHARSET_ALIASES = {
+    'utf8mb3': 'utf8',
+    'utf8mb4': 'utf8',
+    'binary': None,
+}
+
+
 class Column(object):
     """Definition of a column
+
+    Attributes read in the row decoding loop are plain slots, derived ones
+    are computed once:
+        charset: Python codec of character_set_name, None for binary data
+        fsp_bytes: Bytes used by fractional seconds of temporal types
     """
 
+    __slots__ = _DATA_ATTRIBUTES + ('charset', 'fsp_bytes')
+
     def __init__(self, *args, **kwargs):
-        self.data = {}
         if len(args) == 3:
             self._parse_column_definition(*args)
         else:
-            self.data = kwargs
+            for key, value in kwargs.items():
+                setattr(self, key, value)
+        self._compute_derived_attributes()
 
     def _parse_column_definition(self, column_type, column_schema, packet):
-        self.data["type"] = column_type
-        self.data["name"] = column_schema["COLUMN_NAME"]
-        self.data["collation_name"] = column_schema["COLLATION_NAME"]
-        self.data["character_set_name"] = column_schema["CHARACTER_SET_NAME"]
-        self.data["comment"] = column_schema["COLUMN_COMMENT"]
-        self.data["unsigned"] = False
-        self.data["type_is_bool"] = False
+        self.type = column_type
+        self.name = column_schema["COLUMN_NAME"]
+        self.collation_name = column_schema["COLLATION_NAME"]
+        self.character_set_name = column_schema["CHARACTER_SET_NAME"]
+        self.comment = column_schema["COLUMN_COMMENT"]
+        self.unsigned = False
+        self.type_is_bool = False
         if column_schema["COLUMN_KEY"] == "PRI":
-            self.data["is_primary"] = True
+            self.is_primary = True
         else:
-            self.data["is_primary"] = False
+            self.is_primary = False
 
         if column_schema["COLUMN_TYPE"].find("unsigned") != -1:
-            self.data["unsigned"] = True
+            self.unsigned = True
         if self.type == FieldType.VAR_STRING or \
                 self.type == FieldType.STRING:
             self._read_string_metadata(packet, column_schema)
         elif self.type == FieldType.VARCHAR:
-            self.data["max_length"] = struct.unpack('<H', packet.read(2))[0]
+            self.max_length = struct.unpack('<H', packet.read(2))[0]
         elif self.type == FieldType.BLOB:
-            self.data["length_size"] = packet.read_uint8()
+            self.length_size = packet.read_uint8()
         elif self.type == FieldType.GEOMETRY:
-            self.data["length_size"] = packet.read_uint8()
+            self.length_size = packet.read_uint8()
         elif self.type == FieldType.NEWDECIMAL:
-            self.data["precision"] = packet.read_uint8()
-            self.data["decimals"] = packet.read_uint8()
+            self.precision = packet.read_uint8()
+            self.decimals = packet.read_uint8()
         elif self.type == FieldType.DOUBLE:
-            self.data["size"] = packet.read_uint8()
+            self.size = packet.read_uint8()
         elif self.type == FieldType.FLOAT:
-            self.data["size"] = packet.read_uint8()
+            self.size = packet.read_uint8()
         elif self.type == FieldType.BIT:
             bits = packet.read_uint8()
             bytes = packet.read_uint8()
-            self.data["bits"] = (bytes * 8) + bits
-            self.data["bytes"] = int((self.bits + 7) / 8)
+            self.bits = (bytes * 8) + bits
+            self.bytes = int((self.bits + 7) / 8)
         elif self.type == FieldType.TIMESTAMP2:
-            self.data["fsp"] = packet.read_uint8()
+            self.fsp = packet.read_uint8()
         elif self.type == FieldType.DATETIME2:
-            self.data["fsp"] = packet.read_uint8()
+            self.fsp = packet.read_uint8()
         elif self.type == FieldType.TIME2:
-            self.data["fsp"] = packet.read_uint8()
+            self.fsp = packet.read_uint8()
         elif self.type == FieldType.TINY and \
                 column_schema["COLUMN_TYPE"] == "tinyint(1)":
-            self.data["type_is_bool"] = True
+            self.type_is_bool = True
 
     def _read_string_metadata(self, packet, column_schema):
         metadata = (packet.read_uint8() << 8) + packet.read_uint8()
         real_type = metadata >> 8
         if real_type == FieldType.SET or real_type == FieldType.ENUM:
-            self.data["type"] = real_type
-            self.data["size"] = metadata & 0x00ff
+            self.type = real_type
+            self.size = metadata & 0x00ff
             self.__read_enum_metadata(column_schema)
         else:
-            self.data["max_length"] = (((metadata >> 4) & 0x300) ^ 0x300) \
+            self.max_length = (((metadata >> 4) & 0x300) ^ 0x300) \
                 + (metadata & 0x00ff)
 
     def __read_enum_metadata(self, column_schema):
         enums = column_schema["COLUMN_TYPE"]
         if self.type == FieldType.ENUM:
-            self.data["enum_values"] = enums.replace('enum(', '')\
+            self.enum_values = enums.replace('enum(', '')\
                 .replace(')', '').replace('\'', '').split(',')
         else:
-            self.data["set_values"] = enums.replace('set(', '')\
+            self.set_values = enums.replace('set(', '')\
                 .replace(')', '').replace('\'', '').split(',')
 
+    def _compute_derived_attributes(self):
+        character_set_name = getattr(self, 'character_set_name', None)
+        if character_set_name is None:
+            self.charset = None
+        else:
+            self.charset = _CHARSET_ALIASES.get(character_set_name.lower(),
+                                                character_set_name)
+
+        fsp = getattr(self, 'fsp', 0)
+        self.fsp_bytes = (fsp + 1) // 2
+
     def __eq__(self, other):
-        return self.data == other.data
+        return self.serializable_data() == other.serializable_data()
 
     def __ne__(self, other):
         return not self.__eq__(other)
 
     def serializable_data(self):
-        return self.data
+        data = {}
+        for key in _DATA_ATTRIBUTES:
+            try:
+                data[key] = getattr(self, key)
+            except AttributeError:
+                pass
+        return data
 
-    def __getattr__(self, item):
-        try:
-            return self.data[item]
-        except KeyError:
-            raise AttributeError("{0} not found".format(item))
+    @property
+    def data(self):
+        return self.serializable_data()
@@ -5,13 +5,16 @@ from .utils import byte2int, int2byte
 
 
 __all__ = ['BinLogEvent', 'GtidEvent', 'RotateEvent', 'FormatDescriptionEvent',
-           'StopEvent', 'XidEvent', 'QueryEvent', 'NotImplementedEvent']
+           'StopEvent', 'XidEvent', 'HeartbeatLogEvent', 'QueryEvent',
+           'NotImplementedEvent']
+
+# lt_type of GtidEvent with a logical clock
+LOGICAL_TIMESTAMP_TYPECODE = 2
 
 
 class BinLogEvent(object):
     def __init__(self, from_packet, event_size, table_map, ctl_connection,
-                 only_tables=None,
-                 only_schemas=None,
+                 table_filter=None,
                  freeze_schema=False):
         self.packet = from_packet
         self.table_map = table_map
@@ -23,6 +26,15 @@ class BinLogEvent(object):
         # the event will be skipped
         self._processed = True
 
+    def __getstate__(self):
+        # events are pickled once decoded, connection and schema state
+        # stay with the reader
+        state = self.__dict__.copy()
+        state.pop('_ctl_connection', None)
+        state.pop('table_map', None)
+        state.pop('_table_map', None)
+        return state
+
     def _read_table_id(self):
         # Table ID is 6 byte
         # pad little-endian number
@@ -46,6 +58,13 @@ class BinLogEvent(object):
 
 class GtidEvent(BinLogEvent):
     """GTID change in binlog event
+
+    Attributes:
+        last_committed: Logical clock of MySQL 5.7+, the transaction can be
+            applied in parallel with the ones whose sequence_number is above
+            last_committed. None when the master does not write it.
+        sequence_number: Logical clock of the transaction inside its binlog
+            file, None when the master does not write it.
     """
 
     def __init__(self, from_packet, event_size, table_map, ctl_connection,
@@ -57,6 +76,15 @@ class GtidEvent(BinLogEvent):
         self.sid = self.packet.read(16)
         self.gno = struct.unpack('<Q', self.packet.read(8))[0]
 
+        self.last_committed = None
+        self.sequence_number = None
+        # lt_type (1) last_committed (8) sequence_number (8)
+        if event_size >= 42:
+            lt_type = byte2int(self.packet.read(1))
+            if lt_type == LOGICAL_TIMESTAMP_TYPECODE:
+                self.last_committed, self.sequence_number = struct.unpack(
+                    '<qq', self.packet.read(16))
+
     @property
     def gtid(self):
         """GTID = source_id:transaction_id
@@ -71,6 +99,9 @@ class GtidEvent(BinLogEvent):
     def _dump(self):
         print("Commit: %s" % self.commit_flag)
         print("GTID_NEXT: %s" % self.gtid)
+        if self.sequence_number is not None:
+            print("Last committed: %d" % self.last_committed)
+            print("Sequence number: %d" % self.sequence_number)
 
     def __repr__(self):
         return '<GtidEvent "%s">' % self.gtid
@@ -124,6 +155,25 @@ class XidEvent(BinLogEvent):
         print("Transaction ID: %d" % (self.xid))
 
 
+class HeartbeatLogEvent(BinLogEvent):
+    """Sent by the master when it has no new event for the heartbeat period
+
+    Attributes:
+        ident: Name of the binlog file the master is writing
+    """
+
+    def __init__(self, from_packet, event_size, table_map, ctl_connection,
+                 **kwargs):
+        super(HeartbeatLogEvent, self).__init__(from_packet, event_size,
+                                                table_map, ctl_connection,
+                                                **kwargs)
+        self.ident = self.packet.read(event_size).decode()
+
+    def _dump(self):
+        super(HeartbeatLogEvent, self)._dump()
+        print("Current binlog: %s" % (self.ident))
+
+
 class QueryEvent(BinLogEvent):
     """This evenement is trigger when a query is run of the database.
     Only replicated queries are logged."""
@@ -0,0 +1,91 @@
+import fnmatch
+import re
+
+
+__all__ = ['TableFilter']
+
+
+def _compile(pattern):
+    # compiled regular expressions are used as is, strings are globs
+    if hasattr(pattern, 'match'):
+        return pattern
+    return re.compile(fnmatch.translate(pattern))
+
+
+def _exact(name):
+    return re.compile(re.escape(name) + r'\Z')
+
+
+class TableFilter(object):
+    """Select tables by schema and table name
+
+    Patterns are glob strings (``orders_*``) or compiled regular
+    expressions. A table is watched when it matches one of the include
+    patterns, if any are given, and none of the exclude patterns.
+
+    Attributes:
+        include_tables: Patterns on table names to watch
+        exclude_tables: Patterns on table names to skip
+        include_schemas: Patterns on schema names to watch
+        exclude_schemas: Patterns on schema names to skip
+    """
+
+    def __init__(self, include_tables=None, exclude_tables=None,
+                 include_schemas=None, exclude_schemas=None):
+        self._include_tables = self._compile_all(include_tables)
+        self._exclude_tables = self._compile_all(exclude_tables)
+        self._include_schemas = self._compile_all(include_schemas)
+        self._exclude_schemas = self._compile_all(exclude_schemas)
+        # decisions by (schema, table), table ids change with every binlog
+        # file but names do not
+        self._decisions = {}
+
+    @classmethod
+    def from_names(cls, only_tables=None, only_schemas=None):
+        """Filter equivalent to exact only_tables/only_schemas lists"""
+        tables = None
+        if only_tables is not None:
+            tables = [_exact(name) for name in only_tables]
+        schemas = None
+        if only_schemas is not None:
+            schemas = [_exact(name) for name in only_schemas]
+        return cls(include_tables=tables, include_schemas=schemas)
+
+    @staticmethod
+    def _compile_all(patterns):
+        if patterns is None:
+            return None
+        if isinstance(patterns, str) or hasattr(patterns, 'match'):
+            patterns = [patterns]
+        return [_compile(p) for p in patterns]
+
+    @staticmethod
+    def _any_match(patterns, name):
+        for pattern in patterns:
+            if pattern.match(name):
+                return True
+        return False
+
+    def matches(self, schema, table):
+        try:
+            return self._decisions[(schema, table)]
+        except KeyError:
+            pass
+        decision = self._evaluate(schema, table)
+        self._decisions[(schema, table)] = decision
+        return decision
+
+    def _evaluate(self, schema, table):
+        if (self._include_schemas is not None
+                and not self._any_match(self._include_schemas, schema)):
+            return False
+        if (self._exclude_schemas is not None
+                and self._any_match(self._exclude_schemas, schema)):
+            return False
+        if (self._include_tables is not None
+                and not self._any_match(self._include_tables, table)):
+            return False
+        if (self._exclude_tables is not None
+                and self._any_match(self._exclude_tables, table)):
+            return False
+        return True
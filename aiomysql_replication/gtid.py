@@ -1,49 +1,196 @@
 import binascii
+import bisect
 import re
 import struct
 
 
 __all__ = ['Gtid', 'GtidSet']
 
+# above any transaction number, bisects intervals by their start
+_MAX_GNO = 1 << 64
+
+_GTID_RE = re.compile('^([0-9a-fA-F]{8}(?:-[0-9a-fA-F]{4})'
+                      '{3}-[0-9a-fA-F]{12})((?::[0-9-]+)+)$')
+_INTERVAL_RE = re.compile('^([0-9]+)(?:-([0-9]+))?$')
+
+
+def _merge(intervals):
+    # sorted half open intervals, overlapping or adjacent ones joined
+    merged = []
+    for start, stop in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if stop > merged[-1][1]:
+                merged[-1] = (merged[-1][0], stop)
+        else:
+            merged.append((start, stop))
+    return merged
+
 
 class Gtid(object):
+    """Transactions of one source, as sorted and merged intervals
+
+    Intervals are half open (start, stop) tuples, the transactions
+    start to stop - 1. They are written inclusive in the text form,
+    1-3 is (1, 4).
+    """
+
     @staticmethod
     def parse_interval(interval):
-        m = re.search('^([0-9]+)(?:-([0-9]+))?$', interval)
+        m = _INTERVAL_RE.search(interval)
         if not m:
             raise ValueError('GTID format is incorrect')
+        start = int(m.group(1))
         if not m.group(2):
-            return (int(m.group(1)))
-        else:
-            return (int(m.group(1)), int(m.group(2)))
+            return (start, start + 1)
+        stop = int(m.group(2)) + 1
+        if stop <= start:
+            raise ValueError('GTID format is incorrect')
+        return (start, stop)
 
     @staticmethod
     def parse(gtid):
-        m = re.search('^([0-9a-fA-F]{8}(?:-[0-9a-fA-F]{4})'
-                      '{3}-[0-9a-fA-F]{12})((?::[0-9-]+)+)$',
-                      gtid)
+        m = _GTID_RE.search(gtid)
         if not m:
             raise ValueError('GTID format is incorrect')
 
-        sid = m.group(1)
+        sid = m.group(1).lower()
         intervals = m.group(2)
 
         intervals_parsed = [Gtid.parse_interval(x) for x in
                             intervals.split(':')[1:]]
 
-        return (sid, intervals_parsed)
+        return (sid, _merge(intervals_parsed))
+
+    def __init__(self, gtid=None, *, sid=None, intervals=()):
+        """
+        Attributes:
+        gtid: Text form, like 3e11fa47-71ca-11e1-9e33-c80aa9429562:1-5:7
+        sid: Source id, when gtid is not given
+        intervals: Half open intervals of sid, when gtid is not given
+        """
+        if gtid is not None:
+            self.sid, self.intervals = Gtid.parse(gtid)
+        else:
+            self.sid = sid.lower()
+            self.intervals = _merge(intervals)
+        # text and binary forms, cached until the intervals change
+        self._text = None
+        self._encoded = None
+
+    def copy(self):
+        gtid = Gtid.__new__(Gtid)
+        gtid.sid = self.sid
+        gtid.intervals = list(self.intervals)
+        gtid._text = self._text
+        gtid._encoded = self._encoded
+        return gtid
+
+    @classmethod
+    def decode(cls, data, offset=0):
+        """Return the Gtid encoded at offset of data and the offset
+        following it"""
+        start = offset + 24
+        if start > len(data):
+            raise ValueError('GTID encoding is truncated')
+        sid = binascii.hexlify(data[offset:offset + 16]).decode()
+        n_intervals, = struct.unpack_from('<Q', data, offset + 16)
+        end = start + 16 * n_intervals
+        if end > len(data):
+            raise ValueError('GTID encoding is truncated')
+        marks = struct.unpack_from('<%dQ' % (2 * n_intervals), data, start)
+        # marks are increasing when the intervals are sorted and merged,
+        # like the ones encoded by us
+        intervals = list(zip(marks[::2], marks[1::2]))
+        encoded = None
+        if any(marks[i] >= marks[i + 1] for i in range(len(marks) - 1)):
+            if any(stop <= start for start, stop in intervals):
+                raise ValueError('GTID encoding is incorrect')
+            intervals = _merge(intervals)
+        else:
+            encoded = bytes(data[offset:end])
+        gtid = cls.__new__(cls)
+        gtid.sid = '%s-%s-%s-%s-%s' % (
+            sid[:8], sid[8:12], sid[12:16], sid[16:20], sid[20:])
+        gtid.intervals = intervals
+        gtid._text = None
+        gtid._encoded = encoded
+        return gtid, end
+
+    def add(self, gno):
+        """Add transaction number gno"""
+        intervals = self.intervals
+        # transactions are mostly added in order, right after the last one
+        if intervals and intervals[-1][1] == gno:
+            intervals[-1] = (intervals[-1][0], gno + 1)
+            self._text = self._encoded = None
+            return
+        self.add_interval(gno, gno + 1)
+
+    def add_interval(self, start, stop):
+        """Add transactions start to stop - 1"""
+        if stop <= start:
+            return
+        intervals = self.intervals
+        # intervals starting at or before start, the last one may overlap
+        i = bisect.bisect_right(intervals, (start, _MAX_GNO))
+        if i and intervals[i - 1][1] >= start:
+            i -= 1
+        # intervals starting at or before stop overlap or touch
+        j = bisect.bisect_right(intervals, (stop, _MAX_GNO), i)
+        if i < j:
+            start = min(start, intervals[i][0])
+            stop = max(stop, intervals[j - 1][1])
+        intervals[i:j] = [(start, stop)]
+        self._text = self._encoded = None
+
+    def __contains__(self, gno):
+        intervals = self.intervals
+        i = bisect.bisect_right(intervals, (gno, _MAX_GNO))
+        return bool(i) and gno < intervals[i - 1][1]
+
+    def union(self, other):
+        """Return the transactions of self or other"""
+        return Gtid(sid=self.sid, intervals=self.intervals + other.intervals)
+
+    def difference(self, other):
+        """Return the transactions of self not in other"""
+        result = []
+        others = other.intervals
+        j = 0
+        for start, stop in self.intervals:
+            # skip intervals of other ending before this one
+            while j < len(others) and others[j][1] <= start:
+                j += 1
+            k = j
+            while k < len(others) and others[k][0] < stop:
+                if others[k][0] > start:
+                    result.append((start, others[k][0]))
+                start = max(start, others[k][1])
+                k += 1
+            if start < stop:
+                result.append((start, stop))
+        return Gtid(sid=self.sid, intervals=result)
+
+    def __bool__(self):
+        return bool(self.intervals)
 
-    def __init__(self, gtid):
-        self.sid = None
-        self.intervals = []
+    def __len__(self):
+        return sum(stop - start for start, stop in self.intervals)
 
-        self.sid, self.intervals = Gtid.parse(gtid)
+    def __eq__(self, other):
+        return (isinstance(other, Gtid) and self.sid == other.sid
+                and self.intervals == other.intervals)
+
+    def __ne__(self, other):
+        return not self == other
 
     def __str__(self):
-        return '%s:%s' % (self.sid,
-                          ':'.join(('%d-%s' % x) if isinstance(x, tuple)
-                                   else str(x)
-                                   for x in self.intervals))
+        if self._text is None:
+            self._text = '%s:%s' % (
+                self.sid, ':'.join(('%d-%d' % (start, stop - 1))
+                                   if stop - start > 1 else str(start)
+                                   for start, stop in self.intervals))
+        return self._text
 
     def __repr__(self):
         return '<Gtid "%s">' % self
@@ -57,44 +204,153 @@ class Gtid(object):
                 len(self.intervals))
 
     def encode(self):
+        if self._encoded is not None:
+            return self._encoded
         buffer = b''
         # sid
         buffer += binascii.unhexlify(self.sid.replace('-', ''))
         # n_intervals
         buffer += struct.pack('<Q', len(self.intervals))
+        # start and stop of each interval, the stop position is excluded
+        # like in our intervals
+        buffer += struct.pack('<%dQ' % (2 * len(self.intervals)),
+                              *[mark for interval in self.intervals
+                                for mark in interval])
+        self._encoded = buffer
+        return buffer
 
-        for interval in self.intervals:
-            if isinstance(interval, tuple):
-                # Do we have both a start and a stop position
-                # Start position
-                buffer += struct.pack('<Q', interval[0])
-                # Stop position
-                buffer += struct.pack('<Q', interval[1])
-            else:
-                # If we only have a start position
-                # Like c63b8356-d74e-4870-8150-70eca127beb1:1,
-                # the stop position is start + 1
 
-                # Start position
-                buffer += struct.pack('<Q', interval)
-                # Stop position
-                buffer += struct.pack('<Q', interval + 1)
+class GtidSet(object):
+    """Executed transactions of every source
 
-        return buffer
+    A GtidSet is updated in place with add and update, union and
+    difference return new sets.
+    """
 
+    def __init__(self, gtid_set=None):
+        """
+        Attributes:
+        gtid_set: Text form, or a GtidSet to copy
+        """
+        # Gtid by sid
+        self._gtids = {}
+        # text and binary forms, cached until the set changes
+        self._text = None
+        self._encoded = None
+        if isinstance(gtid_set, GtidSet):
+            self._gtids = dict((sid, gtid.copy())
+                               for sid, gtid in gtid_set._gtids.items())
+            self._text = gtid_set._text
+            self._encoded = gtid_set._encoded
+        elif gtid_set:
+            for text in gtid_set.split(','):
+                text = text.strip()
+                if text:
+                    self._update_gtid(Gtid(text))
 
-class GtidSet(object):
-    def __init__(self, gtid_set):
-        if not gtid_set:
-            self.gtids = []
+    @classmethod
+    def decode(cls, data):
+        """Return the GtidSet of data, as returned by encoded"""
+        if len(data) < 8:
+            raise ValueError('GTID set encoding is truncated')
+        n_sids, = struct.unpack_from('<Q', data)
+        gtid_set = cls()
+        offset = 8
+        gtids = gtid_set._gtids
+        # data is kept as the binary form when sids are sorted and every
+        # Gtid is encoded like ours
+        canonical = True
+        last_sid = ''
+        for _ in range(n_sids):
+            gtid, offset = Gtid.decode(data, offset)
+            if gtid.sid <= last_sid or gtid._encoded is None:
+                canonical = False
+            last_sid = gtid.sid
+            if gtid.sid in gtids:
+                gtid_set._update_gtid(gtid)
+            else:
+                gtids[gtid.sid] = gtid
+        if offset != len(data):
+            raise ValueError('GTID set encoding has trailing data')
+        if canonical:
+            gtid_set._encoded = bytes(data)
+        return gtid_set
+
+    @property
+    def gtids(self):
+        """Gtid of every source, sorted by sid"""
+        return [self._gtids[sid] for sid in sorted(self._gtids)]
+
+    def copy(self):
+        return GtidSet(self)
+
+    def _update_gtid(self, gtid):
+        current = self._gtids.get(gtid.sid)
+        if current is None:
+            self._gtids[gtid.sid] = gtid.copy()
         else:
-            self.gtids = [Gtid(x) for x in gtid_set.split(',')]
+            self._gtids[gtid.sid] = current.union(gtid)
+        self._text = self._encoded = None
+
+    def add(self, gtid):
+        """Add one transaction, given as sid:gno like GtidEvent.gtid"""
+        sid, _, gno = gtid.rpartition(':')
+        sid = sid.lower()
+        current = self._gtids.get(sid)
+        if current is None:
+            current = self._gtids[sid] = Gtid(sid=sid)
+        current.add(int(gno))
+        self._text = self._encoded = None
+
+    def update(self, other):
+        """Add the transactions of GtidSet other"""
+        for gtid in other._gtids.values():
+            self._update_gtid(gtid)
+
+    def union(self, other):
+        gtid_set = self.copy()
+        gtid_set.update(other)
+        return gtid_set
+
+    def difference(self, other):
+        gtid_set = GtidSet()
+        for sid, gtid in self._gtids.items():
+            if sid in other._gtids:
+                gtid = gtid.difference(other._gtids[sid])
+            if gtid:
+                gtid_set._gtids[sid] = gtid.copy()
+        return gtid_set
+
+    __or__ = union
+    __sub__ = difference
+
+    def __contains__(self, gtid):
+        """Test one transaction given as sid:gno, or a whole GtidSet"""
+        if isinstance(gtid, GtidSet):
+            return not gtid.difference(self)
+        sid, _, gno = gtid.rpartition(':')
+        current = self._gtids.get(sid.lower())
+        return current is not None and int(gno) in current
+
+    def __bool__(self):
+        return any(self._gtids.values())
+
+    def __eq__(self, other):
+        if not isinstance(other, GtidSet):
+            return NotImplemented
+        return (dict((s, g) for s, g in self._gtids.items() if g) ==
+                dict((s, g) for s, g in other._gtids.items() if g))
+
+    def __ne__(self, other):
+        return not self == other
 
     def __str__(self):
-        return ','.join(repr(x) for x in self.gtids)
+        if self._text is None:
+            self._text = ','.join(str(x) for x in self.gtids if x)
+        return self._text
 
     def __repr__(self):
-        return '<GtidSet "%s"' % ','.join(repr(x) for x in self.gtids)
+        return '<GtidSet "%s">' % self
 
     @property
     def encoded_length(self):
@@ -102,5 +358,7 @@ class GtidSet(object):
                 sum(x.encoded_length for x in self.gtids))
 
     def encoded(self):
-        return b'' + (struct.pack('<Q', len(self.gtids)) +
-                      b''.join(x.encode() for x in self.gtids))
+        if self._encoded is None:
+            self._encoded = (struct.pack('<Q', len(self.gtids)) +
+                             b''.join(x.encode() for x in self.gtids))
+        return self._encoded
@@ -0,0 +1,319 @@
+"""Sidecar indexes of binlog files
+
+An index lists the transactions of one binlog file with their commit
+timestamp, offsets, GTID and the table ids they change. It is built by
+reading event headers and skipping the bodies, except the few bytes
+needed from GTID, query and table map events, and stored next to the
+binlog file. Indexes answer where to start reading for a timestamp or a
+GTID and which files changed a table without decoding the files.
+"""
+import binascii
+import bisect
+import collections
+import json
+import mmap
+import os
+import struct
+import zlib
+
+from .binlogfile import (
+    BINLOG_MAGIC, EVENT_HEADER_SIZE, EVENT_SIZE_OFFSET, EVENT_TYPE_OFFSET)
+from .consts import BinLog
+
+
+__all__ = ['TransactionEntry', 'BinLogIndex', 'index_binlog', 'load_index',
+           'BinLogIndexes']
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = '.idx'
+
+# thread_id (4) exec_time (4) schema_length (1) error_code (2)
+# status_vars_length (2)
+_QUERY_POST_HEADER = struct.Struct('<IIBHH')
+# commit_flag (1) sid (16) gno (8)
+_GTID = struct.Struct('<B16sQ')
+
+
+TransactionEntry = collections.namedtuple(
+    'TransactionEntry', 'timestamp offset end gtid table_ids')
+TransactionEntry.__doc__ = """One transaction of a binlog file
+
+    timestamp: Creation time of its last event, the commit
+    offset: Position of its first event, GTID event included
+    end: Position of the event following it
+    gtid: sid:gno of the transaction, None without GTID
+    table_ids: Ids of the tables it changes, see BinLogIndex.tables
+    """
+
+
+def _format_gtid(sid, gno):
+    sid = binascii.hexlify(sid).decode()
+    return '%s-%s-%s-%s-%s:%d' % (sid[:8], sid[8:12], sid[12:16],
+                                  sid[16:20], sid[20:], gno)
+
+
+class BinLogIndex(object):
+    """Transactions of one binlog file
+
+    Attributes:
+        log_file: Name of the binlog file
+        entries: TransactionEntry of every complete transaction, in binlog
+            order
+        tables: (schema, table) by id of the tables changed by entries
+        indexed_size: Offset up to which the file was indexed, the end of
+            the last complete transaction
+    """
+
+    def __init__(self, log_file, entries=None, tables=None,
+                 indexed_size=len(BINLOG_MAGIC)):
+        self.log_file = log_file
+        self.entries = entries if entries is not None else []
+        self.tables = tables if tables is not None else {}
+        self.indexed_size = indexed_size
+        self._lookups = None
+
+    def _build_lookups(self):
+        # commit timestamps are not ordered when transactions interleave,
+        # the running maximum is
+        max_timestamps = []
+        highest = 0
+        gnos = {}
+        for i, entry in enumerate(self.entries):
+            highest = max(highest, entry.timestamp)
+            max_timestamps.append(highest)
+            if entry.gtid is not None:
+                sid, _, gno = entry.gtid.rpartition(':')
+                gnos.setdefault(sid, []).append((int(gno), i))
+        for values in gnos.values():
+            values.sort()
+        self._lookups = (max_timestamps, gnos)
+        return self._lookups
+
+    def find_timestamp(self, timestamp):
+        """Return the first entry such that no transaction before it
+        committed at or after timestamp, None if there is none"""
+        max_timestamps, _ = self._lookups or self._build_lookups()
+        i = bisect.bisect_left(max_timestamps, timestamp)
+        if i == len(self.entries):
+            return None
+        return self.entries[i]
+
+    def find_gtid(self, gtid):
+        """Return the entry of transaction gtid, given as sid:gno"""
+        _, gnos = self._lookups or self._build_lookups()
+        sid, _, gno = gtid.rpartition(':')
+        values = gnos.get(sid.lower())
+        if not values:
+            return None
+        gno = int(gno)
+        i = bisect.bisect_left(values, (gno, -1))
+        if i == len(values) or values[i][0] != gno:
+            return None
+        return self.entries[values[i][1]]
+
+    def touches(self, schema, table):
+        """True if a transaction of the file changes schema.table"""
+        return (schema, table) in self.tables.values()
+
+    def serializable_data(self):
+        return {
+            "version": INDEX_VERSION,
+            "log_file": self.log_file,
+            "indexed_size": self.indexed_size,
+            "tables": [[table_id, schema, table] for
+                       table_id, (schema, table) in self.tables.items()],
+            "entries": [list(entry) for entry in self.entries],
+        }
+
+    @classmethod
+    def from_data(cls, data):
+        if data.get("version") != INDEX_VERSION:
+            raise ValueError("Unsupported index version: %r" %
+                             data.get("version"))
+        tables = dict((table_id, (schema, table))
+                      for table_id, schema, table in data["tables"])
+        entries = [TransactionEntry(*entry) for entry in data["entries"]]
+        return cls(data["log_file"], entries, tables, data["indexed_size"])
+
+    def write(self, path):
+        """Atomically replace the index stored at path"""
+        payload = json.dumps(self.serializable_data(),
+                             separators=(',', ':')).encode()
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(zlib.compress(payload))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def read(cls, path):
+        """Load the index stored at path, None if there is none"""
+        try:
+            with open(path, 'rb') as f:
+                payload = f.read()
+        except FileNotFoundError:
+            return None
+        return cls.from_data(json.loads(zlib.decompress(payload).decode()))
+
+
+def _query_prefix(data, offset, size, length):
+    # first bytes of the statement of a query event
+    (_, _, schema_length, _,
+     status_length) = _QUERY_POST_HEADER.unpack_from(
+        data, offset + EVENT_HEADER_SIZE)
+    start = (offset + EVENT_HEADER_SIZE + _QUERY_POST_HEADER.size +
+             status_length + schema_length + 1)
+    return bytes(data[start:min(start + length, offset + size)])
+
+
+def index_binlog(path, previous=None):
+    """Index the binlog file at path
+
+    With previous, the index of an earlier version of the same file, only
+    the part written since is read.
+    """
+    log_file = os.path.basename(path)
+    if previous is not None:
+        index = BinLogIndex(log_file, list(previous.entries),
+                            dict(previous.tables), previous.indexed_size)
+    else:
+        index = BinLogIndex(log_file)
+
+    with open(path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        if file_size < index.indexed_size:
+            raise ValueError("%s is smaller than its index" % path)
+        if file_size < len(BINLOG_MAGIC):
+            raise ValueError("%s is not a binlog file" % path)
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if data[:len(BINLOG_MAGIC)] != BINLOG_MAGIC:
+                raise ValueError("%s is not a binlog file" % path)
+            _index_events(index, data, file_size)
+        finally:
+            data.close()
+    return index
+
+
+def _index_events(index, data, file_size):
+    offset = index.indexed_size
+    # transaction being read: start, GTID, tables, inside BEGIN/COMMIT
+    start = None
+    gtid = None
+    tables = collections.OrderedDict()
+    in_transaction = False
+
+    while offset + EVENT_HEADER_SIZE <= file_size:
+        size, = struct.unpack_from('<I', data, offset + EVENT_SIZE_OFFSET)
+        if size < EVENT_HEADER_SIZE or offset + size > file_size:
+            # event still being written
+            break
+        event_type = data[offset + EVENT_TYPE_OFFSET]
+        end = offset + size
+        committed = False
+
+        if event_type == BinLog.GTID_LOG_EVENT:
+            _, sid, gno = _GTID.unpack_from(data, offset + EVENT_HEADER_SIZE)
+            start = offset
+            gtid = _format_gtid(sid, gno)
+        elif event_type == BinLog.QUERY_EVENT:
+            query = _query_prefix(data, offset, size, 8).upper()
+            if start is None:
+                start = offset
+            if query.startswith(b'BEGIN'):
+                in_transaction = True
+            elif (not in_transaction or query.startswith(b'COMMIT')
+                    or query.startswith(b'ROLLBACK')):
+                committed = True
+        elif event_type == BinLog.XID_EVENT:
+            committed = True
+        elif event_type == BinLog.TABLE_MAP_EVENT:
+            post_header = offset + EVENT_HEADER_SIZE
+            table_id = struct.unpack(
+                '<Q', data[post_header:post_header + 6] + b'\0\0')[0]
+            # table_id (6) flags (2) then length prefixed names
+            schema_start = post_header + 8
+            schema_length = data[schema_start]
+            schema = bytes(data[schema_start + 1:
+                                schema_start + 1 + schema_length])
+            table_start = schema_start + 1 + schema_length + 1
+            table_length = data[table_start]
+            table = bytes(data[table_start + 1:
+                               table_start + 1 + table_length])
+            tables[table_id] = (schema.decode(), table.decode())
+
+        if committed and start is not None:
+            timestamp, = struct.unpack_from('<I', data, offset)
+            index.entries.append(TransactionEntry(
+                timestamp, start, end, gtid, list(tables)))
+            index.tables.update(tables)
+            index.indexed_size = end
+            start = gtid = None
+            tables.clear()
+            in_transaction = False
+        elif start is None:
+            # events between transactions are always complete
+            index.indexed_size = end
+        offset = end
+    index._lookups = None
+
+
+def load_index(path, *, write=True):
+    """Return the index of the binlog file at path, from its sidecar file
+    when it is up to date. Files that grew are indexed from where the
+    sidecar stopped, with write the sidecar is updated."""
+    index_path = path + INDEX_SUFFIX
+    index = None
+    try:
+        index = BinLogIndex.read(index_path)
+    except ValueError:
+        pass
+    file_size = os.path.getsize(path)
+    if index is not None and index.indexed_size > file_size:
+        # binlog file replaced
+        index = None
+    if index is not None and index.indexed_size == file_size:
+        return index
+    index = index_binlog(path, index)
+    if write:
+        index.write(index_path)
+    return index
+
+
+class BinLogIndexes(object):
+    """Indexes of consecutive binlog files"""
+
+    def __init__(self, indexes):
+        """
+        Attributes:
+        indexes: BinLogIndex of every file, in binlog order
+        """
+        self.indexes = list(indexes)
+
+    @classmethod
+    def load(cls, paths, *, write=True):
+        """Indexes of the binlog files at paths, see load_index"""
+        return cls([load_index(path, write=write) for path in paths])
+
+    def find_timestamp(self, timestamp):
+        """Return (log_file, log_pos) to start reading from to get every
+        transaction committed at or after timestamp, None if there is none
+        """
+        for index in self.indexes:
+            entry = index.find_timestamp(timestamp)
+            if entry is not None:
+                return index.log_file, entry.offset
+        return None
+
+    def find_gtid(self, gtid):
+        """Return (log_file, entry) of transaction gtid, None if it is not
+        in the files"""
+        for index in self.indexes:
+            entry = index.find_gtid(gtid)
+            if entry is not None:
+                return index.log_file, entry
+        return None
+
+    def files_touching(self, schema, table):
+        """Names of the files with transactions changing schema.table"""
+        return [index.log_file for index in self.indexes
+                if index.touches(schema, table)]
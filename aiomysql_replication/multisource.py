@@ -0,0 +1,127 @@
+import asyncio
+
+from .binlogstream import BinLogStreamReader
+from .schema import SchemaCache
+from .utils import PY_35
+
+
+__all__ = ['create_multi_source_reader', 'MultiSourceReader']
+
+
+def create_multi_source_reader(*args, **kwargs):
+    reader = MultiSourceReader(*args, **kwargs)
+    yield from reader._connect()
+    return reader
+
+
+class MultiSourceReader(object):
+    """Read several masters on one event loop
+
+    fetchone returns (source, event) tuples. Sources are served in turn
+    among the ones with an event ready, so a busy master does not starve
+    the others. Each source is read one event at a time, the next read of
+    a source starts when the consumer asks for the next event, which keeps
+    the checkpoints of every source right.
+    """
+
+    def __init__(self, sources, server_id, *, schema_cache=None,
+                 share_schema_cache=False, checkpoint_stores=None,
+                 server_ids=None, loop, **kwargs):
+        """
+        Attributes:
+        sources: Dict of connection settings by source name
+        server_id: Server id of this slave on every master
+        schema_cache: SchemaCache shared by the sources
+        share_schema_cache: Share one SchemaCache between sources, off by
+                            default, only for masters with identical
+                            schemas
+        checkpoint_stores: Dict of CheckpointStore by source name
+        server_ids: Dict of server ids by source name overriding server_id,
+                    needed when two sources are the same master
+        Other keyword arguments are passed to every BinLogStreamReader.
+        """
+        if schema_cache is None and share_schema_cache:
+            schema_cache = SchemaCache()
+        checkpoint_stores = checkpoint_stores or {}
+        server_ids = server_ids or {}
+        self._loop = loop
+        self._names = list(sources)
+        self._readers = {}
+        for name in self._names:
+            self._readers[name] = BinLogStreamReader(
+                dict(sources[name]), server_ids.get(name, server_id),
+                schema_cache=schema_cache,
+                checkpoint_store=checkpoint_stores.get(name), loop=loop,
+                **kwargs)
+        # read in progress by source, None once its event was returned
+        self._fetches = dict.fromkeys(self._names)
+        self._finished = set()
+        # index of the source served first on the next fetch
+        self._next = 0
+
+    @asyncio.coroutine
+    def _connect(self):
+        yield from asyncio.gather(
+            *[reader._connect() for reader in self._readers.values()],
+            loop=self._loop)
+
+    @property
+    def readers(self):
+        """BinLogStreamReader by source name"""
+        return dict(self._readers)
+
+    @property
+    def positions(self):
+        """(log_file, log_pos) of the last event read by source name"""
+        return dict((name, (reader.log_file, reader.log_pos))
+                    for name, reader in self._readers.items())
+
+    def close(self):
+        for fetch in self._fetches.values():
+            if fetch is not None:
+                fetch.cancel()
+        self._fetches = dict.fromkeys(self._names)
+        for reader in self._readers.values():
+            reader.close()
+
+    @asyncio.coroutine
+    def fetchone(self):
+        """Return next (source, event), None once every non blocking source
+        reached its end"""
+        while True:
+            for name in self._names:
+                if name not in self._finished and self._fetches[name] is None:
+                    self._fetches[name] = self._loop.create_task(
+                        self._readers[name].fetchone())
+            if len(self._finished) == len(self._names):
+                return None
+
+            count = len(self._names)
+            for i in range(count):
+                name = self._names[(self._next + i) % count]
+                fetch = self._fetches[name]
+                if fetch is None or not fetch.done():
+                    continue
+                self._fetches[name] = None
+                event = fetch.result()
+                if event is None:
+                    self._finished.add(name)
+                    break
+                self._next = (self._next + i + 1) % count
+                return name, event
+            else:
+                pending = [f for f in self._fetches.values() if f is not None]
+                yield from asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED,
+                    loop=self._loop)
+
+    if PY_35:
+        def __aiter__(self):
+            return self
+
+        @asyncio.coroutine
+        def __anext__(self):
+            item = yield from self.fetchone()
+            if item is None:
+                raise StopAsyncIteration  # noqa
+            return item
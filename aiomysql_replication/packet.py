@@ -16,6 +16,77 @@ UNSIGNED_SHORT_LENGTH = 2
 UNSIGNED_INT24_LENGTH = 3
 UNSIGNED_INT64_LENGTH = 8
 
+# Offsets inside a binlog network packet, the event header follows the OK
+# byte: timestamp (4) event_type (1) server_id (4) event_size (4)
+# log_pos (4) flags (2)
+TIMESTAMP_OFFSET = 1
+EVENT_TYPE_OFFSET = 5
+LOG_POS_OFFSET = 14
+# Rows and table map events start their post-header with a 6 bytes table id
+TABLE_ID_OFFSET = 20
+
+ROWS_EVENT_TYPES = frozenset([
+    BinLog.UPDATE_ROWS_EVENT_V1, BinLog.WRITE_ROWS_EVENT_V1,
+    BinLog.DELETE_ROWS_EVENT_V1, BinLog.UPDATE_ROWS_EVENT_V2,
+    BinLog.WRITE_ROWS_EVENT_V2, BinLog.DELETE_ROWS_EVENT_V2])
+
+
+def peek_timestamp(data):
+    """Read creation time of the event from a raw packet"""
+    return struct.unpack_from('<I', data, TIMESTAMP_OFFSET)[0]
+
+
+def peek_event_type(data):
+    """Read event type of a raw packet without consuming it"""
+    return byte2int(data[EVENT_TYPE_OFFSET])
+
+
+def peek_log_pos(data):
+    """Read position of the next event from a raw packet"""
+    return struct.unpack_from('<I', data, LOG_POS_OFFSET)[0]
+
+
+def peek_table_id(data):
+    """Read table id of a raw rows or table map event packet"""
+    return struct.unpack(
+        '<Q', data[TABLE_ID_OFFSET:TABLE_ID_OFFSET + 6] + b'\0\0')[0]
+
+
+class RawPacket(object):
+    """Packet interface over bytes of an event that was not read from a
+    connection: decoded in another process, read from a file, etc.
+
+    Like network packets data starts with the OK byte.
+    """
+
+    __slots__ = ('_data', '_position')
+
+    def __init__(self, data):
+        self._data = data
+        self._position = 0
+
+    def get_all_data(self):
+        return self._data
+
+    def read(self, size):
+        end = self._position + size
+        if end > len(self._data):
+            raise AssertionError("Result length not requested length: "
+                                 "expected %d, have %d" %
+                                 (size, len(self._data) - self._position))
+        result = self._data[self._position:end]
+        self._position = end
+        return result
+
+    def advance(self, length):
+        self._position += length
+
+    def is_ok_packet(self):
+        return byte2int(self._data[0]) == 0
+
+    def is_eof_packet(self):
+        return byte2int(self._data[0]) == 254 and len(self._data) < 9
+
 
 class BinLogPacketWrapper(object):
     """
@@ -33,6 +104,7 @@ class BinLogPacketWrapper(object):
         BinLog.INTVAR_EVENT: event.NotImplementedEvent,
         BinLog.GTID_LOG_EVENT: event.GtidEvent,
         BinLog.STOP_EVENT: event.StopEvent,
+        BinLog.HEARTBEAT_LOG_EVENT: event.HeartbeatLogEvent,
         # row_event
         BinLog.UPDATE_ROWS_EVENT_V1: row_event.UpdateRowsEvent,
         BinLog.WRITE_ROWS_EVENT_V1: row_event.WriteRowsEvent,
@@ -49,8 +121,7 @@ class BinLogPacketWrapper(object):
 
     def __init__(self, from_packet, table_map, ctl_connection, use_checksum,
                  allowed_events,
-                 only_tables,
-                 only_schemas,
+                 table_filter,
                  freeze_schema):
         # -1 because we ignore the ok byte
         self.read_bytes = 0
@@ -58,7 +129,8 @@ class BinLogPacketWrapper(object):
         self._data_buffer = b''
 
         self.packet = from_packet
-        self.charset = ctl_connection.charset
+        # events decoded outside of the reader have no control connection
+        self.charset = getattr(ctl_connection, 'charset', None)
 
         # OK value
         # timestamp
@@ -91,12 +163,22 @@ class BinLogPacketWrapper(object):
             return
         self.event = event_class(self, event_size_without_header, table_map,
                                  ctl_connection,
-                                 only_tables=only_tables,
-                                 only_schemas=only_schemas,
+                                 table_filter=table_filter,
                                  freeze_schema=freeze_schema)
         if not self.event._processed:
             self.event = None
 
+    def __getstate__(self):
+        # the network packet is only needed while the event is decoded
+        state = self.__dict__.copy()
+        state['packet'] = None
+        state['_data_buffer'] = b''
+        return state
+
+    def __setstate__(self, state):
+        # set before __getattr__ can look for the missing packet
+        self.__dict__.update(state)
+
     def read(self, size):
         size = int(size)
         self.read_bytes += size
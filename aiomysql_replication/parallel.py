@@ -0,0 +1,52 @@
+"""Row decoding in executor workers
+
+Rows events are decoded from their raw packet bytes and a compact table
+descriptor, both picklable, so decoding can run in a ProcessPoolExecutor.
+"""
+import itertools
+
+from .column import Column
+from .packet import BinLogPacketWrapper, RawPacket, peek_event_type
+from .table import Table
+
+
+__all__ = ['table_descriptor', 'decode_rows']
+
+_descriptor_ids = itertools.count()
+
+# Tables rebuilt by this worker process, keyed by descriptor id
+_worker_tables = {}
+_WORKER_TABLES_LIMIT = 1024
+
+
+def table_descriptor(table):
+    """Compact picklable form of a Table"""
+    return (next(_descriptor_ids), table.table_id, table.schema,
+            table.table, table.primary_key,
+            [c.serializable_data() for c in table.columns])
+
+
+def _table_from_descriptor(descriptor):
+    descriptor_id = descriptor[0]
+    try:
+        return _worker_tables[descriptor_id]
+    except KeyError:
+        pass
+    _, table_id, schema, name, primary_key, columns = descriptor
+    table = Table(None, table_id, schema, name,
+                  [Column(**c) for c in columns], primary_key)
+    if len(_worker_tables) >= _WORKER_TABLES_LIMIT:
+        _worker_tables.clear()
+    _worker_tables[descriptor_id] = table
+    return table
+
+
+def decode_rows(data, descriptor, use_checksum):
+    """Return rows of the rows event in raw packet data"""
+    table = _table_from_descriptor(descriptor)
+    event_class = BinLogPacketWrapper._event_map[peek_event_type(data)]
+    binlog_event = BinLogPacketWrapper(RawPacket(data),
+                                       {table.table_id: table}, None,
+                                       use_checksum, frozenset([event_class]),
+                                       None, False)
+    return binlog_event.event.rows
@@ -0,0 +1,267 @@
+"""Route row changes to parallel workers without reordering a row
+
+Rows are assigned to a partition by a hash of (schema, table, primary key),
+so every change of a row goes through the same partition queue in binlog
+order. Workers acknowledge what they applied and the dispatcher tracks the
+position every event before which is acknowledged.
+"""
+import asyncio
+import collections
+import zlib
+
+from .checkpoint import Checkpoint
+from .event import GtidEvent
+from .gtid import GtidSet
+from .row_event import RowsEvent, UpdateRowsEvent
+from .transaction import _TransactionBoundaries
+from .utils import PY_35
+
+
+__all__ = ['PartitionedDispatcher', 'Partition', 'PartitionItem']
+
+# marks the end of the upstream stream in partition queues
+_EOF = object()
+
+
+class PartitionItem(object):
+    """Rows of one rows event that belong to one partition
+
+    Attributes:
+        event: The RowsEvent
+        rows: Rows of event routed to this partition, in binlog order
+        partition: Index of the partition
+    """
+
+    __slots__ = ('event', 'rows', 'partition', '_dispatcher', '_seq',
+                 '_acked')
+
+    def __init__(self, dispatcher, seq, event, rows, partition):
+        self._dispatcher = dispatcher
+        self._seq = seq
+        self._acked = False
+        self.event = event
+        self.rows = rows
+        self.partition = partition
+
+    def ack(self):
+        """Tell the dispatcher these rows are applied, later calls do
+        nothing"""
+        if self._acked:
+            return
+        self._acked = True
+        self._dispatcher._ack(self._seq)
+
+
+class Partition(object):
+    """Queue of the items of one partition"""
+
+    def __init__(self, index, max_queue, loop):
+        self.index = index
+        self._queue = asyncio.Queue(maxsize=max_queue, loop=loop)
+        self._eof = False
+
+    @asyncio.coroutine
+    def fetchone(self):
+        """Return next PartitionItem, None once the stream ended"""
+        if self._eof:
+            return None
+        item = yield from self._queue.get()
+        if item is _EOF:
+            self._eof = True
+            return None
+        if isinstance(item, Exception):
+            self._eof = True
+            raise item
+        return item
+
+    if PY_35:
+        def __aiter__(self):
+            return self
+
+        @asyncio.coroutine
+        def __anext__(self):
+            item = yield from self.fetchone()
+            if item is None:
+                raise StopAsyncIteration  # noqa
+            return item
+
+
+class PartitionedDispatcher(object):
+    """Split the rows events of a BinLogStreamReader into N partitions
+
+    Rows are routed by a hash of schema, table and primary key values, the
+    key before the change for updates. Rows of tables without primary key
+    all go to the partition of their table. A rows event with an update
+    moving a row to another partition is a barrier: it is dispatched whole
+    to one partition once every item before it is acknowledged, and items
+    after it wait for its acknowledgement. Other events are not
+    dispatched, XidEvent and QueryEvent must be delivered by the stream to
+    find transaction boundaries, and GtidEvent in GTID mode.
+
+    safe_position is the position after the last transaction whose rows
+    are all acknowledged, it is handed to checkpointer when it moves. When
+    the stream starts from auto_position the checkpoints also carry the
+    GTID set of those transactions.
+    """
+
+    def __init__(self, stream, partitions, *, max_queue=1000,
+                 checkpointer=None, loop):
+        """
+        Attributes:
+        stream: BinLogStreamReader to read events from
+        partitions: Number of partitions
+        max_queue: Maximum number of items waiting in a partition
+        checkpointer: Checkpointer saving safe_position
+        """
+        self._stream = stream
+        self._loop = loop
+        self._checkpointer = checkpointer
+        self.partitions = [Partition(i, max_queue, loop)
+                           for i in range(partitions)]
+        self._task = None
+
+        self._next_seq = 0
+        # parts not acknowledged yet by sequence number of rows event, in
+        # binlog order
+        self._pending = collections.OrderedDict()
+        # (sequence number of the next rows event, log_file, log_pos, gtid)
+        # of transaction ends not known safe yet
+        self._boundaries = collections.deque()
+        self._transactions = _TransactionBoundaries()
+        # GTID of the transaction being read, set of the safe ones
+        self._pending_gtid = None
+        self._gtid_delivered = None
+        self._checkpointed_seq = 0
+        # future waiting for every dispatched item to be acknowledged
+        self._idle = None
+        self.safe_position = None
+
+    def start(self):
+        self._task = self._loop.create_task(self._pump())
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._checkpointer is not None:
+            self._checkpointer.flush()
+
+    def partition_of(self, schema, table, primary_key, values):
+        if not primary_key:
+            key = (schema, table)
+        elif isinstance(primary_key, tuple):
+            key = (schema, table) + tuple(values.get(k) for k in primary_key)
+        else:
+            key = (schema, table, values.get(primary_key))
+        return zlib.crc32(repr(key).encode()) % len(self.partitions)
+
+    def _split(self, event):
+        """Return the rows of event by partition index, None when an
+        update moves a row to another partition"""
+        parts = collections.OrderedDict()
+        update = isinstance(event, UpdateRowsEvent)
+        values_key = 'before_values' if update else 'values'
+        for row in event.rows:
+            index = self.partition_of(event.schema, event.table,
+                                      event.primary_key, row[values_key])
+            if update and index != self.partition_of(
+                    event.schema, event.table, event.primary_key,
+                    row['after_values']):
+                return None
+            parts.setdefault(index, []).append(row)
+        return parts
+
+    @asyncio.coroutine
+    def _wait_acknowledged(self):
+        while self._pending:
+            self._idle = asyncio.Future(loop=self._loop)
+            yield from self._idle
+
+    @asyncio.coroutine
+    def _pump(self):
+        stream = self._stream
+        while True:
+            try:
+                event = yield from stream.fetchone()
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                yield from self._broadcast(error)
+                return
+            if event is None:
+                yield from self._broadcast(_EOF)
+                return
+
+            if isinstance(event, RowsEvent):
+                parts = self._split(event)
+                barrier = parts is None
+                if barrier:
+                    # the old and new keys of a row are in different
+                    # partitions, no change of either may run beside it
+                    yield from self._wait_acknowledged()
+                    row = event.rows[0]
+                    index = self.partition_of(event.schema, event.table,
+                                              event.primary_key,
+                                              row['before_values'])
+                    parts = {index: list(event.rows)}
+                if not parts:
+                    continue
+                seq = self._next_seq
+                self._next_seq += 1
+                self._pending[seq] = len(parts)
+                for index, rows in parts.items():
+                    item = PartitionItem(self, seq, event, rows, index)
+                    yield from self.partitions[index]._queue.put(item)
+                if barrier:
+                    yield from self._wait_acknowledged()
+            elif isinstance(event, GtidEvent):
+                self._pending_gtid = event.gtid
+            elif self._transactions.ends_transaction(event):
+                gtid, self._pending_gtid = self._pending_gtid, None
+                self._boundaries.append(
+                    (self._next_seq, stream.log_file, stream.log_pos, gtid))
+                self._advance()
+
+    @asyncio.coroutine
+    def _broadcast(self, item):
+        for partition in self.partitions:
+            yield from partition._queue.put(item)
+
+    def _ack(self, seq):
+        self._pending[seq] -= 1
+        if self._pending[seq] == 0:
+            self._advance()
+
+    def _advance(self):
+        pending = self._pending
+        while pending:
+            seq = next(iter(pending))
+            if pending[seq]:
+                break
+            del pending[seq]
+        if not pending and self._idle is not None:
+            if not self._idle.done():
+                self._idle.set_result(None)
+            self._idle = None
+        # lowest rows event not fully acknowledged
+        low_watermark = next(iter(pending)) if pending else self._next_seq
+
+        boundary = None
+        while self._boundaries and self._boundaries[0][0] <= low_watermark:
+            boundary = self._boundaries.popleft()
+            gtid = boundary[3]
+            if gtid is not None and self._stream.auto_position:
+                if self._gtid_delivered is None:
+                    self._gtid_delivered = GtidSet(self._stream.auto_position)
+                self._gtid_delivered.add(gtid)
+        if boundary is None:
+            return
+        seq, log_file, log_pos, _ = boundary
+        self.safe_position = (log_file, log_pos)
+        if self._checkpointer is not None:
+            gtid_set = None
+            if self._gtid_delivered is not None:
+                gtid_set = self._gtid_delivered.copy()
+            self._checkpointer.add(Checkpoint(log_file, log_pos, gtid_set),
+                                   events=seq - self._checkpointed_seq)
+            self._checkpointed_seq = seq
@@ -0,0 +1,107 @@
+import asyncio
+import collections
+
+
+__all__ = ['ReadAheadBuffer']
+
+
+class ReadAheadBuffer(object):
+    """Bounded buffer of packets filled by a background task
+
+    The task keeps reading from the replication connection while the
+    consumer decodes earlier events, so the socket is drained even when the
+    consumer stalls. Reading stops when max_packets packets or max_bytes
+    bytes are buffered. A single packet bigger than max_bytes is still
+    accepted when the buffer is empty.
+
+    A read error is handed to the consumer once the packets read before it
+    are consumed, and stops the task.
+    """
+
+    def __init__(self, read_packet, *, max_packets=None, max_bytes=None,
+                 loop):
+        self._read_packet = read_packet
+        self._max_packets = max_packets
+        self._max_bytes = max_bytes
+        self._loop = loop
+        self._packets = collections.deque()
+        self._size = 0
+        self._error = None
+        self._cond = asyncio.Condition(loop=loop)
+        self._task = None
+
+    def start(self):
+        self._task = self._loop.create_task(self._fill())
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._packets.clear()
+        self._size = 0
+
+    def __len__(self):
+        return len(self._packets)
+
+    @property
+    def size(self):
+        """Bytes currently buffered"""
+        return self._size
+
+    def _is_full(self):
+        if not self._packets:
+            return False
+        if (self._max_packets is not None
+                and len(self._packets) >= self._max_packets):
+            return True
+        if self._max_bytes is not None and self._size >= self._max_bytes:
+            return True
+        return False
+
+    @asyncio.coroutine
+    def _fill(self):
+        while True:
+            yield from self._cond.acquire()
+            try:
+                while self._is_full():
+                    yield from self._cond.wait()
+            finally:
+                self._cond.release()
+
+            try:
+                pkt = yield from self._read_packet()
+            except Exception as error:
+                item, size = error, 0
+            else:
+                item, size = pkt, len(pkt.get_all_data())
+
+            yield from self._cond.acquire()
+            try:
+                if size:
+                    self._packets.append((item, size))
+                    self._size += size
+                else:
+                    self._error = item
+                self._cond.notify_all()
+            finally:
+                self._cond.release()
+            # stop after an error or the end of a non blocking stream
+            if not size or item.is_eof_packet():
+                return
+
+    @asyncio.coroutine
+    def get(self):
+        """Return the oldest buffered packet, waiting for one if needed"""
+        yield from self._cond.acquire()
+        try:
+            while not self._packets and self._error is None:
+                yield from self._cond.wait()
+            if not self._packets:
+                error, self._error = self._error, None
+                raise error
+            pkt, size = self._packets.popleft()
+            self._size -= size
+            self._cond.notify_all()
+            return pkt
+        finally:
+            self._cond.release()
@@ -0,0 +1,361 @@
+"""One replication stream shared by many consumers
+
+A BinLogRelay reads events from a single BinLogStreamReader and hands each
+of them to every subscription interested in it. Subscriptions live in the
+same process, or in other local processes through serve_unix and
+connect_relay, events then travel pickled over a unix socket.
+"""
+import asyncio
+import collections
+import json
+import pickle
+import re
+import struct
+
+from .filters import TableFilter
+from .packet import BinLogPacketWrapper
+from .utils import PY_35
+
+
+__all__ = ['BinLogRelay', 'Subscription', 'RelayClient', 'connect_relay']
+
+# marks the end of the upstream stream in subscription queues
+_EOF = object()
+
+_FRAME_HEADER = struct.Struct('>I')
+
+_EVENT_CLASSES = dict((cls.__name__, cls) for cls in
+                      BinLogPacketWrapper._event_map.values())
+
+
+class Subscription(object):
+    """Events of a relay selected by event class and table filter
+
+    Attributes:
+        log_file: Binlog file of the last event returned
+        log_pos: Position following the last event returned
+    """
+
+    def __init__(self, relay, only_events, table_filter, max_queue,
+                 max_backlog, overflow, loop):
+        if overflow not in ('close', 'drop'):
+            raise ValueError("overflow must be 'close' or 'drop'")
+        self._relay = relay
+        self._only_events = (frozenset(only_events)
+                             if only_events is not None else None)
+        self._table_filter = table_filter
+        self._queue = asyncio.Queue(maxsize=max_queue, loop=loop)
+        # items offered by the relay, moved to the queue by the feeder
+        self._backlog = collections.deque()
+        self._max_backlog = max_backlog
+        self._overflow = overflow
+        self._overflowed = False
+        self._wakeup = asyncio.Event(loop=loop)
+        self._feeder = loop.create_task(self._feed())
+        self._closed = False
+        self._eof = False
+        self.log_file = None
+        self.log_pos = None
+
+    def wants(self, event):
+        if self._only_events is not None and (
+                event.__class__ not in self._only_events):
+            return False
+        if self._table_filter is not None:
+            schema = getattr(event, 'schema', None)
+            table = getattr(event, 'table', None)
+            if (isinstance(table, str) and isinstance(schema, str)
+                    and not self._table_filter.matches(schema, table)):
+                return False
+        return True
+
+    def _offer(self, item):
+        # called by the relay, never waits for the subscriber
+        if self._closed or self._overflowed:
+            return
+        final = item is _EOF or isinstance(item, Exception)
+        if not final and len(self._backlog) >= self._max_backlog:
+            if self._overflow == 'drop':
+                return
+            # the subscriber gets the events it was sent, then the error
+            self._overflowed = True
+            item = BufferError("subscription is more than %d events behind "
+                               "the relay" % self._max_backlog)
+        self._backlog.append(item)
+        self._wakeup.set()
+
+    @asyncio.coroutine
+    def _feed(self):
+        while True:
+            while not self._backlog:
+                self._wakeup.clear()
+                yield from self._wakeup.wait()
+            item = self._backlog.popleft()
+            yield from self._queue.put(item)
+            if item is _EOF or isinstance(item, Exception):
+                return
+
+    @asyncio.coroutine
+    def fetchone(self):
+        """Return next event, None once the relay stopped"""
+        if self._eof or self._closed:
+            return None
+        item = yield from self._queue.get()
+        if item is _EOF:
+            self._eof = True
+            return None
+        if isinstance(item, Exception):
+            self._eof = True
+            raise item
+        event, self.log_file, self.log_pos = item
+        return event
+
+    if PY_35:
+        def __aiter__(self):
+            return self
+
+        @asyncio.coroutine
+        def __anext__(self):
+            event = yield from self.fetchone()
+            if event is None:
+                raise StopAsyncIteration  # noqa
+            return event
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._relay._unsubscribe(self)
+        self._feeder.cancel()
+        self._backlog.clear()
+
+
+class BinLogRelay(object):
+    """Fan out the events of one BinLogStreamReader to subscriptions
+
+    The upstream stream is read once, whatever the number of subscriptions.
+    Each subscription has a bounded queue filled by its own feeder task
+    from a backlog, so a slow subscription never holds the relay or the
+    other subscriptions back. When the backlog of a subscription is full
+    its overflow policy applies: 'close' ends it with a BufferError after
+    the events already sent, 'drop' discards events until it catches up.
+    Subscriptions added later start with the next event read, or end right
+    away once the stream ended.
+    """
+
+    def __init__(self, stream, *, max_client_queue=10000, loop):
+        """
+        Attributes:
+        stream: BinLogStreamReader to read events from
+        max_client_queue: Largest max_queue granted to clients of
+                          serve_unix, larger requests are capped
+        """
+        self._stream = stream
+        self._max_client_queue = max_client_queue
+        self._loop = loop
+        self._subscriptions = []
+        self._task = None
+        self._servers = []
+        # EOF or error that ended the stream
+        self._end = None
+
+    def subscribe(self, *, only_events=None, table_filter=None,
+                  max_queue=1000, max_backlog=10000, overflow='close'):
+        """
+        Attributes:
+        only_events: Event classes the subscription receives, all by default
+        table_filter: TableFilter applied to events with a schema and table
+        max_queue: Maximum number of events waiting for the subscriber
+        max_backlog: Maximum number of events waiting for room in the queue
+        overflow: 'close' or 'drop', what happens past max_backlog
+        """
+        subscription = Subscription(self, only_events, table_filter,
+                                    max_queue, max_backlog, overflow,
+                                    self._loop)
+        self._subscriptions.append(subscription)
+        if self._end is not None:
+            subscription._offer(self._end)
+        return subscription
+
+    def _unsubscribe(self, subscription):
+        try:
+            self._subscriptions.remove(subscription)
+        except ValueError:
+            pass
+
+    def start(self):
+        self._task = self._loop.create_task(self._pump())
+
+    @asyncio.coroutine
+    def _pump(self):
+        stream = self._stream
+        while True:
+            try:
+                event = yield from stream.fetchone()
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                self._broadcast(error)
+                return
+            if event is None:
+                self._broadcast(_EOF)
+                return
+            item = (event, stream.log_file, stream.log_pos)
+            for subscription in list(self._subscriptions):
+                if subscription.wants(event):
+                    subscription._offer(item)
+
+    def _broadcast(self, item):
+        self._end = item
+        for subscription in list(self._subscriptions):
+            subscription._offer(item)
+
+    @asyncio.coroutine
+    def serve_unix(self, path):
+        """Serve subscriptions to local processes on a unix socket at path,
+        see connect_relay"""
+        server = yield from asyncio.start_unix_server(
+            self._handle_client, path, loop=self._loop)
+        self._servers.append(server)
+        return server
+
+    @asyncio.coroutine
+    def _handle_client(self, reader, writer):
+        # the client sends its subscription as a JSON line
+        line = yield from reader.readline()
+        try:
+            request = json.loads(line.decode())
+        except ValueError:
+            writer.close()
+            return
+        try:
+            only_events = request.get("only_events")
+            if only_events is not None:
+                only_events = [_EVENT_CLASSES[name] for name in only_events
+                               if name in _EVENT_CLASSES]
+            table_filter = None
+            filter_args = request.get("table_filter")
+            if filter_args:
+                table_filter = TableFilter(**filter_args)
+            max_queue = request.get("max_queue", 1000)
+            if (not isinstance(max_queue, int) or
+                    isinstance(max_queue, bool) or max_queue <= 0):
+                raise ValueError("max_queue must be a positive integer")
+            max_queue = min(max_queue, self._max_client_queue)
+        except (AttributeError, TypeError, ValueError, re.error) as error:
+            # the client raises the error of its invalid subscription
+            try:
+                self._write_frame(writer, (ValueError(
+                    "invalid subscription: %s" % error), None, None))
+                yield from writer.drain()
+            except ConnectionError:
+                pass
+            finally:
+                writer.close()
+            return
+        subscription = self.subscribe(
+            only_events=only_events, table_filter=table_filter,
+            max_queue=max_queue)
+
+        try:
+            while True:
+                try:
+                    event = yield from subscription.fetchone()
+                except Exception as error:
+                    event = error
+                self._write_frame(writer, (event, subscription.log_file,
+                                           subscription.log_pos))
+                yield from writer.drain()
+                if event is None or isinstance(event, Exception):
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            subscription.close()
+            writer.close()
+
+    @staticmethod
+    def _write_frame(writer, item):
+        data = pickle.dumps(item, pickle.HIGHEST_PROTOCOL)
+        writer.write(_FRAME_HEADER.pack(len(data)) + data)
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for server in self._servers:
+            server.close()
+        self._servers = []
+        for subscription in list(self._subscriptions):
+            subscription.close()
+
+
+class RelayClient(object):
+    """Subscription of another process served by BinLogRelay.serve_unix
+
+    Only connect to relays you trust, events are unpickled.
+
+    Attributes:
+        log_file: Binlog file of the last event returned
+        log_pos: Position following the last event returned
+    """
+
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+        self._eof = False
+        self.log_file = None
+        self.log_pos = None
+
+    @asyncio.coroutine
+    def fetchone(self):
+        """Return next event, None once the relay stopped"""
+        if self._eof:
+            return None
+        try:
+            header = yield from self._reader.readexactly(_FRAME_HEADER.size)
+            size, = _FRAME_HEADER.unpack(header)
+            data = yield from self._reader.readexactly(size)
+        except asyncio.IncompleteReadError:
+            self._eof = True
+            return None
+        event, self.log_file, self.log_pos = pickle.loads(data)
+        if event is None:
+            self._eof = True
+        elif isinstance(event, Exception):
+            self._eof = True
+            raise event
+        return event
+
+    if PY_35:
+        def __aiter__(self):
+            return self
+
+        @asyncio.coroutine
+        def __anext__(self):
+            event = yield from self.fetchone()
+            if event is None:
+                raise StopAsyncIteration  # noqa
+            return event
+
+    def close(self):
+        self._writer.close()
+
+
+@asyncio.coroutine
+def connect_relay(path, *, only_events=None, table_filter=None,
+                  max_queue=1000, loop):
+    """Subscribe to a relay served on the unix socket at path
+
+    Attributes:
+    only_events: Event classes to receive, all by default
+    table_filter: Dict of TableFilter arguments, glob patterns only
+    max_queue: Maximum number of events the relay buffers for this client,
+               capped by the max_client_queue of the relay
+    """
+    reader, writer = yield from asyncio.open_unix_connection(path, loop=loop)
+    request = {"max_queue": max_queue, "table_filter": table_filter}
+    if only_events is not None:
+        request["only_events"] = [cls.__name__ for cls in only_events]
+    writer.write(json.dumps(request).encode() + b'\n')
+    return RelayClient(reader, writer)
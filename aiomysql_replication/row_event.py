@@ -7,6 +7,7 @@ from .bitmap import bit_count, bit_get
 from .consts import FieldType, BinLog
 from .column import Column
 from .event import BinLogEvent
+from .schema import SchemaCache
 from .table import Table
 from .utils import byte2int
 
@@ -21,30 +22,19 @@ class RowsEvent(BinLogEvent):
         super(RowsEvent, self).__init__(from_packet, event_size, table_map,
                                         ctl_connection, **kwargs)
         self._rows = None
-        self._only_tables = kwargs["only_tables"]
-        self._only_schemas = kwargs["only_schemas"]
 
         # Header
         self.table_id = self._read_table_id()
 
         # Additional information
         try:
-            self.primary_key = table_map[self.table_id].data["primary_key"]
+            self.primary_key = table_map[self.table_id].primary_key
             self.schema = self.table_map[self.table_id].schema
             self.table = self.table_map[self.table_id].table
         except KeyError:  # If we have filter the corresponding TableMap Event
             self._processed = False
             return
 
-        if (self._only_tables is not None and
-                self.table not in self._only_tables):
-            self._processed = False
-            return
-        if (self._only_schemas is not None and
-                self.schema not in self._only_schemas):
-            self._processed = False
-            return
-
         # Event V2
         if self.event_type == BinLog.WRITE_ROWS_EVENT_V2 or \
                 self.event_type == BinLog.DELETE_ROWS_EVENT_V2 or \
@@ -76,11 +66,10 @@ class RowsEvent(BinLogEvent):
         null_bitmap = self.packet.read((bit_count(cols_bitmap) + 7) / 8)
 
         nullBitmapIndex = 0
-        nb_columns = len(self.columns)
-        for i in range(0, nb_columns):
-            column = self.columns[i]
-            name = self.table_map[self.table_id].columns[i].name
-            unsigned = self.table_map[self.table_id].columns[i].unsigned
+        for i, column in enumerate(self.columns):
+            name = column.name
+            unsigned = column.unsigned
+            column_type = column.type
 
             if bit_get(cols_bitmap, i) == 0:
                 values[name] = None
@@ -88,70 +77,70 @@ class RowsEvent(BinLogEvent):
 
             if self._is_null(null_bitmap, nullBitmapIndex):
                 values[name] = None
-            elif column.type == FieldType.TINY:
+            elif column_type == FieldType.TINY:
                 if unsigned:
                     values[name] = struct.unpack("<B", self.packet.read(1))[0]
                 else:
                     values[name] = struct.unpack("<b", self.packet.read(1))[0]
-            elif column.type == FieldType.SHORT:
+            elif column_type == FieldType.SHORT:
                 if unsigned:
                     values[name] = struct.unpack("<H", self.packet.read(2))[0]
                 else:
                     values[name] = struct.unpack("<h", self.packet.read(2))[0]
-            elif column.type == FieldType.LONG:
+            elif column_type == FieldType.LONG:
                 if unsigned:
                     values[name] = struct.unpack("<I", self.packet.read(4))[0]
                 else:
                     values[name] = struct.unpack("<i", self.packet.read(4))[0]
-            elif column.type == FieldType.INT24:
+            elif column_type == FieldType.INT24:
                 if unsigned:
                     values[name] = self.packet.read_uint24()
                 else:
                     values[name] = self.packet.read_int24()
-            elif column.type == FieldType.FLOAT:
+            elif column_type == FieldType.FLOAT:
                 values[name] = struct.unpack("<f", self.packet.read(4))[0]
-            elif column.type == FieldType.DOUBLE:
+            elif column_type == FieldType.DOUBLE:
                 values[name] = struct.unpack("<d", self.packet.read(8))[0]
-            elif (column.type == FieldType.VARCHAR or
-                  column.type == FieldType.STRING):
+            elif (column_type == FieldType.VARCHAR or
+                  column_type == FieldType.STRING):
                 if column.max_length > 255:
                     values[name] = self._read_string(2, column)
                 else:
                     values[name] = self._read_string(1, column)
-            elif column.type == FieldType.NEWDECIMAL:
+            elif column_type == FieldType.NEWDECIMAL:
                 values[name] = self._read_new_decimal(column)
-            elif column.type == FieldType.BLOB:
+            elif column_type == FieldType.BLOB:
                 values[name] = self._read_string(column.length_size, column)
-            elif column.type == FieldType.DATETIME:
+            elif column_type == FieldType.DATETIME:
                 values[name] = self._read_datetime()
-            elif column.type == FieldType.TIME:
+            elif column_type == FieldType.TIME:
                 values[name] = self._read_time()
-            elif column.type == FieldType.DATE:
+            elif column_type == FieldType.DATE:
                 values[name] = self._read_date()
-            elif column.type == FieldType.TIMESTAMP:
+            elif column_type == FieldType.TIMESTAMP:
                 values[name] = datetime.datetime.fromtimestamp(
                     self.packet.read_uint32())
 
             # For new date format:
-            elif column.type == FieldType.DATETIME2:
+            elif column_type == FieldType.DATETIME2:
                 values[name] = self._read_datetime2(column)
-            elif column.type == FieldType.TIME2:
+            elif column_type == FieldType.TIME2:
                 values[name] = self._read_time2(column)
-            elif column.type == FieldType.TIMESTAMP2:
+            elif column_type == FieldType.TIMESTAMP2:
                 values[name] = self._add_fsp_to_time(
                     datetime.datetime.fromtimestamp(
                         self.packet.read_int_be_by_size(4)), column)
-            elif column.type == FieldType.LONGLONG:
+            elif column_type == FieldType.LONGLONG:
                 if unsigned:
                     values[name] = self.packet.read_uint64()
                 else:
                     values[name] = self.packet.read_int64()
-            elif column.type == FieldType.YEAR:
+            elif column_type == FieldType.YEAR:
                 values[name] = self.packet.read_uint8() + 1900
-            elif column.type == FieldType.ENUM:
+            elif column_type == FieldType.ENUM:
                 values[name] = column.enum_values[
                     self.packet.read_uint_by_size(column.size) - 1]
-            elif column.type == FieldType.SET:
+            elif column_type == FieldType.SET:
                 # We read set columns as a bitmap telling us which options
                 # are enabled
                 bit_mask = self.packet.read_uint_by_size(column.size)
@@ -160,14 +149,14 @@ class RowsEvent(BinLogEvent):
                     if bit_mask & 2 ** idx
                 ) or None
 
-            elif column.type == FieldType.BIT:
+            elif column_type == FieldType.BIT:
                 values[name] = self._read_bit(column)
-            elif column.type == FieldType.GEOMETRY:
+            elif column_type == FieldType.GEOMETRY:
                 values[name] = self.packet.read_length_coded_pascal_string(
                     column.length_size)
             else:
                 raise NotImplementedError("Unknown MySQL column type: %d" %
-                                          (column.type))
+                                          (column_type))
 
             nullBitmapIndex += 1
 
@@ -179,13 +168,7 @@ class RowsEvent(BinLogEvent):
         http://dev.mysql.com/doc/internals/en/date-and-time-
         data-type-representation.html
         """
-        read = 0
-        if column.fsp == 1 or column.fsp == 2:
-            read = 1
-        elif column.fsp == 3 or column.fsp == 4:
-            read = 2
-        elif column.fsp == 5 or column.fsp == 6:
-            read = 3
+        read = column.fsp_bytes
         if read > 0:
             microsecond = self.packet.read_int_be_by_size(read)
             if column.fsp % 2:
@@ -196,8 +179,8 @@ class RowsEvent(BinLogEvent):
 
     def _read_string(self, size, column):
         string = self.packet.read_length_coded_pascal_string(size)
-        if column.character_set_name is not None:
-            string = string.decode(column.character_set_name)
+        if column.charset is not None:
+            string = string.decode(column.charset)
         return string
 
     def _read_bit(self, column):
@@ -396,6 +379,12 @@ class RowsEvent(BinLogEvent):
             self._fetch_rows()
         return self._rows
 
+    def __getstate__(self):
+        # rows can not be read once the packet is gone
+        if self._processed:
+            self.rows
+        return super(RowsEvent, self).__getstate__()
+
 
 class DeleteRowsEvent(RowsEvent):
     """This event is trigger when a row in the database is removed
@@ -516,8 +505,7 @@ class TableMapEvent(BinLogEvent):
                  **kwargs):
         super().__init__(from_packet, event_size, table_map, ctl_connection,
                          **kwargs)
-        self._only_tables = kwargs["only_tables"]
-        self._only_schemas = kwargs["only_schemas"]
+        self._table_filter = kwargs["table_filter"]
         self._freeze_schema = kwargs["freeze_schema"]
 
         # Post-Header
@@ -536,12 +524,8 @@ class TableMapEvent(BinLogEvent):
         self.table_length = byte2int(self.packet.read(1))
         self.table = self.packet.read(self.table_length).decode()
 
-        if (self._only_tables is not None
-                and self.table not in self._only_tables):
-            self._processed = False
-            return
-        if self._only_schemas is not None \
-                and self.schema not in self._only_schemas:
+        if (self._table_filter is not None
+                and not self._table_filter.matches(self.schema, self.table)):
             self._processed = False
             return
 
@@ -556,15 +540,17 @@ class TableMapEvent(BinLogEvent):
 
     @asyncio.coroutine
     def load_table_schema(self):
+        column_types = list(self.packet.read(self.column_count))
+        self.packet.read_length_coded_binary()
+
         if self.table_id in self._table_map:
             self.column_schemas = self.table_map[self.table_id].column_schemas
         else:
             tbl_info = self._ctl_connection._get_table_information
-            self.column_schemas = yield from tbl_info(self.schema, self.table)
+            self.column_schemas = yield from tbl_info(
+                self.schema, self.table, SchemaCache.fingerprint(column_types))
 
         # Read columns meta data
-        column_types = list(self.packet.read(self.column_count))
-        self.packet.read_length_coded_binary()
         for i in range(0, len(column_types)):
             column_type = column_types[i]
             column_schema = self.column_schemas[i]
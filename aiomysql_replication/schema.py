@@ -0,0 +1,132 @@
+import asyncio
+import binascii
+import re
+
+
+__all__ = ['SchemaCache', 'ddl_tables']
+
+
+# leading keyword of statements changing table definitions, after comments
+_DDL_RE = re.compile(r'\s*(?:/\*.*?\*/\s*)*(?:ALTER|CREATE|DROP|RENAME)\b',
+                     re.IGNORECASE | re.DOTALL)
+_IDENTIFIER_RE = re.compile(r'`((?:[^`]|``)+)`|([\w$]+)')
+
+
+def ddl_tables(schema, query):
+    """Return a function (schema, table) telling whether the DDL query run
+    with default schema may change the columns of that table, None if query
+    is not DDL.
+
+    Names are not parsed, a table matches when its name appears in the
+    query, so an unrelated table may match too but a changed one is never
+    missed.
+    """
+    if not _DDL_RE.match(query):
+        return None
+    names = set()
+    for quoted, plain in _IDENTIFIER_RE.findall(query):
+        names.add(quoted.replace('``', '`').lower() if quoted
+                  else plain.lower())
+    default_schema = (schema or '').lower()
+    # DROP DATABASE and ALTER SCHEMA concern every table of the schema
+    whole_schema = 'database' in names or 'schema' in names
+
+    def matches(schema, table):
+        schema = schema.lower()
+        if whole_schema and schema in names:
+            return True
+        return (table.lower() in names and
+                (schema == default_schema or schema in names))
+    return matches
+
+
+class SchemaCache(object):
+    """Column schemas fetched from information_schema, keyed by
+    (schema, table).
+
+    Table ids are only valid inside one binlog file, but table definitions
+    usually live much longer. Every entry remembers the fingerprint of the
+    column types announced by the TableMapEvent it was loaded for, so an
+    ALTER TABLE that changes the column layout invalidates the entry. DDL
+    keeping the column types, like renaming a column, is only seen in its
+    QueryEvent and the reader calls invalidate_matching for it.
+
+    Concurrent lookups of the same table are coalesced, only one query per
+    (schema, table) is in flight at a time.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._inflight = {}
+
+    @staticmethod
+    def fingerprint(column_types):
+        """Fingerprint of the column type bytes of a TableMapEvent"""
+        return binascii.hexlify(bytes(column_types)).decode()
+
+    def get(self, schema, table, fingerprint):
+        try:
+            cached_fingerprint, column_schemas = \
+                self._entries[(schema, table)]
+        except KeyError:
+            return None
+        if cached_fingerprint != fingerprint:
+            return None
+        return column_schemas
+
+    @asyncio.coroutine
+    def lookup(self, schema, table, fingerprint, fetch, *, loop):
+        """Return column schemas of table, calling coroutine function
+        fetch(schema, table) on a miss"""
+        column_schemas = self.get(schema, table, fingerprint)
+        if column_schemas is not None:
+            return column_schemas
+
+        key = (schema, table, fingerprint)
+        task = self._inflight.get(key)
+        if task is None:
+            task = loop.create_task(fetch(schema, table))
+            self._inflight[key] = task
+            task.add_done_callback(
+                lambda t: self._fetch_done(key, t))
+        # one cancelled waiter must not cancel the lookup for the others
+        return (yield from asyncio.shield(task, loop=loop))
+
+    def _fetch_done(self, key, task):
+        del self._inflight[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        schema, table, fingerprint = key
+        if fingerprint is not None:
+            self.set(schema, table, fingerprint, task.result())
+
+    def set(self, schema, table, fingerprint, column_schemas):
+        self._entries[(schema, table)] = (fingerprint, column_schemas)
+
+    def invalidate(self, schema, table):
+        self._entries.pop((schema, table), None)
+
+    def invalidate_matching(self, matches):
+        """Invalidate the entries for which matches(schema, table) is true,
+        see ddl_tables"""
+        for schema, table in list(self._entries):
+            if matches(schema, table):
+                del self._entries[(schema, table)]
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def serializable_data(self):
+        return [[schema, table, fingerprint, column_schemas]
+                for (schema, table), (fingerprint, column_schemas)
+                in self._entries.items()]
+
+    def update_from_data(self, data):
+        for schema, table, fingerprint, column_schemas in data:
+            self._entries[(schema, table)] = (fingerprint, column_schemas)
@@ -0,0 +1,88 @@
+import json
+import os
+import zlib
+
+from .column import Column
+from .schema import SchemaCache
+from .table import Table
+
+
+__all__ = ['Snapshot', 'read_snapshot', 'write_snapshot']
+
+SNAPSHOT_VERSION = 1
+
+
+class Snapshot(object):
+    """State needed to restart a reader without a cold schema cache
+
+    Attributes:
+        log_file: Binlog file the reader was reading
+        log_pos: Position of the next event in log_file
+        auto_position: GTID set used with master_auto_position
+        table_map: Table objects keyed by table id, only valid for log_file
+        schema_cache: SchemaCache with information_schema rows per table
+    """
+
+    def __init__(self, log_file=None, log_pos=None, auto_position=None,
+                 table_map=None, schema_cache=None):
+        self.log_file = log_file
+        self.log_pos = log_pos
+        self.auto_position = auto_position
+        self.table_map = table_map if table_map is not None else {}
+        self.schema_cache = (schema_cache if schema_cache is not None
+                             else SchemaCache())
+
+    def serializable_data(self):
+        tables = []
+        for table in self.table_map.values():
+            data = dict(table.serializable_data())
+            data["columns"] = [c.serializable_data() for c in data["columns"]]
+            tables.append(data)
+        return {
+            "version": SNAPSHOT_VERSION,
+            "log_file": self.log_file,
+            "log_pos": self.log_pos,
+            "auto_position": self.auto_position,
+            "tables": tables,
+            "schemas": self.schema_cache.serializable_data(),
+        }
+
+    @classmethod
+    def from_data(cls, data):
+        if data.get("version") != SNAPSHOT_VERSION:
+            raise ValueError("Unsupported snapshot version: %r" %
+                             data.get("version"))
+        table_map = {}
+        for table_data in data["tables"]:
+            table_data = dict(table_data)
+            table_data["columns"] = [Column(**c)
+                                     for c in table_data["columns"]]
+            # JSON has no tuples, composite primary keys come back as lists
+            if isinstance(table_data["primary_key"], list):
+                table_data["primary_key"] = tuple(table_data["primary_key"])
+            table = Table(**table_data)
+            table_map[table.table_id] = table
+        schema_cache = SchemaCache()
+        schema_cache.update_from_data(data["schemas"])
+        return cls(data["log_file"], data["log_pos"], data["auto_position"],
+                   table_map, schema_cache)
+
+
+def write_snapshot(path, snapshot):
+    """Atomically replace the snapshot stored at path"""
+    payload = json.dumps(snapshot.serializable_data(),
+                         separators=(',', ':')).encode()
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(zlib.compress(payload))
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path):
+    """Load the snapshot stored at path, None if there is no snapshot"""
+    try:
+        with open(path, 'rb') as f:
+            payload = f.read()
+    except FileNotFoundError:
+        return None
+    return Snapshot.from_data(json.loads(zlib.decompress(payload).decode()))
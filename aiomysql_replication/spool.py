@@ -0,0 +1,641 @@
+"""Local spool of the raw events of a replication stream
+
+A Spool appends the events read by a BinLogStreamReader to segment files
+of a directory, whole transactions at a time, with a small index of the
+master positions found in them. Every segment starts like a dump, with
+an artificial format description and rotate event, so SpoolReader can
+replay the spool from a master position with a BinLogFileReader instead
+of reading the master again. Old segments are removed once the spool is
+larger than max_bytes or they are older than max_age.
+
+With compression, segments are cut into blocks of about block_size bytes
+compressed one by one. The offsets of the blocks are kept next to the
+segment, reading from a position decompresses the blocks from the one
+holding it. Events flushed before their block is full wait uncompressed
+in a tail file of the segment, removed when the segment is closed.
+"""
+import bisect
+import json
+import lzma
+import mmap
+import os
+import struct
+import time
+import zlib
+
+from .binlogfile import (
+    BINLOG_MAGIC, EVENT_HEADER_SIZE, EVENT_SIZE_OFFSET, EVENT_TYPE_OFFSET,
+    BinLogFileReader, _BinLogFiles, _checksum_enabled)
+from .consts import BinLog
+from .index import _query_prefix
+
+
+__all__ = ['Spool', 'SpoolReader', 'create_spool_reader']
+
+SEGMENT_PREFIX = 'spool.'
+INDEX_SUFFIX = '.index'
+BLOCKS_SUFFIX = '.blocks'
+TAIL_SUFFIX = '.tail'
+
+# compress and decompress functions by name, written as the first bytes
+# of the blocks file of a compressed segment
+_CODECS = {
+    b'zlib': (zlib.compress, zlib.decompress),
+    b'lzma': (lzma.compress, lzma.decompress),
+}
+# uncompressed and compressed end offsets of a block
+_BLOCK = struct.Struct('<QQ')
+# uncompressed offset of the first byte of a tail file
+_TAIL = struct.Struct('<Q')
+
+# timestamp (4) event_type (1) server_id (4) event_size (4) log_pos (4)
+# flags (2)
+_HEADER = struct.Struct('<IBIIIH')
+_LOG_POS_OFFSET = 13
+# flag of the events the master generates, like the ones starting a dump
+LOG_EVENT_ARTIFICIAL_F = 0x20
+
+
+def _segment_seq(name):
+    if not name.startswith(SEGMENT_PREFIX):
+        return None
+    seq = name[len(SEGMENT_PREFIX):]
+    return int(seq) if seq.isdigit() else None
+
+
+def _read_blocks(path):
+    """Return the codec name and the block ends of the compressed segment
+    at path, None if it is not compressed"""
+    try:
+        with open(path + BLOCKS_SUFFIX, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    codec = data[:4]
+    count = (len(data) - len(codec)) // _BLOCK.size
+    return codec, [_BLOCK.unpack_from(data, len(codec) + i * _BLOCK.size)
+                   for i in range(count)]
+
+
+def _read_tail(path):
+    """Return the uncompressed offset and the content of the tail of the
+    compressed segment at path, (0, b'') without tail"""
+    try:
+        with open(path + TAIL_SUFFIX, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return 0, b''
+    if len(data) < _TAIL.size:
+        return 0, b''
+    start, = _TAIL.unpack_from(data)
+    return start, data[_TAIL.size:]
+
+
+def _write_tail(path, start, data):
+    with open(path + TAIL_SUFFIX, 'wb') as f:
+        f.write(_TAIL.pack(start) + data)
+
+
+class _BlockReader(object):
+    """Content of a compressed segment, decompressed a block at a time"""
+
+    def __init__(self, path):
+        # the tail is read first, the blocks written before it was
+        # started are then listed
+        self._tail_start, self._tail = _read_tail(path)
+        codec, blocks = _read_blocks(path)
+        self._decompress = _CODECS[codec][1]
+        self._raw_ends = [raw_end for raw_end, _ in blocks]
+        self._file_ends = [file_end for _, file_end in blocks]
+        self._blocks_end = self._raw_ends[-1] if self._raw_ends else 0
+        self._file = open(path, 'rb')
+        self._cached_index = None
+        self._cached = b''
+
+    def __len__(self):
+        return max(self._blocks_end, self._tail_start + len(self._tail))
+
+    def _block(self, i):
+        if self._cached_index != i:
+            start = self._file_ends[i - 1] if i else 0
+            self._file.seek(start)
+            self._cached = self._decompress(
+                self._file.read(self._file_ends[i] - start))
+            self._cached_index = i
+        return self._cached
+
+    def __getitem__(self, key):
+        start, stop, _ = key.indices(len(self))
+        parts = []
+        while start < stop:
+            if start >= self._blocks_end:
+                part = self._tail[start - self._tail_start:
+                                  stop - self._tail_start]
+                parts.append(part)
+                break
+            i = bisect.bisect_right(self._raw_ends, start)
+            block_start = self._raw_ends[i - 1] if i else 0
+            part = self._block(i)[start - block_start:stop - block_start]
+            parts.append(part)
+            start += len(part)
+        return parts[0] if len(parts) == 1 else b''.join(parts)
+
+    def close(self):
+        self._file.close()
+
+
+def _open_segment_data(path):
+    if os.path.exists(path + BLOCKS_SUFFIX):
+        return _BlockReader(path)
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _truncate(path, size):
+    """Drop what follows the first size bytes of the content of the segment
+    at path"""
+    blocks = _read_blocks(path)
+    if blocks is None:
+        if os.path.getsize(path) > size:
+            os.truncate(path, size)
+        return
+    codec, blocks = blocks
+    tail_start, tail = _read_tail(path)
+    count = bisect.bisect_right(blocks, (size, float('inf')))
+    start = blocks[count - 1][0] if count else 0
+    covered = tail_start <= start and size <= tail_start + len(tail)
+    if size > start and not covered and count < len(blocks):
+        # the block holding size was cut after the flush, its start goes
+        # back to the tail
+        file_start = blocks[count - 1][1] if count else 0
+        with open(path, 'rb') as f:
+            f.seek(file_start)
+            data = _CODECS[codec][1](f.read(blocks[count][1] - file_start))
+        tail_start, tail = start, data
+    if os.path.exists(path + TAIL_SUFFIX) or size > start:
+        _write_tail(path, tail_start, tail[:max(size - tail_start, 0)])
+    os.truncate(path + BLOCKS_SUFFIX, len(codec) + count * _BLOCK.size)
+    os.truncate(path, blocks[count - 1][1] if count else 0)
+
+
+class Spool(object):
+    """Segment files with the raw events of a replication stream
+
+    Events are given to append in stream order, a BinLogStreamReader does
+    it for the spool it was created with. Only complete transactions are
+    written: the events of a transaction interrupted by a new dump, after
+    a reconnect, are dropped and come again with the dump.
+
+    Master positions are expected to grow along the spool, like the ones
+    of a stream resumed from its checkpoints.
+    """
+
+    def __init__(self, directory, *, segment_size=64 * 1024 * 1024,
+                 index_interval=64 * 1024, max_bytes=None, max_age=None,
+                 flush_interval=1.0, compression=None,
+                 block_size=256 * 1024):
+        """
+        Attributes:
+        directory: Directory of the segment files, created if needed
+        segment_size: Bytes after which a segment is closed and the next
+                      one started
+        index_interval: Bytes of events between two index entries, a
+                        lookup reads up to this number of bytes of headers
+        max_bytes: Remove the oldest segments once the spool is larger
+        max_age: Remove segments not written for this number of seconds
+        flush_interval: Seconds written events may stay buffered before
+                        readers see them
+        compression: 'zlib' or 'lzma' to compress the segments written,
+                     None to write them as they are
+        block_size: Bytes of events compressed together, larger blocks
+                    compress better and cost more to seek in
+        """
+        if compression is not None and compression.encode() not in _CODECS:
+            raise ValueError("Unknown compression: %r" % compression)
+        self.directory = directory
+        self._segment_size = segment_size
+        self._index_interval = index_interval
+        self._max_bytes = max_bytes
+        self._max_age = max_age
+        self._flush_interval = flush_interval
+        self._compression = (compression.encode()
+                             if compression is not None else None)
+        self._block_size = block_size
+        os.makedirs(directory, exist_ok=True)
+
+        # sequence numbers of the segments, the last one may be written
+        self._segments = []
+        # (log_file, log_pos) of the index entries and their
+        # (segment, offset), in spool order
+        self._keys = []
+        self._entries = []
+        self._file = None
+        self._index_file = None
+        self._size = 0
+        # compressed segment being written: blocks file, events of the
+        # next block, size of the segment file, blocks not flushed, tail
+        # file with the uncompressed offset and length of its content
+        self._blocks_file = None
+        self._block = bytearray()
+        self._file_size = 0
+        self._unflushed_blocks = []
+        self._tail_file = None
+        self._tail_start = None
+        self._tail_length = 0
+        self._indexed_size = 0
+        self._unflushed_entries = []
+        self._flushed_at = time.monotonic()
+
+        # master position of the last event appended, and of the last one
+        # written to a segment
+        self.log_file = None
+        self.log_pos = None
+        self._written = None
+        self._format_description = None
+        self._use_checksum = False
+        # rotate event of a dump waiting for its format description event
+        self._dump_rotate = None
+        self._jumped = False
+        # events of the transaction being appended
+        self._transaction = None
+        self._in_transaction = False
+        self._load()
+
+    def _path(self, seq):
+        return os.path.join(self.directory, '%s%06d' % (SEGMENT_PREFIX, seq))
+
+    def _load(self):
+        seqs = sorted(seq for seq in map(_segment_seq,
+                                         os.listdir(self.directory))
+                      if seq is not None)
+        for seq in seqs:
+            path = self._path(seq)
+            entries = []
+            try:
+                with open(path + INDEX_SUFFIX) as f:
+                    for line in f:
+                        try:
+                            entries.append(json.loads(line))
+                        except ValueError:
+                            # last line cut by a crash
+                            break
+            except FileNotFoundError:
+                pass
+            if not entries:
+                self._remove(seq)
+                continue
+            # events after the last entry were not flushed with their index
+            _truncate(path, entries[-1][2])
+            self._segments.append(seq)
+            for log_file, log_pos, offset in entries:
+                self._keys.append((log_file, log_pos))
+                self._entries.append((seq, offset))
+        self._expire()
+
+    def segment_paths(self):
+        """Paths of the segment files, oldest first"""
+        return [self._path(seq) for seq in self._segments]
+
+    def append(self, event):
+        """Add the raw bytes of the next event of the stream, without the
+        OK byte of its packet"""
+        event_type = event[EVENT_TYPE_OFFSET]
+        if event_type == BinLog.HEARTBEAT_LOG_EVENT:
+            # nothing else comes for a while, readers may wait for the
+            # events written before
+            if (self._file is not None and time.monotonic() -
+                    self._flushed_at >= self._flush_interval):
+                self.flush()
+            return
+        timestamp, = struct.unpack_from('<I', event, 0)
+        log_pos, = struct.unpack_from('<I', event, _LOG_POS_OFFSET)
+
+        if event_type == BinLog.ROTATE_EVENT and not timestamp:
+            # a dump starts, its format description event follows and
+            # tells if the rotate event ends with a checksum
+            self._dump_rotate = bytes(event)
+            self._transaction = None
+            self._in_transaction = False
+            return
+        if event_type == BinLog.FORMAT_DESCRIPTION_EVENT:
+            self._format_description = bytes(event)
+            self._use_checksum = _checksum_enabled(self._format_description)
+            if self._dump_rotate is not None:
+                rotate, self._dump_rotate = self._dump_rotate, None
+                self._rotate(rotate)
+                self._written = (self.log_file, self.log_pos)
+                self._jumped = True
+            if not log_pos:
+                # artificial, segments start with their own copy
+                return
+        if self._written is None:
+            # the position is not known before a dump starts
+            return
+
+        committed = False
+        if event_type == BinLog.ROTATE_EVENT:
+            self._rotate(event)
+        elif log_pos:
+            self.log_pos = log_pos
+        if event_type == BinLog.GTID_LOG_EVENT:
+            self._transaction = []
+        elif event_type == BinLog.QUERY_EVENT:
+            query = _query_prefix(event, 0, len(event), 8).upper()
+            if query.startswith(b'BEGIN'):
+                if self._transaction is None:
+                    self._transaction = []
+                self._in_transaction = True
+            elif (not self._in_transaction or query.startswith(b'COMMIT')
+                    or query.startswith(b'ROLLBACK')):
+                committed = True
+        elif event_type == BinLog.XID_EVENT:
+            committed = True
+
+        if self._transaction is None:
+            self._write([event])
+            return
+        self._transaction.append(event)
+        if committed:
+            events, self._transaction = self._transaction, None
+            self._in_transaction = False
+            self._write(events)
+
+    def _rotate(self, event):
+        end = len(event) - 4 if self._use_checksum else len(event)
+        self.log_pos, = struct.unpack_from('<Q', event, EVENT_HEADER_SIZE)
+        self.log_file = bytes(event[EVENT_HEADER_SIZE + 8:end]).decode()
+
+    def _artificial_event(self, event, timestamp=None):
+        # copy of event generated by the master, with a fresh checksum
+        event = bytearray(event)
+        timestamp_, event_type, server_id, size, _, flags = \
+            _HEADER.unpack_from(event)
+        _HEADER.pack_into(
+            event, 0, timestamp_ if timestamp is None else timestamp,
+            event_type, server_id, size, 0, flags | LOG_EVENT_ARTIFICIAL_F)
+        if self._use_checksum:
+            struct.pack_into('<I', event, size - 4,
+                             zlib.crc32(event[:size - 4]) & 0xffffffff)
+        return bytes(event)
+
+    def _rotate_event(self, log_file, log_pos):
+        body = struct.pack('<Q', log_pos) + log_file.encode()
+        size = EVENT_HEADER_SIZE + len(body) + (4 if self._use_checksum
+                                                else 0)
+        server_id, = struct.unpack_from('<I', self._format_description, 5)
+        header = _HEADER.pack(0, BinLog.ROTATE_EVENT, server_id, size, 0, 0)
+        return self._artificial_event(header + body + b'\0' * (
+            size - EVENT_HEADER_SIZE - len(body)), timestamp=0)
+
+    def _write(self, events):
+        if self._file is None:
+            self._open_segment()
+        elif self._jumped:
+            self._write_bytes(self._rotate_event(*self._written))
+            self._add_entry(*self._written)
+        self._jumped = False
+        for event in events:
+            self._write_bytes(event)
+        self._written = (self.log_file, self.log_pos)
+
+        rotated = events[-1][EVENT_TYPE_OFFSET] == BinLog.ROTATE_EVENT
+        if (rotated or
+                self._size - self._indexed_size >= self._index_interval):
+            self._add_entry(self.log_file, self.log_pos)
+        if self._size >= self._segment_size:
+            self._close_segment()
+            self._expire()
+        elif time.monotonic() - self._flushed_at >= self._flush_interval:
+            self.flush()
+
+    def _write_bytes(self, data):
+        self._size += len(data)
+        if self._compression is None:
+            self._file.write(data)
+            return
+        self._block += data
+        if len(self._block) >= self._block_size:
+            self._write_block()
+
+    def _write_block(self):
+        compress = _CODECS[self._compression][0]
+        data = compress(bytes(self._block))
+        self._file.write(data)
+        self._file_size += len(data)
+        self._unflushed_blocks.append((self._size, self._file_size))
+        self._block.clear()
+
+    def _open_segment(self):
+        seq = self._segments[-1] + 1 if self._segments else 1
+        path = self._path(seq)
+        self._file = open(path, 'wb')
+        self._index_file = open(path + INDEX_SUFFIX, 'w')
+        if self._compression is not None:
+            self._blocks_file = open(path + BLOCKS_SUFFIX, 'wb')
+            self._blocks_file.write(self._compression)
+            self._tail_file = open(path + TAIL_SUFFIX, 'wb')
+            self._tail_start = None
+        self._segments.append(seq)
+        self._size = 0
+        self._file_size = 0
+        self._write_bytes(BINLOG_MAGIC)
+        self._write_bytes(self._artificial_event(self._format_description))
+        self._write_bytes(self._rotate_event(*self._written))
+        self._add_entry(*self._written)
+
+    def _add_entry(self, log_file, log_pos):
+        entry = (log_file, log_pos, self._size)
+        self._unflushed_entries.append(entry)
+        self._keys.append((log_file, log_pos))
+        self._entries.append((self._segments[-1], self._size))
+        self._indexed_size = self._size
+
+    def flush(self):
+        """Make the events written so far visible to readers"""
+        self._flushed_at = time.monotonic()
+        if self._file is not None:
+            self._flush_segment()
+        # max_age applies to a stream too slow to close segments
+        self._expire()
+
+    def _flush_segment(self):
+        if self._size > self._indexed_size:
+            self._add_entry(*self._written)
+        self._file.flush()
+        if self._blocks_file is not None:
+            blocks, self._unflushed_blocks = self._unflushed_blocks, []
+            for block in blocks:
+                self._blocks_file.write(_BLOCK.pack(*block))
+            self._blocks_file.flush()
+            self._flush_tail()
+        entries, self._unflushed_entries = self._unflushed_entries, []
+        for entry in entries:
+            self._index_file.write(json.dumps(entry) + '\n')
+        self._index_file.flush()
+
+    def _flush_tail(self):
+        # events of the block being filled, readers find them in the tail
+        block_start = self._size - len(self._block)
+        if self._tail_start != block_start:
+            # blocks were cut since the tail was started, they are listed
+            # in the blocks file already
+            self._tail_file.seek(0)
+            self._tail_file.truncate()
+            self._tail_file.write(_TAIL.pack(block_start))
+            self._tail_start = block_start
+            self._tail_length = 0
+        self._tail_file.write(self._block[self._tail_length:])
+        self._tail_length = len(self._block)
+        self._tail_file.flush()
+
+    def _close_segment(self):
+        if self._block:
+            self._write_block()
+        self.flush()
+        self._file.close()
+        self._index_file.close()
+        self._file = self._index_file = None
+        if self._blocks_file is not None:
+            self._blocks_file.close()
+            self._blocks_file = None
+            self._tail_file.close()
+            self._tail_file = None
+            os.remove(self._path(self._segments[-1]) + TAIL_SUFFIX)
+
+    def _segment_files(self, seq):
+        path = self._path(seq)
+        return (path, path + INDEX_SUFFIX, path + BLOCKS_SUFFIX,
+                path + TAIL_SUFFIX)
+
+    def _remove(self, seq):
+        for name in self._segment_files(seq):
+            try:
+                os.remove(name)
+            except FileNotFoundError:
+                pass
+
+    def _disk_size(self, seq):
+        size = 0
+        for name in self._segment_files(seq):
+            try:
+                size += os.path.getsize(name)
+            except FileNotFoundError:
+                pass
+        return size
+
+    def _expire(self):
+        if self._max_bytes is None and self._max_age is None:
+            return
+        # the segment being written is kept
+        closed = self._segments[:-1] if self._file else self._segments[:]
+        sizes = {seq: self._disk_size(seq) for seq in self._segments}
+        total = sum(sizes.values())
+        deadline = (time.time() - self._max_age
+                    if self._max_age is not None else None)
+        for seq in closed:
+            path = self._path(seq)
+            size = sizes[seq]
+            if not ((self._max_bytes is not None and
+                     total > self._max_bytes) or
+                    (deadline is not None and
+                     os.path.getmtime(path) < deadline)):
+                break
+            self._remove(seq)
+            self._segments.remove(seq)
+            total -= size
+            count = bisect.bisect_right(self._entries, (seq, float('inf')))
+            del self._keys[:count]
+            del self._entries[:count]
+
+    def locate(self, log_file, log_pos):
+        """Return (path, offset) of the event following master position
+        log_file:log_pos in the segment files, ValueError if the spool does
+        not have it"""
+        self.flush()
+        i = bisect.bisect_right(self._keys, (log_file, log_pos)) - 1
+        if i < 0 or self._keys[i][0] != log_file:
+            raise ValueError("%s:%s is not in the spool" %
+                             (log_file, log_pos))
+        position = self._keys[i][1]
+        seq, offset = self._entries[i]
+        path = self._path(seq)
+        # a few headers from the closest entry
+        data = _open_segment_data(path)
+        try:
+            while position < log_pos:
+                header = data[offset:offset + EVENT_HEADER_SIZE]
+                if (len(header) < EVENT_HEADER_SIZE or
+                        header[EVENT_TYPE_OFFSET] == BinLog.ROTATE_EVENT):
+                    break
+                size, = struct.unpack_from('<I', header, EVENT_SIZE_OFFSET)
+                next_pos, = struct.unpack_from('<I', header, _LOG_POS_OFFSET)
+                offset += size
+                if next_pos:
+                    position = next_pos
+        finally:
+            data.close()
+        if position != log_pos:
+            raise ValueError("%s:%s is not an event boundary of the spool"
+                             % (log_file, log_pos))
+        return path, offset
+
+    def close(self):
+        """Flush and close the segment being written, the events of an
+        incomplete transaction are dropped"""
+        if self._file is not None:
+            self._close_segment()
+        self._transaction = None
+        self._in_transaction = False
+
+
+class _SegmentFiles(_BinLogFiles):
+    """Segment files of a spool, compressed or not"""
+
+    def _open(self, path):
+        return None, _open_segment_data(path)
+
+
+def create_spool_reader(*args, **kwargs):
+    reader = SpoolReader(*args, **kwargs)
+    yield from reader._connect()
+    return reader
+
+
+class SpoolReader(BinLogFileReader):
+    """Replay the events of a Spool
+
+    Events come like from the stream the spool was written from, log_file
+    and log_pos are positions of the master. Each segment starts with an
+    artificial format description and rotate event, like a dump does.
+    fetchone returns None after the last event flushed to the spool.
+    """
+
+    _files_class = _SegmentFiles
+
+    def __init__(self, spool, *, log_file=None, log_pos=None, loop,
+                 **kwargs):
+        """
+        Attributes:
+        spool: Spool to read
+        log_file: Binlog file of the master position to start from, a
+                  transaction boundary like the ones of checkpoints. By
+                  default the spool is read from its oldest event.
+        log_pos: Position in log_file to start from
+        Other keyword arguments are passed to BinLogFileReader.
+        """
+        super().__init__(spool.segment_paths(), log_file=log_file,
+                         log_pos=log_pos, loop=loop, **kwargs)
+        self._source_spool = spool
+
+    def _start_files(self):
+        self._source_spool.flush()
+        if self.log_file is None:
+            return self._source_spool.segment_paths(), None
+        path, offset = self._source_spool.locate(self.log_file, self.log_pos)
+        paths = self._source_spool.segment_paths()
+        return paths[paths.index(path):], offset
+
+    def _file_changed(self, path):
+        # segments continue each other, the rotate events starting them
+        # keep the master position
+        pass
@@ -1,9 +1,11 @@
 class Table(object):
+    __slots__ = ('column_schemas', 'table_id', 'schema', 'table', 'columns',
+                 'primary_key')
+
     def __init__(self, column_schemas, table_id, schema, table, columns,
                  primary_key=None):
         if primary_key is None:
-            primary_key = [c.data["name"] for c in columns
-                           if c.data["is_primary"]]
+            primary_key = [c.name for c in columns if c.is_primary]
             if len(primary_key) == 0:
                 primary_key = ''
             elif len(primary_key) == 1:
@@ -11,26 +13,29 @@ class Table(object):
             else:
                 primary_key = tuple(primary_key)
 
-        self.data = {
-            "column_schemas": column_schemas,
-            "table_id": table_id,
-            "schema": schema,
-            "table": table,
-            "columns": columns,
-            "primary_key": primary_key
-        }
-
-    def __getattr__(self, item):
-        try:
-            return self.data[item]
-        except KeyError:
-            raise AttributeError
+        self.column_schemas = column_schemas
+        self.table_id = table_id
+        self.schema = schema
+        self.table = table
+        self.columns = columns
+        self.primary_key = primary_key
 
     def __eq__(self, other):
-        return self.data == other.data
+        return self.serializable_data() == other.serializable_data()
 
     def __ne__(self, other):
-        return self.__eq__(other)
+        return not self.__eq__(other)
 
     def serializable_data(self):
-        return self.data
+        return {
+            "column_schemas": self.column_schemas,
+            "table_id": self.table_id,
+            "schema": self.schema,
+            "table": self.table,
+            "columns": self.columns,
+            "primary_key": self.primary_key
+        }
+
+    @property
+    def data(self):
+        return self.serializable_data()
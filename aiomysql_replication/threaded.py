@@ -0,0 +1,209 @@
+import asyncio
+import collections
+import concurrent.futures
+import threading
+
+from .binlogstream import BinLogStreamReader
+from .row_event import RowsEvent
+from .utils import PY_35
+
+
+__all__ = ['create_threaded_binlog_stream', 'ThreadedBinLogStreamReader']
+
+# marks the end of a non blocking stream in the batch queue
+_EOF = object()
+
+
+def create_threaded_binlog_stream(*args, **kwargs):
+    reader = ThreadedBinLogStreamReader(*args, **kwargs)
+    yield from reader._start()
+    return reader
+
+
+class ThreadedBinLogStreamReader(object):
+    """Run a BinLogStreamReader on a dedicated thread with its own event
+    loop
+
+    Packets are read and rows are decoded on that thread, so bursts of row
+    decoding do not compete with the coroutines of the application loop.
+    Decoded events are handed over in batches through a queue of at most
+    max_batches batches, a slow consumer stalls the reader thread.
+    """
+
+    def __init__(self, connection_settings, server_id, *, batch_size=100,
+                 batch_timeout=0.1, max_batches=16, loop, **kwargs):
+        """
+        Attributes:
+        batch_size: Maximum number of events in a batch
+        batch_timeout: Seconds a blocking stream waits to fill a batch
+        max_batches: Maximum number of batches waiting for the consumer
+        Other keyword arguments are passed to BinLogStreamReader.
+        """
+        self._connection_settings = connection_settings
+        self._server_id = server_id
+        self._reader_kwargs = kwargs
+        self._batch_size = batch_size
+        self._batch_timeout = batch_timeout
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=max_batches, loop=loop)
+        self._batch = collections.deque()
+        self._eof = False
+        # queue puts of the reader thread not done yet, cancelled by close
+        self._puts = set()
+        self._closed = False
+
+        self._thread = None
+        self._thread_loop = None
+        self._producer = None
+        self._started = None
+
+    @asyncio.coroutine
+    def _start(self):
+        self._started = concurrent.futures.Future()
+        self._thread = threading.Thread(target=self._run,
+                                        name='binlog-reader', daemon=True)
+        self._thread.start()
+        yield from asyncio.wrap_future(self._started, loop=self._loop)
+
+    def _run(self):
+        self._thread_loop = asyncio.new_event_loop()
+        try:
+            self._producer = self._thread_loop.create_task(self._produce())
+            self._thread_loop.run_until_complete(self._producer)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._thread_loop.close()
+
+    @asyncio.coroutine
+    def _produce(self):
+        # runs on the reader thread
+        settings = dict(self._connection_settings)
+        settings["loop"] = self._thread_loop
+        reader = None
+        try:
+            reader = BinLogStreamReader(settings, self._server_id,
+                                        loop=self._thread_loop,
+                                        **self._reader_kwargs)
+            yield from reader._connect()
+        except Exception as error:
+            # invalid arguments or no connection, _start raises it
+            if reader is not None:
+                reader.close()
+            self._started.set_exception(error)
+            return
+        self._started.set_result(None)
+
+        end = _EOF
+        try:
+            blocking = reader._blocking
+            timeout = self._batch_timeout if blocking else None
+            while True:
+                events = yield from reader.fetchmany(self._batch_size,
+                                                     timeout=timeout)
+                for event in events:
+                    if isinstance(event, RowsEvent):
+                        # decode here rather than on the application loop
+                        event.rows
+                if events:
+                    yield from self._put(events)
+                if not blocking and len(events) < self._batch_size:
+                    return
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            end = error
+        finally:
+            reader.close()
+            # the consumer always gets the end of the stream, once closed
+            # _put drops it
+            yield from self._put(end)
+
+    @asyncio.coroutine
+    def _put(self, item):
+        # runs on the reader thread, waits until the application loop has
+        # room for item
+        done = concurrent.futures.Future()
+
+        def put():
+            if done.cancelled():
+                return
+            if self._closed:
+                done.set_result(None)
+                return
+            task = self._loop.create_task(self._queue.put(item))
+            self._puts.add(task)
+            task.add_done_callback(put_done)
+
+        def put_done(task):
+            self._puts.discard(task)
+            if not done.cancelled():
+                done.set_result(None)
+
+        self._loop.call_soon_threadsafe(put)
+        yield from asyncio.wrap_future(done, loop=self._thread_loop)
+
+    @asyncio.coroutine
+    def fetchbatch(self):
+        """Return next list of decoded events, None at the end of a non
+        blocking stream"""
+        if self._batch:
+            batch = list(self._batch)
+            self._batch.clear()
+            return batch
+        if self._eof or self._closed:
+            return None
+        item = yield from self._queue.get()
+        if item is _EOF:
+            self._eof = True
+            return None
+        if isinstance(item, Exception):
+            self._eof = True
+            raise item
+        return item
+
+    @asyncio.coroutine
+    def fetchone(self):
+        """Return next event, None at the end of a non blocking stream"""
+        if not self._batch:
+            batch = yield from self.fetchbatch()
+            if batch is None:
+                return None
+            self._batch.extend(batch)
+        return self._batch.popleft()
+
+    if PY_35:
+        def __aiter__(self):
+            return self
+
+        @asyncio.coroutine
+        def __anext__(self):
+            event = yield from self.fetchone()
+            if event is None:
+                raise StopAsyncIteration  # noqa
+            return event
+
+    def close(self):
+        """Stop the reader thread, see wait_closed"""
+        if self._closed:
+            return
+        self._closed = True
+        # the reader thread waits for these puts, the queue is not read
+        # anymore
+        for task in list(self._puts):
+            task.cancel()
+        if self._queue.empty():
+            # wakes up a fetchbatch waiting for a batch
+            self._queue.put_nowait(_EOF)
+        if self._thread_loop is not None and self._producer is not None:
+            try:
+                self._thread_loop.call_soon_threadsafe(self._producer.cancel)
+            except RuntimeError:
+                # thread loop already closed
+                pass
+
+    @asyncio.coroutine
+    def wait_closed(self):
+        """Wait for the reader thread to exit"""
+        if self._thread is not None:
+            yield from self._loop.run_in_executor(None, self._thread.join)
@@ -0,0 +1,231 @@
+import asyncio
+import pickle
+import tempfile
+
+from .event import GtidEvent, QueryEvent, XidEvent
+from .utils import PY_35
+
+
+__all__ = ['Transaction', 'TransactionReader']
+
+
+def _event_start(event):
+    # log_pos is the position of the next event
+    return event.packet.log_pos - event.packet.event_size
+
+
+class _TransactionBoundaries(object):
+    """Tell the events ending a transaction like TransactionReader does: an
+    XidEvent, a COMMIT or ROLLBACK query, or a statement outside of
+    BEGIN/COMMIT such as DDL. Other queries between BEGIN and COMMIT,
+    statement based DML or SAVEPOINT, do not.
+    """
+
+    def __init__(self):
+        self._in_transaction = False
+
+    def reset(self):
+        """A dump starts again, it starts between two transactions"""
+        self._in_transaction = False
+
+    def ends_transaction(self, event):
+        if isinstance(event, XidEvent):
+            self._in_transaction = False
+            return True
+        if not isinstance(event, QueryEvent):
+            return False
+        if event.query == 'BEGIN':
+            self._in_transaction = True
+            return False
+        if (not self._in_transaction or
+                event.query in ('COMMIT', 'ROLLBACK')):
+            self._in_transaction = False
+            return True
+        return False
+
+
+class Transaction(object):
+    """Events of one transaction, from its GTID or BEGIN event to its XID
+    or COMMIT event
+
+    Events are kept in memory until their size exceeds max_memory_size,
+    then all of them are pickled to a temporary file and read back on
+    iteration.
+
+    Attributes:
+        gtid: GTID of the transaction, None without GTID mode
+        log_file: Binlog file of the transaction
+        start_pos: Position of the first event of the transaction
+        end_pos: Position of the event following the transaction
+        xid: Transaction ID of the XID event, None for a COMMIT query or a
+            statement outside of a transaction
+        size: Size in bytes of the events
+        last_committed: Logical clock of the GtidEvent, see GtidEvent
+        sequence_number: Logical clock of the GtidEvent, see GtidEvent
+    """
+
+    def __init__(self, gtid, log_file, start_pos, *, max_memory_size=None):
+        self.gtid = gtid
+        self.log_file = log_file
+        self.start_pos = start_pos
+        self.end_pos = None
+        self.xid = None
+        self.size = 0
+        self.last_committed = None
+        self.sequence_number = None
+        self._max_memory_size = max_memory_size
+        self._events = []
+        self._count = 0
+        self._spill = None
+
+    def append(self, event):
+        self.size += event.event_size
+        self._count += 1
+        if self._spill is not None:
+            pickle.dump(event, self._spill, pickle.HIGHEST_PROTOCOL)
+            return
+        self._events.append(event)
+        if (self._max_memory_size is not None
+                and self.size > self._max_memory_size):
+            self._spill_events()
+
+    def _spill_events(self):
+        self._spill = tempfile.TemporaryFile()
+        for event in self._events:
+            pickle.dump(event, self._spill, pickle.HIGHEST_PROTOCOL)
+        self._events = []
+
+    @property
+    def spilled(self):
+        """True when the events are stored in a temporary file"""
+        return self._spill is not None
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        if self._spill is None:
+            return iter(self._events)
+        return self._iter_spilled()
+
+    def _iter_spilled(self):
+        # a single pass at a time, every pass starts from the beginning
+        self._spill.flush()
+        self._spill.seek(0)
+        for _ in range(self._count):
+            yield pickle.load(self._spill)
+
+    def close(self):
+        """Release the temporary file of a spilled transaction"""
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+            self._count = 0
+
+    def __repr__(self):
+        return '<Transaction %s:%s-%s events=%d>' % (
+            self.log_file, self.start_pos, self.end_pos, self._count)
+
+
+class TransactionReader(object):
+    """Group the events of a BinLogStreamReader into transactions
+
+    The stream must deliver GtidEvent, QueryEvent and XidEvent. A statement
+    outside of BEGIN/COMMIT, such as DDL, is a transaction of its own.
+    Events before the first transaction boundary, like the tail of a
+    transaction the stream started in, are skipped.
+    """
+
+    def __init__(self, stream, *, max_memory_size=16 * 1024 * 1024):
+        """
+        Attributes:
+        stream: BinLogStreamReader to read events from
+        max_memory_size: Bytes of events a transaction keeps in memory
+            before spilling them to a temporary file, None to never spill
+        """
+        self._stream = stream
+        self._max_memory_size = max_memory_size
+        self._gtid_event = None
+        self._gtid_start = None
+        self._current = None
+
+    def close(self):
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+        self._stream.close()
+
+    @asyncio.coroutine
+    def fetchone(self):
+        """Return next complete transaction, None at the end of a non
+        blocking stream"""
+        while True:
+            event = yield from self._stream.fetchone()
+            if event is None:
+                return None
+            transaction = self._add_event(event)
+            if transaction is not None:
+                return transaction
+
+    if PY_35:
+        def __aiter__(self):
+            return self
+
+        @asyncio.coroutine
+        def __anext__(self):
+            transaction = yield from self.fetchone()
+            if transaction is None:
+                raise StopAsyncIteration  # noqa
+            return transaction
+
+    def _begin(self, event):
+        if self._gtid_start is not None:
+            start_pos = self._gtid_start
+        else:
+            start_pos = _event_start(event)
+        gtid_event = self._gtid_event
+        transaction = Transaction(
+            gtid_event.gtid if gtid_event is not None else None,
+            self._stream.log_file, start_pos,
+            max_memory_size=self._max_memory_size)
+        if gtid_event is not None:
+            transaction.last_committed = gtid_event.last_committed
+            transaction.sequence_number = gtid_event.sequence_number
+        self._gtid_event = self._gtid_start = None
+        return transaction
+
+    def _commit(self, event):
+        transaction, self._current = self._current, None
+        transaction.append(event)
+        transaction.end_pos = event.packet.log_pos
+        return transaction
+
+    def _add_event(self, event):
+        if isinstance(event, GtidEvent):
+            self._gtid_event = event
+            self._gtid_start = _event_start(event)
+            return None
+
+        if isinstance(event, QueryEvent):
+            query = event.query
+            if query == 'BEGIN':
+                if self._current is not None:
+                    # the previous transaction never committed
+                    self._current.close()
+                self._current = self._begin(event)
+                self._current.append(event)
+                return None
+            if self._current is None:
+                # statement outside of a transaction
+                self._current = self._begin(event)
+                return self._commit(event)
+            if query in ('COMMIT', 'ROLLBACK'):
+                return self._commit(event)
+
+        if self._current is None:
+            return None
+        if isinstance(event, XidEvent):
+            self._current.xid = event.xid
+            return self._commit(event)
+        self._current.append(event)
+        return None
@@ -1,4 +1,8 @@
 import struct
+import sys
+
+
+PY_35 = sys.version_info >= (3, 5)
 
 
 def byte2int(b):
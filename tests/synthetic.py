@@ -0,0 +1,123 @@
+"""Binlog files built in memory for tests running without a server"""
+import asyncio
+import struct
+import zlib
+
+from aiomysql_replication.consts import BinLog, FieldType
+
+
+# information_schema.columns rows of test.test (id INT PRIMARY KEY,
+# data VARCHAR(50))
+COLUMN_SCHEMAS = [
+    {"COLUMN_NAME": "id", "COLLATION_NAME": None,
+     "CHARACTER_SET_NAME": None, "COLUMN_COMMENT": "",
+     "COLUMN_TYPE": "int(11)", "COLUMN_KEY": "PRI"},
+    {"COLUMN_NAME": "data", "COLLATION_NAME": "utf8_general_ci",
+     "CHARACTER_SET_NAME": "utf8", "COLUMN_COMMENT": "",
+     "COLUMN_TYPE": "varchar(50)", "COLUMN_KEY": ""},
+]
+
+
+@asyncio.coroutine
+def table_information(schema, table):
+    """table_information of BinLogFileReader, every table is like
+    test.test"""
+    return COLUMN_SCHEMAS
+
+
+class BinLogBuilder(object):
+    """Events of one binlog file, written like MySQL 5.7 does"""
+
+    def __init__(self, checksum=True, server_version=b'5.7.20-log'):
+        self.checksum = checksum
+        self.events = []
+        # offset of the next event
+        self.position = 4
+        self.format_description(server_version)
+
+    def _build(self, event_type, body, timestamp, log_pos, flags=0):
+        size = 19 + len(body) + (4 if self.checksum else 0)
+        header = struct.pack('<IBIIIH', timestamp, event_type, 1, size,
+                             log_pos, flags)
+        event = header + body
+        if self.checksum:
+            event += struct.pack('<I', zlib.crc32(event) & 0xffffffff)
+        return event
+
+    def event(self, event_type, body, timestamp=1000, log_pos=None):
+        self.position += 19 + len(body) + (4 if self.checksum else 0)
+        event = self._build(event_type, body, timestamp,
+                            self.position if log_pos is None else log_pos)
+        self.events.append(event)
+        return event
+
+    def dump_start(self, log_file, position):
+        """Artificial events a master sends before the events of a dump
+        starting at log_file:position, the real format description event
+        comes next when position is 4"""
+        events = [self._build(BinLog.ROTATE_EVENT,
+                              struct.pack('<Q', position) + log_file.encode(),
+                              0, 0, 0x20)]
+        if position > 4:
+            body = self.events[0][19:-4 if self.checksum else None]
+            events.append(self._build(BinLog.FORMAT_DESCRIPTION_EVENT, body,
+                                      0, 0, 0x20))
+        return events
+
+    def format_description(self, server_version):
+        body = (struct.pack('<H', 4) + server_version.ljust(50, b'\0') +
+                struct.pack('<IB', 0, 19) + b'\x00' * 38 +
+                (b'\x01' if self.checksum else b'\x00'))
+        return self.event(BinLog.FORMAT_DESCRIPTION_EVENT, body)
+
+    def query(self, query, schema=b'test', timestamp=1000):
+        body = (struct.pack('<IIBHH', 1, 0, len(schema), 0, 0) + schema +
+                b'\0' + query.encode())
+        return self.event(BinLog.QUERY_EVENT, body, timestamp)
+
+    def gtid(self, sid, gno, timestamp=1000):
+        body = (b'\x01' + bytes.fromhex(sid.replace('-', '')) +
+                struct.pack('<Q', gno))
+        return self.event(BinLog.GTID_LOG_EVENT, body, timestamp)
+
+    def table_map(self, table_id, table, schema='test', timestamp=1000):
+        body = struct.pack('<Q', table_id)[:6] + b'\0\0'
+        body += bytes([len(schema)]) + schema.encode() + b'\0'
+        body += bytes([len(table)]) + table.encode() + b'\0'
+        # id INT, data VARCHAR(50)
+        body += (b'\x02' + bytes([FieldType.LONG, FieldType.VARCHAR]) +
+                 b'\x02' + struct.pack('<H', 50) + b'\x00')
+        return self.event(BinLog.TABLE_MAP_EVENT, body, timestamp)
+
+    def write_rows(self, table_id, rows, timestamp=1000):
+        body = (struct.pack('<Q', table_id)[:6] + b'\0\0' +
+                struct.pack('<H', 2) + b'\x02\x03')
+        for id, data in rows:
+            body += (b'\0' + struct.pack('<i', id) + bytes([len(data)]) +
+                     data.encode())
+        return self.event(BinLog.WRITE_ROWS_EVENT_V2, body, timestamp)
+
+    def xid(self, xid=1, timestamp=1000):
+        return self.event(BinLog.XID_EVENT, struct.pack('<Q', xid),
+                          timestamp)
+
+    def transaction(self, table_id, table, rows, gtid=None,
+                    timestamp=1000):
+        if gtid is not None:
+            self.gtid(*gtid, timestamp=timestamp)
+        self.query('BEGIN', timestamp=timestamp)
+        self.table_map(table_id, table, timestamp=timestamp)
+        self.write_rows(table_id, rows, timestamp=timestamp)
+        self.xid(timestamp=timestamp)
+
+    def rotate(self, next_binlog, timestamp=1000):
+        return self.event(BinLog.ROTATE_EVENT,
+                          struct.pack('<Q', 4) + next_binlog.encode(),
+                          timestamp)
+
+    def data(self):
+        return b'\xfebin' + b''.join(self.events)
+
+    def write(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.data())
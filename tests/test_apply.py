@@ -0,0 +1,176 @@
+import asyncio
+import unittest
+
+from aiomysql_replication.apply import (LogicalClockScheduler,
+                                        WritesetScheduler)
+from aiomysql_replication.event import QueryEvent
+from aiomysql_replication.row_event import UpdateRowsEvent, WriteRowsEvent
+from aiomysql_replication.transaction import Transaction
+
+
+def _transaction(log_file, position, last_committed=None,
+                 sequence_number=None):
+    transaction = Transaction(None, log_file, position)
+    transaction.end_pos = position + 10
+    transaction.last_committed = last_committed
+    transaction.sequence_number = sequence_number
+    return transaction
+
+
+def _event(cls, **attributes):
+    # decoded event without packet
+    event = cls.__new__(cls)
+    event.event_size = 100
+    event.__dict__.update(attributes)
+    return event
+
+
+def _rows_transaction(position, event):
+    transaction = _transaction("mysql-bin.000001", position)
+    transaction.append(event)
+    return transaction
+
+
+class TestApplySchedulers(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(None)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def _run(self, scheduler, transactions):
+        @asyncio.coroutine
+        def schedule_all():
+            for transaction in transactions:
+                yield from scheduler.schedule(transaction)
+            yield from scheduler.join()
+        self.loop.run_until_complete(schedule_all())
+
+    def test_logical_clock(self):
+        log = []
+
+        @asyncio.coroutine
+        def apply(transaction):
+            log.append(("start", transaction.sequence_number))
+            yield from asyncio.sleep(0.01, loop=self.loop)
+            log.append(("end", transaction.sequence_number))
+
+        # 1, 2 and 3 in parallel, 4 waits for 3, 5 for 4
+        transactions = [_transaction("mysql-bin.000001", 100 * i, lc, seq)
+                        for i, (lc, seq) in enumerate(
+                            [(0, 1), (0, 2), (0, 3), (3, 4), (4, 5)])]
+        scheduler = LogicalClockScheduler(apply, workers=4, loop=self.loop)
+        self._run(scheduler, transactions)
+
+        self.assertEqual(log[:3], [("start", 1), ("start", 2),
+                                   ("start", 3)])
+        self.assertLess(log.index(("end", 3)), log.index(("start", 4)))
+        self.assertLess(log.index(("end", 4)), log.index(("start", 5)))
+        self.assertEqual(scheduler.committed_position,
+                         ("mysql-bin.000001", 410))
+
+    def test_logical_clock_restarts_with_binlog_file(self):
+        log = []
+
+        @asyncio.coroutine
+        def apply(transaction):
+            log.append(("start", transaction.log_file))
+            yield from asyncio.sleep(0.01, loop=self.loop)
+            log.append(("end", transaction.log_file))
+
+        transactions = [_transaction("mysql-bin.000001", 4, 0, 1),
+                        _transaction("mysql-bin.000002", 4, 0, 1)]
+        scheduler = LogicalClockScheduler(apply, loop=self.loop)
+        self._run(scheduler, transactions)
+        self.assertEqual(log, [("start", "mysql-bin.000001"),
+                               ("end", "mysql-bin.000001"),
+                               ("start", "mysql-bin.000002"),
+                               ("end", "mysql-bin.000002")])
+
+    def test_apply_error(self):
+        @asyncio.coroutine
+        def apply(transaction):
+            raise ValueError(transaction.sequence_number)
+
+        scheduler = LogicalClockScheduler(apply, loop=self.loop)
+        with self.assertRaises(ValueError):
+            self._run(scheduler, [_transaction("mysql-bin.000001", 4, 0, 1),
+                                  _transaction("mysql-bin.000001", 14, 1, 2)])
+
+    def test_apply_error_stops_committed_position(self):
+        @asyncio.coroutine
+        def apply(transaction):
+            if transaction.sequence_number == 2:
+                raise ValueError(transaction.sequence_number)
+            yield from asyncio.sleep(0.01, loop=self.loop)
+
+        # 3 is applied after 2 failed, 1 is the last one committed
+        transactions = [_transaction("mysql-bin.000001", 100 * i, 0, seq)
+                        for i, seq in enumerate([1, 2, 3])]
+        scheduler = LogicalClockScheduler(apply, loop=self.loop)
+        with self.assertRaises(ValueError):
+            self._run(scheduler, transactions)
+        self.assertEqual(scheduler.committed_position,
+                         ("mysql-bin.000001", 10))
+
+    def test_writeset(self):
+        log = []
+
+        @asyncio.coroutine
+        def apply(transaction):
+            log.append(("start", transaction.start_pos))
+            yield from asyncio.sleep(0.01, loop=self.loop)
+            log.append(("end", transaction.start_pos))
+
+        def write(position, table, primary_key, *ids):
+            return _rows_transaction(position, _event(
+                WriteRowsEvent, schema="test", table=table,
+                primary_key=primary_key,
+                _rows=[{"values": {"id": i}} for i in ids]))
+
+        update = _rows_transaction(300, _event(
+            UpdateRowsEvent, schema="test", table="t", primary_key="id",
+            _rows=[{"before_values": {"id": 5}, "after_values": {"id": 1}}]))
+        ddl = _rows_transaction(500, _event(
+            QueryEvent, query="ALTER TABLE t ADD c INT"))
+        transactions = [write(100, "t", "id", 1, 2),
+                        write(200, "t", "id", 3),
+                        update,
+                        write(400, "u", "", 1),
+                        ddl,
+                        write(600, "u", "", 2)]
+        scheduler = WritesetScheduler(apply, workers=4, loop=self.loop)
+        self.assertIsNone(scheduler.writeset(ddl))
+        self._run(scheduler, transactions)
+
+        # 200 does not conflict with 100, 300 changes row 1 of 100
+        self.assertEqual(log[:2], [("start", 100), ("start", 200)])
+        self.assertLess(log.index(("end", 100)), log.index(("start", 300)))
+        # the DDL runs alone, rows of a table without key conflict
+        ddl_start = log.index(("start", 500))
+        self.assertEqual(log[ddl_start + 1], ("end", 500))
+        self.assertEqual(log.count(("start", 400)), 1)
+        self.assertLess(log.index(("end", 400)), ddl_start)
+        self.assertLess(ddl_start, log.index(("start", 600)))
+        self.assertEqual(scheduler.committed_position,
+                         ("mysql-bin.000001", 610))
+        self.assertEqual(scheduler._window, {})
+
+    def test_writeset_apply_error(self):
+        @asyncio.coroutine
+        def apply(transaction):
+            if transaction.start_pos == 200:
+                raise ValueError(transaction.start_pos)
+            yield from asyncio.sleep(0.01, loop=self.loop)
+
+        # rows 1, 2 and 3 do not conflict, 300 is applied after 200 failed
+        transactions = [_rows_transaction(100 * i, _event(
+            WriteRowsEvent, schema="test", table="t", primary_key="id",
+            _rows=[{"values": {"id": i}}])) for i in (1, 2, 3)]
+        scheduler = WritesetScheduler(apply, loop=self.loop)
+        with self.assertRaises(ValueError):
+            self._run(scheduler, transactions)
+        self.assertEqual(scheduler.committed_position,
+                         ("mysql-bin.000001", 110))
@@ -0,0 +1,75 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from aiomysql_replication.backfill import Backfill, plan_segments
+from aiomysql_replication.row_event import WriteRowsEvent
+
+from .synthetic import BinLogBuilder, table_information
+
+
+class TestBackfill(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(None)
+        self.directory = tempfile.TemporaryDirectory()
+        self.paths = []
+        for i in range(3):
+            builder = BinLogBuilder()
+            for j in range(20):
+                builder.transaction(10, "test", [(i * 100 + j, "d")])
+            path = os.path.join(self.directory.name,
+                                "mysql-bin.%06d" % (i + 1))
+            builder.write(path)
+            self.paths.append(path)
+        self.executor = ProcessPoolExecutor(max_workers=2)
+
+    def tearDown(self):
+        self.executor.shutdown()
+        self.directory.cleanup()
+        self.loop.close()
+
+    def _read(self, **kwargs):
+        @asyncio.coroutine
+        def read():
+            backfill = Backfill(
+                self.paths, self.executor, segment_size=1000,
+                table_information=table_information,
+                only_events=[WriteRowsEvent], loop=self.loop, **kwargs)
+            items = []
+            while True:
+                item = yield from backfill.fetchone()
+                if item is None:
+                    break
+                log_file, event = item
+                items.append((log_file, event.rows[0]["values"]["id"]))
+            backfill.close()
+            return items
+        return self.loop.run_until_complete(read())
+
+    def test_plan_segments(self):
+        segments = plan_segments(self.paths, 1000)
+        self.assertGreater(len(segments), len(self.paths))
+        for path in self.paths:
+            parts = [s for s in segments if s.path == path]
+            self.assertEqual(parts[0].start, 4)
+            self.assertIsNone(parts[-1].end)
+            for before, after in zip(parts, parts[1:]):
+                self.assertEqual(before.end, after.start)
+
+    def test_ordered(self):
+        items = self._read()
+        self.assertEqual(
+            items, [("mysql-bin.%06d" % (i + 1), i * 100 + j)
+                    for i in range(3) for j in range(20)])
+
+    def test_unordered(self):
+        items = self._read(ordered=False)
+        self.assertEqual(len(items), 60)
+        for i in range(3):
+            log_file = "mysql-bin.%06d" % (i + 1)
+            self.assertEqual([id for f, id in items if f == log_file],
+                             [i * 100 + j for j in range(20)])
@@ -1,7 +1,24 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
 from aiomysql_replication import create_binlog_stream
+from aiomysql_replication.checkpoint import Checkpointer, FileCheckpointStore
 from aiomysql_replication.event import *  # noqa
 from aiomysql_replication.row_event import *  # noqa
 from aiomysql_replication.consts import BinLog
+from aiomysql_replication.filters import TableFilter
+from aiomysql_replication.gtid import GtidSet
+from aiomysql_replication.multisource import create_multi_source_reader
+from aiomysql_replication.partition import PartitionedDispatcher
+from aiomysql_replication.relay import BinLogRelay, connect_relay
+from aiomysql_replication.schema import SchemaCache
+from aiomysql_replication.spool import Spool, create_spool_reader
+from aiomysql_replication.threaded import create_threaded_binlog_stream
+from aiomysql_replication.transaction import TransactionReader
+from aiomysql_replication.utils import PY_35
 
 from .base import run_until_complete, ReplicationTestCase
 
@@ -108,6 +125,103 @@ class TestBasicBinLogStreamReader(ReplicationTestCase):
             event = yield from self.stream.fetchone()
             self.assertIsNotNone(event)
 
+    @run_until_complete
+    def test_fetchmany(self):
+        query = "CREATE TABLE test (id INT NOT NULL AUTO_INCREMENT, " \
+                "data VARCHAR (50) NOT NULL, PRIMARY KEY (id))"
+        yield from self.execute(query)
+
+        events = yield from self.stream.fetchmany(3)
+        self.assertEqual([type(e) for e in events],
+                         [RotateEvent, FormatDescriptionEvent, QueryEvent])
+        self.assertEqual(events[2].query, query)
+
+        # nothing left in blocking stream
+        events = yield from self.stream.fetchmany(10, timeout=0.2)
+        self.assertEqual(events, [])
+
+        yield from self.execute("CREATE TABLE test_2 (id INT)")
+        events = yield from self.stream.fetchmany(10, timeout=1)
+        self.assertEqual(len(events), 1)
+        self.assertIsInstance(events[0], QueryEvent)
+
+    @unittest.skipIf(not PY_35, "async iteration needs Python 3.5")
+    @run_until_complete
+    def test_async_iterator(self):
+        query = "CREATE TABLE test (id INT NOT NULL AUTO_INCREMENT, " \
+                "data VARCHAR (50) NOT NULL, PRIMARY KEY (id))"
+        yield from self.execute(query)
+
+        self.assertIs(self.stream.__aiter__(), self.stream)
+        event = yield from self.stream.__anext__()
+        self.assertIsInstance(event, RotateEvent)
+
+    @run_until_complete
+    def test_read_ahead(self):
+        self.stream.close()
+        self.stream = yield from create_binlog_stream(
+            self.database, server_id=1024, read_ahead=4,
+            read_ahead_bytes=1024, ignored_events=self.ignoredEvents(),
+            loop=self.loop)
+        query = "CREATE TABLE test (id INT NOT NULL AUTO_INCREMENT, " \
+                "data VARCHAR (50) NOT NULL, PRIMARY KEY (id))"
+        yield from self.execute(query)
+
+        event = yield from self.stream.fetchone()
+        self.assertIsInstance(event, RotateEvent)
+        event = yield from self.stream.fetchone()
+        self.assertIsInstance(event, FormatDescriptionEvent)
+        event = yield from self.stream.fetchone()
+        self.assertIsInstance(event, QueryEvent)
+        self.assertEqual(event.query, query)
+        self.assertLessEqual(len(self.stream._read_ahead), 4)
+
+    @run_until_complete
+    def test_reconnect(self):
+        query = "CREATE TABLE test (id INT NOT NULL AUTO_INCREMENT, " \
+                "data VARCHAR (50) NOT NULL, PRIMARY KEY (id))"
+        yield from self.execute(query)
+        yield from self.execute("INSERT INTO test (data) VALUES('Hello')")
+        yield from self.execute("COMMIT")
+
+        self.stream.close()
+        self.stream = yield from create_binlog_stream(
+            self.database, server_id=1024, only_events=[WriteRowsEvent],
+            reconnect_delay=0.01, loop=self.loop)
+        event = yield from self.stream.fetchone()
+        self.assertEqual(event.rows[0]["values"]["data"], "Hello")
+
+        thread_id = self.stream._stream_connection.thread_id()
+        yield from self.execute("KILL %d" % thread_id)
+        yield from self.execute("INSERT INTO test (data) VALUES('World')")
+        yield from self.execute("COMMIT")
+
+        event = yield from self.stream.fetchone()
+        self.assertEqual(event.rows[0]["values"]["data"], "World")
+        self.assertNotEqual(self.stream._stream_connection.thread_id(),
+                            thread_id)
+
+    @run_until_complete
+    def test_heartbeat(self):
+        self.stream.close()
+        self.stream = yield from create_binlog_stream(
+            self.database, server_id=1024, only_events=[QueryEvent],
+            heartbeat_period=0.1, heartbeat_timeout=1, loop=self.loop)
+        self.assertIsNone(self.stream.lag_seconds)
+        query = "CREATE TABLE test (id INT NOT NULL AUTO_INCREMENT, " \
+                "data VARCHAR (50) NOT NULL, PRIMARY KEY (id))"
+        yield from self.execute(query)
+
+        event = yield from self.stream.fetchone()
+        self.assertEqual(event.query, query)
+        log_pos = self.stream.log_pos
+
+        # heartbeats are consumed by the reader
+        events = yield from self.stream.fetchmany(10, timeout=0.5)
+        self.assertEqual(events, [])
+        self.assertEqual(self.stream.lag_seconds, 0)
+        self.assertEqual(self.stream.log_pos, log_pos)
+
     @run_until_complete
     def test_filtering_only_events(self):
         self.stream.close()
@@ -138,11 +252,13 @@ class TestBasicBinLogStreamReader(ReplicationTestCase):
     @run_until_complete
     def test_filtering_table_event(self):
         self.stream.close()
+        schema_cache = SchemaCache()
         self.stream = yield from create_binlog_stream(
             self.database,
             server_id=1024,
             only_events=[WriteRowsEvent],
-            only_tables=["test_2"], loop=self.loop)
+            only_tables=["test_2"], schema_cache=schema_cache,
+            loop=self.loop)
 
         query = "CREATE TABLE test_2 (id INT NOT NULL AUTO_INCREMENT, " \
                 "data VARCHAR (50) NOT NULL, PRIMARY KEY (id))"
@@ -157,8 +273,38 @@ class TestBasicBinLogStreamReader(ReplicationTestCase):
         yield from self.execute("COMMIT")
         event = yield from self.stream.fetchone()
         self.assertEqual(event.table, "test_2")
+        self.assertEqual(event.rows[0]["values"]["data"], "alpha")
         event = yield from self.stream.fetchone()
         self.assertEqual(event.table, "test_2")
+        self.assertEqual(event.rows[0]["values"]["data"], "beta")
+        # the columns of test_3 are never looked up
+        self.assertIn(("pymysqlreplication_test", "test_2"), schema_cache)
+        self.assertNotIn(("pymysqlreplication_test", "test_3"), schema_cache)
+
+    @run_until_complete
+    def test_schema_cache_rename_column(self):
+        self.stream.close()
+        self.stream = yield from create_binlog_stream(
+            self.database,
+            server_id=1024,
+            only_events=[WriteRowsEvent],
+            loop=self.loop)
+
+        query = "CREATE TABLE test (id INT NOT NULL AUTO_INCREMENT, " \
+                "data VARCHAR (50) NOT NULL, PRIMARY KEY (id))"
+        yield from self.execute(query)
+        yield from self.execute("INSERT INTO test (data) VALUES ('alpha')")
+        yield from self.execute("COMMIT")
+        event = yield from self.stream.fetchone()
+        self.assertEqual(event.rows[0]["values"]["data"], "alpha")
+
+        # the column types, and so the fingerprint, do not change
+        yield from self.execute(
+            "ALTER TABLE test CHANGE data info VARCHAR (50) NOT NULL")
+        yield from self.execute("INSERT INTO test (info) VALUES ('beta')")
+        yield from self.execute("COMMIT")
+        event = yield from self.stream.fetchone()
+        self.assertEqual(event.rows[0]["values"]["info"], "beta")
 
     @run_until_complete
     def test_write_row_event(self):
@@ -461,6 +607,96 @@ class TestBasicBinLogStreamReader(ReplicationTestCase):
 
         self.assertGreater(self.stream.log_pos, 0)
 
+    @run_until_complete
+    def test_snapshot_warm_restart(self):
+        query = "CREATE TABLE test (id INT NOT NULL AUTO_INCREMENT, " \
+                "data VARCHAR (50) NOT NULL, PRIMARY KEY (id))"
+        yield from self.execute(query)
+        query = "INSERT INTO test (data) VALUES('Hello')"
+        yield from self.execute(query)
+        yield from self.execute("COMMIT")
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "snapshot")
+            self.stream.close()
+            self.stream = yield from create_binlog_stream(
+                self.database, server_id=1024, snapshot_file=path,
+                only_events=[WriteRowsEvent], loop=self.loop)
+            event = yield from self.stream.fetchone()
+            self.assertIsInstance(event, WriteRowsEvent)
+            # the transaction of the event was not committed yet
+            self.stream.close()
+
+            self.stream = yield from create_binlog_stream(
+                self.database, server_id=1024, snapshot_file=path,
+                only_events=[WriteRowsEvent], loop=self.loop)
+            self.assertIn(("pymysqlreplication_test", "test"),
+                          self.stream._schema_cache)
+            self.assertEqual(len(self.stream.table_map), 1)
+            event = yield from self.stream.fetchone()
+            self.assertEqual(event.rows[0]["values"]["data"], "Hello")
+
+    @run_until_complete
+    def test_checkpoint_resume(self):
+        query = "CREATE TABLE test (id INT NOT NULL AUTO_INCREMENT, " \
+                "data VARCHAR (50) NOT NULL, PRIMARY KEY (id))"
+        yield from self.execute(query)
+        for data in ("Hello", "World"):
+            yield from self.execute(
+                "INSERT INTO test (data) VALUES('%s')" % data)
+            yield from self.execute("COMMIT")
+
+        with tempfile.TemporaryDirectory() as directory:
+            store = FileCheckpointStore(os.path.join(directory, "checkpoint"))
+            self.stream.close()
+            self.stream = yield from create_binlog_stream(
+                self.database, server_id=1024, only_events=[WriteRowsEvent],
+                checkpoint_store=store, loop=self.loop)
+            event = yield from self.stream.fetchone()
+            self.assertEqual(event.rows[0]["values"]["data"], "Hello")
+            # the first transaction is processed once the next fetch starts
+            event = yield from self.stream.fetchone()
+            self.assertEqual(event.rows[0]["values"]["data"], "World")
+            self.stream.close()
+
+            self.assertIsNotNone(store.load())
+            self.stream = yield from create_binlog_stream(
+                self.database, server_id=1024, only_events=[WriteRowsEvent],
+                checkpoint_store=store, loop=self.loop)
+            event = yield from self.stream.fetchone()
+            self.assertEqual(event.rows[0]["values"]["data"], "World")
+
+    def test_spool_replay(self):
+        query = "CREATE TABLE test (id INT NOT NULL AUTO_INCREMENT, " \
+                "data VARCHAR (50) NOT NULL, PRIMARY KEY (id))"
+        yield from self.execute(query)
+        for data in ("Hello", "World"):
+            yield from self.execute(
+                "INSERT INTO test (data) VALUES('%s')" % data)
+            yield from self.execute("COMMIT")
+
+        with tempfile.TemporaryDirectory() as directory:
+            spool = Spool(directory)
+            schema_cache = SchemaCache()
+            self.stream.close()
+            self.stream = yield from create_binlog_stream(
+                self.database, server_id=1024, only_events=[WriteRowsEvent],
+                schema_cache=schema_cache, spool=spool, loop=self.loop)
+            for data in ("Hello", "World"):
+                event = yield from self.stream.fetchone()
+                self.assertEqual(event.rows[0]["values"]["data"], data)
+            # the second transaction is spooled once its commit is read
+            self.stream.close()
+            spool.close()
+
+            reader = yield from create_spool_reader(
+                spool, only_events=[WriteRowsEvent],
+                schema_cache=schema_cache, loop=self.loop)
+            event = yield from reader.fetchone()
+            self.assertEqual(event.rows[0]["values"]["data"], "Hello")
+            self.assertIsNone((yield from reader.fetchone()))
+            reader.close()
+
 
 class TestMultipleRowBinLogStreamReader(ReplicationTestCase):
     def ignoredEvents(self):
@@ -586,6 +822,357 @@ class TestMultipleRowBinLogStreamReader(ReplicationTestCase):
         self.assertEqual(event.rows[1]["values"]["id"], 2)
         self.assertEqual(event.rows[1]["values"]["data"], "World")
 
+    @run_until_complete
+    def test_parallel_decoding(self):
+        query = "CREATE TABLE test (id INT NOT NULL AUTO_INCREMENT, " \
+                "data VARCHAR (50) NOT NULL, PRIMARY KEY (id))"
+        yield from self.execute(query)
+        for i in range(10):
+            yield from self.execute(
+                "INSERT INTO test (data) VALUES('%d'),('%d')" % (i, i))
+            yield from self.execute("COMMIT")
+
+        self.stream.close()
+        with ProcessPoolExecutor(2) as executor:
+            self.stream = yield from create_binlog_stream(
+                self.database, server_id=1024, only_events=[WriteRowsEvent],
+                decode_executor=executor, decode_window=4, loop=self.loop)
+            for i in range(10):
+                event = yield from self.stream.fetchone()
+                self.assertIsInstance(event, WriteRowsEvent)
+                self.assertEqual(len(event.rows), 2)
+                self.assertEqual(event.rows[0]["values"]["id"], i * 2 + 1)
+                self.assertEqual(event.rows[1]["values"]["data"], str(i))
+            self.stream.close()
+
+    @run_until_complete
+    def test_threaded_reader(self):
+        query = "CREATE TABLE test (id INT NOT NULL AUTO_INCREMENT, " \
+                "data VARCHAR (50) NOT NULL, PRIMARY KEY (id))"
+        yield from self.execute(query)
+        for i in range(10):
+            yield from self.execute(
+                "INSERT INTO test (data) VALUES('%d')" % i)
+            yield from self.execute("COMMIT")
+
+        reader = yield from create_threaded_binlog_stream(
+            self.database, server_id=1024, only_events=[WriteRowsEvent],
+            blocking=False, batch_size=4, loop=self.loop)
+        try:
+            events = []
+            while True:
+                event = yield from reader.fetchone()
+                if event is None:
+                    break
+                events.append(event)
+        finally:
+            reader.close()
+            yield from reader.wait_closed()
+
+        self.assertEqual(len(events), 10)
+        for i, event in enumerate(events):
+            self.assertIsInstance(event, WriteRowsEvent)
+            self.assertEqual(event.rows[0]["values"]["id"], i + 1)
+            self.assertEqual(event.rows[0]["values"]["data"], str(i))
+
+    @run_until_complete
+    def test_threaded_reader_close(self):
+        reader = yield from create_threaded_binlog_stream(
+            self.database, server_id=1024, only_events=[WriteRowsEvent],
+            blocking=True, loop=self.loop)
+        fetch = self.loop.create_task(reader.fetchbatch())
+        yield from asyncio.sleep(0.2, loop=self.loop)
+        # a consumer waiting for a batch is woken up
+        reader.close()
+        batch = yield from asyncio.wait_for(fetch, 1, loop=self.loop)
+        self.assertIsNone(batch)
+        yield from asyncio.wait_for(reader.wait_closed(), 5, loop=self.loop)
+
+    @run_until_complete
+    def test_threaded_reader_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            yield from create_threaded_binlog_stream(
+                self.database, server_id=1024, only_tables=["test"],
+                table_filter=TableFilter(include_tables=["test"]),
+                loop=self.loop)
+
+    @run_until_complete
+    def test_transaction_reader(self):
+        query = "CREATE TABLE test (id INT NOT NULL AUTO_INCREMENT, " \
+                "data VARCHAR (50) NOT NULL, PRIMARY KEY (id))"
+        yield from self.execute(query)
+        yield from self.execute("BEGIN")
+        for i in range(20):
+            yield from self.execute(
+                "INSERT INTO test (data) VALUES('%d')" % i)
+        yield from self.execute("COMMIT")
+
+        self.stream.close()
+        self.stream = yield from create_binlog_stream(
+            self.database, server_id=1024, loop=self.loop)
+        reader = TransactionReader(self.stream, max_memory_size=256)
+
+        transaction = yield from reader.fetchone()
+        self.assertEqual(len(transaction), 1)
+        self.assertEqual(list(transaction)[0].query, query)
+
+        transaction = yield from reader.fetchone()
+        self.assertTrue(transaction.spilled)
+        self.assertIsNotNone(transaction.xid)
+        self.assertEqual(transaction.end_pos, self.stream.log_pos)
+        self.assertLess(transaction.start_pos, transaction.end_pos)
+        events = [e for e in transaction if isinstance(e, WriteRowsEvent)]
+        self.assertEqual(len(events), 20)
+        for i, event in enumerate(events):
+            self.assertEqual(event.rows[0]["values"]["data"], str(i))
+        transaction.close()
+
+    @run_until_complete
+    def test_relay(self):
+        yield from self.execute("CREATE TABLE test (id INT NOT NULL "
+                                "AUTO_INCREMENT, data VARCHAR (50) NOT NULL, "
+                                "PRIMARY KEY (id))")
+        yield from self.execute("CREATE TABLE test_2 (id INT NOT NULL "
+                                "AUTO_INCREMENT, data VARCHAR (50) NOT NULL, "
+                                "PRIMARY KEY (id))")
+        for table in ("test", "test_2", "test"):
+            yield from self.execute(
+                "INSERT INTO %s (data) VALUES('%s')" % (table, table))
+            yield from self.execute("COMMIT")
+
+        self.stream.close()
+        self.stream = yield from create_binlog_stream(
+            self.database, server_id=1024, blocking=False, loop=self.loop)
+        relay = BinLogRelay(self.stream, loop=self.loop)
+        everything = relay.subscribe(only_events=[WriteRowsEvent])
+        only_test = relay.subscribe(
+            only_events=[WriteRowsEvent],
+            table_filter=TableFilter(include_tables=["test"]), max_queue=1)
+        relay.start()
+
+        @asyncio.coroutine
+        def tables(subscription):
+            names = []
+            while True:
+                event = yield from subscription.fetchone()
+                if event is None:
+                    return names
+                names.append(event.table)
+
+        # each subscription has its own feeder, subscribers read at their
+        # own pace
+        events = yield from asyncio.gather(
+            tables(everything), tables(only_test), loop=self.loop)
+        relay.close()
+
+        self.assertEqual(events, [["test", "test_2", "test"],
+                                  ["test", "test"]])
+        self.assertEqual(only_test.log_file, self.stream.log_file)
+
+    @run_until_complete
+    def test_relay_overflow(self):
+        yield from self.execute("CREATE TABLE test (id INT NOT NULL "
+                                "AUTO_INCREMENT, data VARCHAR (50) NOT NULL, "
+                                "PRIMARY KEY (id))")
+        for i in range(5):
+            yield from self.execute(
+                "INSERT INTO test (data) VALUES('%d')" % i)
+            yield from self.execute("COMMIT")
+
+        self.stream.close()
+        self.stream = yield from create_binlog_stream(
+            self.database, server_id=1024, blocking=False, loop=self.loop)
+        relay = BinLogRelay(self.stream, loop=self.loop)
+        slow = relay.subscribe(only_events=[WriteRowsEvent], max_queue=1,
+                               max_backlog=1)
+        fast = relay.subscribe(only_events=[WriteRowsEvent])
+        relay.start()
+
+        # the slow subscription does not hold the fast one back
+        count = 0
+        while True:
+            event = yield from fast.fetchone()
+            if event is None:
+                break
+            count += 1
+        self.assertEqual(count, 5)
+        # a subscription added after the end of the stream ends at once
+        late = relay.subscribe(only_events=[WriteRowsEvent])
+        event = yield from asyncio.wait_for(late.fetchone(), 1,
+                                            loop=self.loop)
+        self.assertIsNone(event)
+
+        event = yield from slow.fetchone()
+        self.assertIsInstance(event, WriteRowsEvent)
+        with self.assertRaises(BufferError):
+            while True:
+                yield from slow.fetchone()
+        relay.close()
+
+    @run_until_complete
+    def test_relay_invalid_subscription(self):
+        relay = BinLogRelay(self.stream, loop=self.loop)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "relay.sock")
+            yield from relay.serve_unix(path)
+            try:
+                client = yield from connect_relay(
+                    path, table_filter={"include": ["test"]},
+                    loop=self.loop)
+                with self.assertRaises(ValueError):
+                    yield from client.fetchone()
+                client.close()
+                for max_queue in (0, -1, "10", True, None):
+                    client = yield from connect_relay(
+                        path, max_queue=max_queue, loop=self.loop)
+                    with self.assertRaises(ValueError):
+                        yield from client.fetchone()
+                    client.close()
+            finally:
+                relay.close()
+
+    @run_until_complete
+    def test_multi_source_reader(self):
+        query = "CREATE TABLE test (id INT NOT NULL AUTO_INCREMENT, " \
+                "data VARCHAR (50) NOT NULL, PRIMARY KEY (id))"
+        yield from self.execute(query)
+        for i in range(3):
+            yield from self.execute(
+                "INSERT INTO test (data) VALUES('%d')" % i)
+            yield from self.execute("COMMIT")
+
+        # both sources read the same master
+        reader = yield from create_multi_source_reader(
+            {"shard_1": self.database, "shard_2": self.database},
+            server_id=1024, server_ids={"shard_2": 1025}, blocking=False,
+            only_events=[WriteRowsEvent], loop=self.loop)
+        try:
+            items = []
+            while True:
+                item = yield from reader.fetchone()
+                if item is None:
+                    break
+                source, event = item
+                items.append((source, event.rows[0]["values"]["data"]))
+        finally:
+            reader.close()
+
+        self.assertEqual(items, [("shard_1", "0"), ("shard_2", "0"),
+                                 ("shard_1", "1"), ("shard_2", "1"),
+                                 ("shard_1", "2"), ("shard_2", "2")])
+        readers = reader.readers
+        self.assertIsNot(readers["shard_1"]._schema_cache,
+                         readers["shard_2"]._schema_cache)
+        self.assertEqual(reader.positions["shard_1"],
+                         reader.positions["shard_2"])
+
+    @run_until_complete
+    def test_partitioned_dispatcher(self):
+        query = "CREATE TABLE test (id INT NOT NULL, " \
+                "data VARCHAR (50) NOT NULL, PRIMARY KEY (id))"
+        yield from self.execute(query)
+        for i in range(4):
+            yield from self.execute(
+                "INSERT INTO test (id, data) VALUES(%d, 'a')" % i)
+            yield from self.execute("COMMIT")
+        for i in range(4):
+            yield from self.execute(
+                "UPDATE test SET data = 'b' WHERE id = %d" % i)
+            yield from self.execute("COMMIT")
+
+        self.stream.close()
+        self.stream = yield from create_binlog_stream(
+            self.database, server_id=1024, blocking=False, loop=self.loop)
+        dispatcher = PartitionedDispatcher(self.stream, 2, loop=self.loop)
+        dispatcher.start()
+
+        changes = {}
+
+        @asyncio.coroutine
+        def worker(partition):
+            while True:
+                item = yield from partition.fetchone()
+                if item is None:
+                    return
+                for row in item.rows:
+                    if isinstance(item.event, WriteRowsEvent):
+                        key, data = row["values"]["id"], "a"
+                    else:
+                        key = row["before_values"]["id"]
+                        data = row["after_values"]["data"]
+                    changes.setdefault(key, []).append(
+                        (partition.index, data))
+                item.ack()
+
+        yield from asyncio.gather(
+            *[worker(p) for p in dispatcher.partitions], loop=self.loop)
+        dispatcher.close()
+
+        self.assertEqual(sorted(changes), [0, 1, 2, 3])
+        for key, key_changes in changes.items():
+            # same partition, binlog order
+            self.assertEqual(len(set(p for p, _ in key_changes)), 1)
+            self.assertEqual([data for _, data in key_changes], ["a", "b"])
+        self.assertEqual(dispatcher.safe_position,
+                         (self.stream.log_file, self.stream.log_pos))
+
+    @run_until_complete
+    def test_partitioned_dispatcher_key_change(self):
+        query = "CREATE TABLE test (id INT NOT NULL, " \
+                "data VARCHAR (50) NOT NULL, PRIMARY KEY (id))"
+        yield from self.execute(query)
+        dispatcher = PartitionedDispatcher(None, 2, loop=self.loop)
+        # a row moving from the partition of key 0 to another one
+        new_key = next(key for key in range(1, 100)
+                       if dispatcher.partition_of("pymysqlreplication_test",
+                                                  "test", "id", {"id": key})
+                       != dispatcher.partition_of("pymysqlreplication_test",
+                                                  "test", "id", {"id": 0}))
+        yield from self.execute("INSERT INTO test (id, data) VALUES(0, 'a')")
+        yield from self.execute("COMMIT")
+        yield from self.execute(
+            "UPDATE test SET id = %d WHERE id = 0" % new_key)
+        yield from self.execute("COMMIT")
+        yield from self.execute(
+            "UPDATE test SET data = 'b' WHERE id = %d" % new_key)
+        yield from self.execute("COMMIT")
+
+        self.stream.close()
+        self.stream = yield from create_binlog_stream(
+            self.database, server_id=1024, blocking=False, loop=self.loop)
+        dispatcher = PartitionedDispatcher(self.stream, 2, loop=self.loop)
+        dispatcher.start()
+
+        log = []
+
+        @asyncio.coroutine
+        def worker(partition):
+            while True:
+                item = yield from partition.fetchone()
+                if item is None:
+                    return
+                log.append(("start", item.event.__class__))
+                # without barrier the last update would not wait for
+                # the key change in the slow partition
+                yield from asyncio.sleep(0.05 * (1 - partition.index),
+                                         loop=self.loop)
+                log.append(("end", item.event.__class__))
+                item.ack()
+                item.ack()
+
+        yield from asyncio.gather(
+            *[worker(p) for p in dispatcher.partitions], loop=self.loop)
+        dispatcher.close()
+
+        self.assertEqual(log, [("start", WriteRowsEvent),
+                               ("end", WriteRowsEvent),
+                               ("start", UpdateRowsEvent),
+                               ("end", UpdateRowsEvent),
+                               ("start", UpdateRowsEvent),
+                               ("end", UpdateRowsEvent)])
+        self.assertEqual(dispatcher.safe_position,
+                         (self.stream.log_file, self.stream.log_pos))
+
 
 class TestGtidBinLogStreamReader(ReplicationTestCase):
     @run_until_complete
@@ -663,13 +1250,14 @@ class TestGtidBinLogStreamReader(ReplicationTestCase):
         yield from self.execute(query)
         query = "COMMIT;"
         yield from self.execute(query)
+        query = "SELECT @@global.gtid_executed;"
+        cursor = yield from self.execute(query)
+        (gtid,) = yield from cursor.fetchone()
 
+        # the stream starts after the transactions of gtid
         query = "CREATE TABLE test2 (id INT NOT NULL, " \
                 "data VARCHAR (50) NOT NULL, PRIMARY KEY (id))"
         yield from self.execute(query)
-        query = "SELECT @@global.gtid_executed;"
-        cursor = yield from self.execute(query)
-        (gtid,) = yield from cursor.fetchone()
 
         self.stream.close()
         self.stream = yield from create_binlog_stream(
@@ -689,3 +1277,106 @@ class TestGtidBinLogStreamReader(ReplicationTestCase):
         self.assertEqual(event.query, 'CREATE TABLE test2 (id INT NOT NULL, '
                                       'data VARCHAR (50) NOT NULL, '
                                       'PRIMARY KEY (id))')
+
+    @run_until_complete
+    def test_reconnect_gtid(self):
+        query = "CREATE TABLE test (id INT NOT NULL, " \
+                "data VARCHAR (50) NOT NULL, PRIMARY KEY (id))"
+        yield from self.execute(query)
+        query = "SELECT @@global.gtid_executed;"
+        cursor = yield from self.execute(query)
+        (gtid,) = yield from cursor.fetchone()
+        yield from self.execute("INSERT INTO test VALUES(1, 'Hello')")
+        yield from self.execute("COMMIT")
+
+        self.stream.close()
+        self.stream = yield from create_binlog_stream(
+            self.database, server_id=1024, blocking=True, auto_position=gtid,
+            only_events=[WriteRowsEvent], reconnect_delay=0.01,
+            loop=self.loop)
+        event = yield from self.stream.fetchone()
+        self.assertEqual(event.rows[0]["values"]["id"], 1)
+
+        thread_id = self.stream._stream_connection.thread_id()
+        yield from self.execute("KILL %d" % thread_id)
+        yield from self.execute("INSERT INTO test VALUES(2, 'World')")
+        yield from self.execute("COMMIT")
+
+        # dumped again by GTID, without the transaction already read
+        event = yield from self.stream.fetchone()
+        self.assertEqual(event.rows[0]["values"]["id"], 2)
+        self.assertNotEqual(self.stream._stream_connection.thread_id(),
+                            thread_id)
+
+    @run_until_complete
+    def test_partitioned_dispatcher_gtid(self):
+        query = "CREATE TABLE test (id INT NOT NULL, " \
+                "data VARCHAR (50) NOT NULL, PRIMARY KEY (id))"
+        yield from self.execute(query)
+        cursor = yield from self.execute("SELECT @@global.gtid_executed;")
+        (gtid,) = yield from cursor.fetchone()
+        for i in range(4):
+            yield from self.execute(
+                "INSERT INTO test (id, data) VALUES(%d, 'a')" % i)
+            yield from self.execute("COMMIT")
+        cursor = yield from self.execute("SELECT @@global.gtid_executed;")
+        (last_gtid,) = yield from cursor.fetchone()
+
+        self.stream.close()
+        self.stream = yield from create_binlog_stream(
+            self.database, server_id=1024, blocking=False,
+            auto_position=gtid, loop=self.loop)
+        with tempfile.TemporaryDirectory() as directory:
+            store = FileCheckpointStore(os.path.join(directory, "checkpoint"))
+            checkpointer = Checkpointer(store, max_events=1, interval=60,
+                                        loop=self.loop)
+            dispatcher = PartitionedDispatcher(
+                self.stream, 2, checkpointer=checkpointer, loop=self.loop)
+            dispatcher.start()
+
+            @asyncio.coroutine
+            def worker(partition):
+                while True:
+                    item = yield from partition.fetchone()
+                    if item is None:
+                        return
+                    item.ack()
+
+            yield from asyncio.gather(
+                *[worker(p) for p in dispatcher.partitions], loop=self.loop)
+            dispatcher.close()
+            checkpoint = store.load()
+
+        self.assertEqual((checkpoint.log_file, checkpoint.log_pos),
+                         dispatcher.safe_position)
+        self.assertEqual(checkpoint.gtid_set, GtidSet(last_gtid))
+
+    @run_until_complete
+    def test_gtid_executed(self):
+        query = "CREATE TABLE test (id INT NOT NULL, " \
+                "data VARCHAR (50) NOT NULL, PRIMARY KEY (id))"
+        yield from self.execute(query)
+        query = "SELECT @@global.gtid_executed;"
+        cursor = yield from self.execute(query)
+        (gtid,) = yield from cursor.fetchone()
+
+        self.stream.close()
+        self.stream = yield from create_binlog_stream(
+            self.database, server_id=1024, blocking=True, auto_position=gtid,
+            only_events=[WriteRowsEvent], loop=self.loop)
+        self.assertEqual(str(self.stream.gtid_executed),
+                         str(GtidSet(gtid)))
+
+        yield from self.execute("INSERT INTO test VALUES(1, 'Hello')")
+        yield from self.execute("COMMIT")
+        cursor = yield from self.execute("SELECT @@global.gtid_executed;")
+        (gtid,) = yield from cursor.fetchone()
+
+        event = yield from self.stream.fetchone()
+        self.assertIsInstance(event, WriteRowsEvent)
+        # the transaction counts once its XID event is read
+        self.assertNotEqual(self.stream.gtid_executed, GtidSet(gtid))
+        yield from self.execute("INSERT INTO test VALUES(2, 'Hello')")
+        yield from self.execute("COMMIT")
+        yield from self.stream.fetchone()
+        self.assertIn(GtidSet(gtid), self.stream.gtid_executed)
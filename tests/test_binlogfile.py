@@ -0,0 +1,111 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from aiomysql_replication.binlogfile import create_binlog_file_reader
+from aiomysql_replication.event import (
+    FormatDescriptionEvent, QueryEvent, RotateEvent, XidEvent)
+from aiomysql_replication.row_event import WriteRowsEvent
+
+from .synthetic import COLUMN_SCHEMAS, BinLogBuilder
+from .test_checkpoint import _MemoryStore
+
+
+class TestBinLogFileReader(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(None)
+        self.directory = tempfile.TemporaryDirectory()
+        self.paths = []
+        # the first file has checksums, the second one not
+        for i, checksum in enumerate((True, False)):
+            builder = BinLogBuilder(checksum=checksum)
+            for j in range(3):
+                if i == 0 and j == 1:
+                    # offset of the second transaction
+                    self.second = builder.position
+                builder.transaction(10 + i, "test", [(i * 10 + j, "d")])
+            if i == 0:
+                builder.rotate("mysql-bin.000002")
+            path = os.path.join(self.directory.name,
+                                "mysql-bin.%06d" % (i + 1))
+            builder.write(path)
+            self.paths.append(path)
+        self.lookups = []
+
+    def tearDown(self):
+        self.directory.cleanup()
+        self.loop.close()
+
+    @asyncio.coroutine
+    def _table_information(self, schema, table):
+        self.lookups.append((schema, table))
+        return COLUMN_SCHEMAS
+
+    def _read(self, **kwargs):
+        @asyncio.coroutine
+        def read():
+            reader = yield from create_binlog_file_reader(
+                self.paths, table_information=self._table_information,
+                loop=self.loop, **kwargs)
+            events = []
+            while True:
+                event = yield from reader.fetchone()
+                if event is None:
+                    break
+                events.append((event, reader.log_file, reader.log_pos))
+            reader.close()
+            return events
+        return self.loop.run_until_complete(read())
+
+    def test_read_files(self):
+        events = self._read(only_events=[
+            FormatDescriptionEvent, WriteRowsEvent, XidEvent, RotateEvent])
+        self.assertEqual([type(e) for e, _, _ in events],
+                         [FormatDescriptionEvent] +
+                         [WriteRowsEvent, XidEvent] * 3 +
+                         [RotateEvent, FormatDescriptionEvent] +
+                         [WriteRowsEvent, XidEvent] * 3)
+        rows = [e.rows[0]["values"] for e, _, _ in events
+                if isinstance(e, WriteRowsEvent)]
+        self.assertEqual([r["id"] for r in rows], [0, 1, 2, 10, 11, 12])
+        self.assertEqual(rows[0]["data"], "d")
+
+        last, log_file, log_pos = events[-1]
+        self.assertEqual(log_file, "mysql-bin.000002")
+        self.assertEqual(log_pos, os.path.getsize(self.paths[1]))
+        # schema cache serves the lookups of the second file
+        self.assertEqual(self.lookups, [("test", "test")])
+
+    def test_start_position(self):
+        events = self._read(only_events=[WriteRowsEvent],
+                            log_file="mysql-bin.000001", log_pos=self.second)
+        self.assertEqual([e.rows[0]["values"]["id"] for e, _, _ in events],
+                         [1, 2, 10, 11, 12])
+
+    def test_statement_transaction_checkpoints(self):
+        builder = BinLogBuilder()
+        builder.query("BEGIN")
+        builder.query("INSERT INTO test VALUES (1, 'd')")
+        builder.query("SAVEPOINT a")
+        builder.query("COMMIT")
+        commit = builder.position
+        builder.query("CREATE TABLE other (id INT)")
+        self.paths = [os.path.join(self.directory.name, "mysql-bin.000003")]
+        builder.write(self.paths[0])
+
+        store = _MemoryStore()
+        events = self._read(only_events=[QueryEvent], checkpoint_store=store,
+                            checkpoint_events=1)
+        self.assertEqual(len(events), 5)
+        # statements inside BEGIN/COMMIT are not transaction boundaries
+        self.assertEqual([c.log_pos for c in store.saved],
+                         [commit, builder.position])
+
+    def test_not_a_binlog(self):
+        with open(self.paths[1], "wb") as f:
+            f.write(b"not a binlog")
+        with self.assertRaises(ValueError):
+            self._read()
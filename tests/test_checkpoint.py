@@ -0,0 +1,114 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from aiomysql_replication.checkpoint import (
+    Checkpoint, CheckpointStore, Checkpointer, FileCheckpointStore,
+    SQLiteCheckpointStore)
+from aiomysql_replication.gtid import GtidSet
+
+
+class _MemoryStore(CheckpointStore):
+
+    def __init__(self):
+        self.saved = []
+
+    def load(self):
+        return self.saved[-1] if self.saved else None
+
+    def save(self, checkpoint):
+        self.saved.append(checkpoint)
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(None)
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+        self.loop.close()
+
+    def _round_trip(self, store):
+        self.assertIsNone(store.load())
+        store.save(Checkpoint("mysql-bin.000001", 4))
+        checkpoint = Checkpoint(
+            "mysql-bin.000002", 120,
+            "3E11FA47-71CA-11E1-9E33-C80AA9429562:1-23")
+        store.save(checkpoint)
+        self.assertEqual(store.load(), checkpoint)
+
+    def test_file_store(self):
+        path = os.path.join(self.directory.name, "checkpoint")
+        self._round_trip(FileCheckpointStore(path))
+        self.assertEqual(FileCheckpointStore(path).load().log_pos, 120)
+        self.assertFalse(os.path.exists(path + ".tmp"))
+
+    def test_binary_file_store(self):
+        path = os.path.join(self.directory.name, "checkpoint")
+        store = FileCheckpointStore(path, binary=True)
+        self.assertIsNone(store.load())
+        checkpoint = Checkpoint(
+            "mysql-bin.000002", 120,
+            "19d69c1e-ae97-4b8c-a1ef-9e12ba966457:1-3:8-10,"
+            "3e11fa47-71ca-11e1-9e33-c80aa9429562:1-23")
+        store.save(checkpoint)
+        self.assertEqual(store.load(), checkpoint)
+        store.save(Checkpoint(None, None, checkpoint.gtid_set))
+        self.assertEqual(store.load(),
+                         Checkpoint(None, None, checkpoint.gtid_set))
+        store.save(Checkpoint("mysql-bin.000003", 4))
+        self.assertEqual(store.load(), Checkpoint("mysql-bin.000003", 4))
+
+    def test_gtid_set(self):
+        gtid_set = GtidSet("3e11fa47-71ca-11e1-9e33-c80aa9429562:1-23")
+        checkpoint = Checkpoint("mysql-bin.000001", 4, gtid_set)
+        self.assertIs(checkpoint.gtid_set, gtid_set)
+        self.assertEqual(checkpoint, Checkpoint("mysql-bin.000001", 4,
+                                                str(gtid_set)))
+        self.assertEqual(checkpoint.serializable_data()["gtid_set"],
+                         str(gtid_set))
+        loaded = Checkpoint.from_bytes(checkpoint.to_bytes())
+        self.assertIsInstance(loaded.gtid_set, GtidSet)
+        self.assertEqual(loaded.gtid_set, gtid_set)
+
+    def test_sqlite_store(self):
+        path = os.path.join(self.directory.name, "checkpoint.db")
+        store = SQLiteCheckpointStore(path)
+        self._round_trip(store)
+        store.close()
+
+        other = SQLiteCheckpointStore(path, name="other")
+        self.assertIsNone(other.load())
+        other.close()
+        store = SQLiteCheckpointStore(path)
+        self.assertEqual(store.load().log_file, "mysql-bin.000002")
+        store.close()
+
+    def test_checkpointer_batches_by_events(self):
+        store = _MemoryStore()
+        checkpointer = Checkpointer(store, max_events=3, interval=60,
+                                    loop=self.loop)
+        for pos in (100, 200):
+            checkpointer.add(Checkpoint("mysql-bin.000001", pos))
+        self.assertEqual(store.saved, [])
+        checkpointer.add(Checkpoint("mysql-bin.000001", 300))
+        self.assertEqual(store.saved, [Checkpoint("mysql-bin.000001", 300)])
+        self.assertIsNone(checkpointer.pending)
+
+        checkpointer.add(Checkpoint("mysql-bin.000001", 400))
+        checkpointer.close()
+        self.assertEqual(store.saved[-1].log_pos, 400)
+
+    def test_checkpointer_batches_by_time(self):
+        store = _MemoryStore()
+        checkpointer = Checkpointer(store, max_events=1000, interval=0.01,
+                                    loop=self.loop)
+        checkpointer.add(Checkpoint("mysql-bin.000001", 100))
+        checkpointer.add(Checkpoint("mysql-bin.000001", 200))
+        self.assertEqual(store.saved, [])
+        self.loop.run_until_complete(asyncio.sleep(0.05, loop=self.loop))
+        self.assertEqual(store.saved, [Checkpoint("mysql-bin.000001", 200)])
@@ -1,8 +1,34 @@
+import asyncio
+import os
+import tempfile
 import unittest
 
 from aiomysql_replication.column import Column
+from aiomysql_replication.consts import FieldType
 from aiomysql_replication.table import Table
 from aiomysql_replication.event import GtidEvent
+from aiomysql_replication.schema import SchemaCache, ddl_tables
+from aiomysql_replication.snapshot import (
+    Snapshot, read_snapshot, write_snapshot)
+from aiomysql_replication.transaction import Transaction
+
+
+class _MetadataPacket(object):
+    """Table map metadata bytes of a single column"""
+
+    def __init__(self, metadata):
+        self._metadata = list(metadata)
+
+    def read_uint8(self):
+        return self._metadata.pop(0)
+
+
+class _SizedEvent(object):
+    """Picklable stand in for a decoded event"""
+
+    def __init__(self, event_size, value):
+        self.event_size = event_size
+        self.value = value
 
 
 class TestDataObjects(unittest.TestCase):
@@ -65,3 +91,130 @@ class TestDataObjects(unittest.TestCase):
         self.assertIn("column_schemas", serialized)
 
         self.assertEqual(tbl, Table(**serialized))
+
+    def test_schema_cache_fingerprint(self):
+        cache = SchemaCache()
+        column_schemas = [{"COLUMN_NAME": "id"}]
+        fingerprint = SchemaCache.fingerprint([3, 15])
+        cache.set("test_schema", "test_table", fingerprint, column_schemas)
+
+        self.assertEqual(column_schemas,
+                         cache.get("test_schema", "test_table", fingerprint))
+        # ALTER TABLE changed column layout
+        self.assertIsNone(cache.get("test_schema", "test_table",
+                                    SchemaCache.fingerprint([3, 15, 3])))
+        self.assertIsNone(cache.get("test_schema", "other", fingerprint))
+
+    def test_schema_cache_ddl(self):
+        cache = SchemaCache()
+        fingerprint = SchemaCache.fingerprint([3])
+        for schema, table in [("test", "t1"), ("test", "t2"),
+                              ("other", "t1"), ("other", "t3")]:
+            cache.set(schema, table, fingerprint, [{"COLUMN_NAME": "id"}])
+
+        self.assertIsNone(ddl_tables("test", "INSERT INTO t1 VALUES (1)"))
+        # same column types, only the QueryEvent tells the name changed
+        cache.invalidate_matching(ddl_tables(
+            "test", "ALTER TABLE `t1` RENAME COLUMN id TO pk"))
+        self.assertNotIn(("test", "t1"), cache)
+        self.assertIn(("other", "t1"), cache)
+
+        cache.invalidate_matching(ddl_tables(
+            "test", "/* comment */ alter table other.T1 MODIFY id INT"))
+        self.assertNotIn(("other", "t1"), cache)
+        self.assertIn(("test", "t2"), cache)
+
+        cache.invalidate_matching(ddl_tables("", "DROP DATABASE `other`"))
+        self.assertEqual(len(cache), 1)
+        self.assertIn(("test", "t2"), cache)
+
+    def test_snapshot_round_trip(self):
+        col = Column(1,
+                     {"COLUMN_NAME": "test",
+                      "COLLATION_NAME": "utf8_general_ci",
+                      "CHARACTER_SET_NAME": "UTF8",
+                      "COLUMN_COMMENT": "",
+                      "COLUMN_TYPE": "tinyint(2)",
+                      "COLUMN_KEY": "PRI"},
+                     None)
+        tbl = Table([{"COLUMN_NAME": "test"}], 42, "test_schema",
+                    "test_table", [col])
+        cache = SchemaCache()
+        cache.set("test_schema", "test_table", SchemaCache.fingerprint([1]),
+                  [{"COLUMN_NAME": "test"}])
+        snapshot = Snapshot("mysql-bin.000003", 1024, None, {42: tbl}, cache)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "snapshot")
+            write_snapshot(path, snapshot)
+            loaded = read_snapshot(path)
+
+        self.assertEqual(loaded.log_file, "mysql-bin.000003")
+        self.assertEqual(loaded.log_pos, 1024)
+        self.assertEqual(loaded.table_map[42], tbl)
+        self.assertEqual(loaded.schema_cache.serializable_data(),
+                         cache.serializable_data())
+
+    def test_snapshot_missing_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertIsNone(read_snapshot(os.path.join(directory, "none")))
+
+    def test_schema_cache_single_flight(self):
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        cache = SchemaCache()
+        calls = []
+
+        @asyncio.coroutine
+        def fetch(schema, table):
+            calls.append((schema, table))
+            yield from asyncio.sleep(0.01, loop=loop)
+            return [{"COLUMN_NAME": "id"}]
+
+        fingerprint = SchemaCache.fingerprint([3])
+        lookups = [cache.lookup("test_schema", "test_table", fingerprint,
+                                fetch, loop=loop) for _ in range(5)]
+        results = loop.run_until_complete(
+            asyncio.gather(*lookups, loop=loop))
+
+        self.assertEqual(calls, [("test_schema", "test_table")])
+        self.assertEqual(results, [[{"COLUMN_NAME": "id"}]] * 5)
+        self.assertEqual(cache.get("test_schema", "test_table", fingerprint),
+                         [{"COLUMN_NAME": "id"}])
+
+    def test_column_derived_attributes(self):
+        col = Column(FieldType.DATETIME2,
+                     {"COLUMN_NAME": "test",
+                      "COLLATION_NAME": "utf8mb4_general_ci",
+                      "CHARACTER_SET_NAME": "utf8mb4",
+                      "COLUMN_COMMENT": "",
+                      "COLUMN_TYPE": "datetime(3)",
+                      "COLUMN_KEY": ""},
+                     _MetadataPacket([3]))
+        self.assertEqual(col.fsp, 3)
+        self.assertEqual(col.fsp_bytes, 2)
+        self.assertEqual(col.charset, "utf8")
+        self.assertNotIn("fsp_bytes", col.serializable_data())
+
+        restored = Column(**col.serializable_data())
+        self.assertEqual(restored.fsp_bytes, 2)
+        self.assertEqual(restored.charset, "utf8")
+        with self.assertRaises(AttributeError):
+            col.max_length
+
+    def test_transaction_spill(self):
+        transaction = Transaction(None, "mysql-bin.000001", 4,
+                                  max_memory_size=100)
+        transaction.append(_SizedEvent(60, 0))
+        self.assertFalse(transaction.spilled)
+        for i in range(1, 5):
+            transaction.append(_SizedEvent(60, i))
+        self.assertTrue(transaction.spilled)
+        self.assertEqual(len(transaction), 5)
+        self.assertEqual(transaction.size, 300)
+
+        # every pass reads the events back from the start
+        for _ in range(2):
+            self.assertEqual([e.value for e in transaction], list(range(5)))
+        transaction.close()
+        self.assertEqual(list(transaction), [])
@@ -0,0 +1,34 @@
+import re
+import unittest
+
+from aiomysql_replication.filters import TableFilter
+
+
+class TestTableFilter(unittest.TestCase):
+
+    def test_no_patterns(self):
+        table_filter = TableFilter()
+        self.assertTrue(table_filter.matches("test", "orders"))
+
+    def test_glob_include_exclude(self):
+        table_filter = TableFilter(include_tables=["orders_*"],
+                                   exclude_tables=["orders_archive*"])
+        self.assertTrue(table_filter.matches("test", "orders_1"))
+        self.assertTrue(table_filter.matches("test", "orders_eu"))
+        self.assertFalse(table_filter.matches("test", "orders_archive_1"))
+        self.assertFalse(table_filter.matches("test", "customers"))
+
+    def test_regex_patterns(self):
+        table_filter = TableFilter(include_tables=re.compile(r"shard_\d+$"),
+                                   exclude_schemas=["tmp_*"])
+        self.assertTrue(table_filter.matches("test", "shard_12"))
+        self.assertFalse(table_filter.matches("test", "shard_x"))
+        self.assertFalse(table_filter.matches("tmp_load", "shard_12"))
+
+    def test_from_names_is_exact(self):
+        table_filter = TableFilter.from_names(["test_2"], ["db"])
+        self.assertTrue(table_filter.matches("db", "test_2"))
+        self.assertFalse(table_filter.matches("db", "test_22"))
+        self.assertFalse(table_filter.matches("db2", "test_2"))
+        table_filter = TableFilter.from_names(only_tables=["test_*"])
+        self.assertFalse(table_filter.matches("db", "test_2"))
@@ -0,0 +1,91 @@
+import unittest
+
+from aiomysql_replication.gtid import Gtid, GtidSet
+
+
+SID = "3e11fa47-71ca-11e1-9e33-c80aa9429562"
+OTHER_SID = "19d69c1e-ae97-4b8c-a1ef-9e12ba966457"
+
+
+class TestGtidSet(unittest.TestCase):
+
+    def test_parse(self):
+        gtid = Gtid(SID.upper() + ":5-7:1-3:4:10")
+        self.assertEqual(gtid.sid, SID)
+        self.assertEqual(gtid.intervals, [(1, 8), (10, 11)])
+        self.assertEqual(str(gtid), SID + ":1-7:10")
+        for text in (SID, SID + ":", SID + ":3-1", SID + ":1-",
+                     SID + ":-1", SID + ":1a", SID[:-1] + "g:1",
+                     SID.replace("-", "") + ":1", "abc:1"):
+            with self.assertRaises(ValueError):
+                Gtid(text)
+
+    def test_add(self):
+        gtid = Gtid(sid=SID)
+        for gno in (1, 2, 3, 7, 5, 6, 10):
+            gtid.add(gno)
+        self.assertEqual(gtid.intervals, [(1, 4), (5, 8), (10, 11)])
+        gtid.add_interval(3, 12)
+        self.assertEqual(gtid.intervals, [(1, 12)])
+        gtid.add_interval(14, 20)
+        gtid.add_interval(0, 1)
+        self.assertEqual(gtid.intervals, [(0, 12), (14, 20)])
+        self.assertIn(11, gtid)
+        self.assertNotIn(12, gtid)
+        self.assertIn(14, gtid)
+        self.assertNotIn(20, gtid)
+        self.assertEqual(len(gtid), 18)
+
+    def test_set_algebra(self):
+        gtid_set = GtidSet("%s:1-3:5:9-10,%s:4" % (SID, OTHER_SID))
+        gtid_set.add(SID + ":4")
+        self.assertEqual(str(gtid_set),
+                         "%s:4,%s:1-5:9-10" % (OTHER_SID, SID))
+        self.assertIn(SID + ":10", gtid_set)
+        self.assertNotIn(SID + ":6", gtid_set)
+        self.assertNotIn(OTHER_SID + ":1", gtid_set)
+
+        other = GtidSet(SID + ":2-9")
+        self.assertEqual(str(gtid_set - other),
+                         "%s:4,%s:1:10" % (OTHER_SID, SID))
+        self.assertEqual(str(other - gtid_set), SID + ":6-8")
+        self.assertEqual(str(gtid_set | other),
+                         "%s:4,%s:1-10" % (OTHER_SID, SID))
+        self.assertIn(GtidSet(SID + ":2-5"), gtid_set)
+        self.assertNotIn(other, gtid_set)
+        self.assertEqual(gtid_set - gtid_set, GtidSet())
+        self.assertFalse(GtidSet(""))
+
+    def test_encoded(self):
+        gtid_set = GtidSet(SID + ":1-3:5")
+        encoded = gtid_set.encoded()
+        self.assertEqual(len(encoded), gtid_set.encoded_length)
+        # stop positions are excluded
+        self.assertEqual(encoded[-32:],
+                         b"\x01" + b"\0" * 7 + b"\x04" + b"\0" * 7 +
+                         b"\x05" + b"\0" * 7 + b"\x06" + b"\0" * 7)
+
+    def test_decode(self):
+        gtid_set = GtidSet("%s:1-3:5:9-10,%s:4" % (SID, OTHER_SID))
+        encoded = gtid_set.encoded()
+        self.assertEqual(GtidSet.decode(encoded), gtid_set)
+        self.assertEqual(str(GtidSet.decode(encoded)), str(gtid_set))
+        self.assertEqual(GtidSet.decode(GtidSet().encoded()), GtidSet())
+        for data in (encoded[:-1], encoded + b"\0", encoded[:5]):
+            with self.assertRaises(ValueError):
+                GtidSet.decode(data)
+
+    def test_decode_reencodes(self):
+        # sids out of order are encoded sorted again
+        data = (b"\x02" + b"\0" * 7 + GtidSet(SID + ":1").encoded()[8:] +
+                GtidSet(OTHER_SID + ":2").encoded()[8:])
+        gtid_set = GtidSet.decode(data)
+        self.assertEqual(gtid_set.encoded(),
+                         GtidSet("%s:1,%s:2" % (SID, OTHER_SID)).encoded())
+        # an added transaction drops the cached form
+        gtid_set.add(SID + ":2")
+        self.assertEqual(gtid_set.encoded(),
+                         GtidSet("%s:1-2,%s:2" % (SID, OTHER_SID)).encoded())
+        copy = GtidSet(gtid_set)
+        gtid_set.add(SID + ":3")
+        self.assertEqual(str(copy), "%s:2,%s:1-2" % (OTHER_SID, SID))
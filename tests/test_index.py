@@ -0,0 +1,94 @@
+import os
+import tempfile
+import unittest
+
+from aiomysql_replication.index import (
+    INDEX_SUFFIX, BinLogIndex, BinLogIndexes, index_binlog, load_index)
+
+from .synthetic import BinLogBuilder
+
+
+SID = "3e11fa47-71ca-11e1-9e33-c80aa9429562"
+
+
+class TestBinLogIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.paths = []
+        self.offsets = []
+        gno = 1
+        for i, table in enumerate(("orders", "users")):
+            builder = BinLogBuilder()
+            for j in range(3):
+                self.offsets.append(builder.position)
+                builder.transaction(10 + i, table, [(j, "d")],
+                                    gtid=(SID, gno),
+                                    timestamp=1000 + 10 * gno)
+                gno += 1
+            builder.query("CREATE TABLE t (id INT)", timestamp=2000)
+            path = os.path.join(self.directory.name,
+                                "mysql-bin.%06d" % (i + 1))
+            builder.write(path)
+            self.paths.append(path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_index(self):
+        index = index_binlog(self.paths[0])
+        self.assertEqual(index.log_file, "mysql-bin.000001")
+        self.assertEqual(len(index.entries), 4)
+        entry = index.entries[1]
+        self.assertEqual(entry.offset, self.offsets[1])
+        self.assertEqual(entry.end, self.offsets[2])
+        self.assertEqual(entry.timestamp, 1020)
+        self.assertEqual(entry.gtid, SID + ":2")
+        self.assertEqual(entry.table_ids, [10])
+        # the DDL statement is a transaction of its own
+        self.assertEqual(index.entries[3].table_ids, [])
+        self.assertEqual(index.entries[3].gtid, None)
+        self.assertEqual(index.indexed_size,
+                         os.path.getsize(self.paths[0]))
+        self.assertEqual(index.tables, {10: ("test", "orders")})
+
+    def test_lookups(self):
+        indexes = BinLogIndexes.load(self.paths)
+        self.assertEqual(indexes.find_timestamp(1015),
+                         ("mysql-bin.000001", self.offsets[1]))
+        # the DDL statement at 2000
+        self.assertEqual(indexes.find_timestamp(1040),
+                         ("mysql-bin.000001",
+                          indexes.indexes[0].entries[3].offset))
+        self.assertIsNone(indexes.find_timestamp(3000))
+        log_file, entry = indexes.find_gtid(SID.upper() + ":5")
+        self.assertEqual((log_file, entry.offset),
+                         ("mysql-bin.000002", self.offsets[4]))
+        self.assertIsNone(indexes.find_gtid(SID + ":7"))
+        self.assertEqual(indexes.files_touching("test", "users"),
+                         ["mysql-bin.000002"])
+        self.assertEqual(indexes.files_touching("test", "t"), [])
+
+    def test_sidecar(self):
+        path = self.paths[0]
+        index = load_index(path)
+        self.assertTrue(os.path.exists(path + INDEX_SUFFIX))
+        stored = BinLogIndex.read(path + INDEX_SUFFIX)
+        self.assertEqual(stored.entries, index.entries)
+        self.assertEqual(stored.tables, index.tables)
+
+        # a transaction being written is indexed once complete
+        builder = BinLogBuilder()
+        builder.transaction(12, "items", [(1, "d")], timestamp=3000)
+        tail = b"".join(builder.events[1:])
+        with open(path, "ab") as f:
+            f.write(tail[:-10])
+        index = load_index(path)
+        self.assertEqual(len(index.entries), 4)
+        with open(path, "ab") as f:
+            f.write(tail[-10:])
+        index = load_index(path)
+        self.assertEqual(len(index.entries), 5)
+        self.assertEqual(index.entries[-1].timestamp, 3000)
+        self.assertTrue(index.touches("test", "items"))
+        self.assertEqual(index.entries, index_binlog(path).entries)
@@ -0,0 +1,237 @@
+import asyncio
+import json
+import os
+import struct
+import tempfile
+import time
+import unittest
+
+from aiomysql_replication.consts import BinLog
+from aiomysql_replication.row_event import WriteRowsEvent
+from aiomysql_replication.spool import Spool, create_spool_reader
+
+from .synthetic import BinLogBuilder, table_information
+
+
+def _log_pos(event):
+    return struct.unpack_from('<I', event, 13)[0]
+
+
+class TestSpool(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(None)
+        self.directory = tempfile.TemporaryDirectory()
+        self.builders = []
+        for i in range(2):
+            builder = BinLogBuilder()
+            for j in range(3):
+                builder.transaction(10 + i, "test", [(i * 10 + j, "d")])
+            if i == 0:
+                builder.rotate("mysql-bin.000002")
+            self.builders.append(builder)
+        # events of a dump of both files
+        self.stream = (self.builders[0].dump_start("mysql-bin.000001", 4) +
+                       self.builders[0].events + self.builders[1].events)
+
+    def tearDown(self):
+        self.directory.cleanup()
+        self.loop.close()
+
+    def _read(self, spool, **kwargs):
+        @asyncio.coroutine
+        def read():
+            reader = yield from create_spool_reader(
+                spool, table_information=table_information,
+                only_events=[WriteRowsEvent], loop=self.loop, **kwargs)
+            ids = []
+            while True:
+                event = yield from reader.fetchone()
+                if event is None:
+                    break
+                ids.append(event.rows[0]["values"]["id"])
+            reader.close()
+            return ids, reader.log_file, reader.log_pos
+        return self.loop.run_until_complete(read())
+
+    def test_replay(self):
+        spool = Spool(self.directory.name, segment_size=400)
+        for event in self.stream:
+            spool.append(event)
+        spool.close()
+        self.assertGreater(len(spool.segment_paths()), 2)
+
+        spool = Spool(self.directory.name)
+        ids, log_file, log_pos = self._read(spool)
+        self.assertEqual(ids, [0, 1, 2, 10, 11, 12])
+        self.assertEqual(log_file, "mysql-bin.000002")
+        self.assertEqual(log_pos, self.builders[1].position)
+
+        # end of the first transaction of the second file
+        boundary = _log_pos(self.builders[1].events[4])
+        ids, _, _ = self._read(spool, log_file="mysql-bin.000002",
+                               log_pos=boundary)
+        self.assertEqual(ids, [11, 12])
+        with self.assertRaises(ValueError):
+            spool.locate("mysql-bin.000002", boundary + 1)
+
+    def test_compression(self):
+        boundary = _log_pos(self.builders[1].events[4])
+        for compression in ("zlib", "lzma"):
+            with self.subTest(compression=compression):
+                directory = os.path.join(self.directory.name, compression)
+                spool = Spool(directory, segment_size=1000,
+                              compression=compression, block_size=200)
+                for event in self.stream:
+                    spool.append(event)
+                spool.close()
+                # bytes written after the last flush of a crashed spool
+                with open(spool.segment_paths()[-1], "ab") as f:
+                    f.write(b"\0" * 10)
+
+                spool = Spool(directory)
+                ids, _, log_pos = self._read(spool)
+                self.assertEqual(ids, [0, 1, 2, 10, 11, 12])
+                self.assertEqual(log_pos, self.builders[1].position)
+                ids, _, _ = self._read(spool, log_file="mysql-bin.000002",
+                                       log_pos=boundary)
+                self.assertEqual(ids, [11, 12])
+
+    def test_compression_tail(self):
+        spool = Spool(self.directory.name, compression="zlib",
+                      block_size=64 * 1024, flush_interval=0)
+        for event in self.stream:
+            spool.append(event)
+        path = spool.segment_paths()[-1]
+        # every event was flushed without cutting a block
+        self.assertEqual(os.path.getsize(path + ".blocks"), 4)
+        ids, _, _ = self._read(spool)
+        self.assertEqual(ids, [0, 1, 2, 10, 11, 12])
+        # a crashed spool is read from the tail
+        ids, _, _ = self._read(Spool(self.directory.name))
+        self.assertEqual(ids, [0, 1, 2, 10, 11, 12])
+
+        spool.close()
+        self.assertEqual(os.path.getsize(path + ".blocks"), 4 + 16)
+        self.assertFalse(os.path.exists(path + ".tail"))
+        ids, _, _ = self._read(Spool(self.directory.name))
+        self.assertEqual(ids, [0, 1, 2, 10, 11, 12])
+
+    def test_heartbeat_flush(self):
+        spool = Spool(self.directory.name, flush_interval=0.2)
+        for event in self.stream:
+            spool.append(event)
+        time.sleep(0.25)
+        # a heartbeat of the idle master flushes the events written
+        spool.append(self.builders[1]._build(
+            BinLog.HEARTBEAT_LOG_EVENT, b"mysql-bin.000002", 0,
+            self.builders[1].position))
+        ids, _, _ = self._read(Spool(self.directory.name))
+        self.assertEqual(ids, [0, 1, 2, 10, 11, 12])
+        spool.close()
+
+    def _crashed_spool(self, block_size):
+        """Return the compressed spool, never closed, its index entries and
+        the ends of its blocks"""
+        spool = Spool(self.directory.name, compression="zlib",
+                      block_size=block_size, flush_interval=0)
+        for event in self.stream:
+            spool.append(event)
+        path = spool.segment_paths()[-1]
+        with open(path + ".index") as f:
+            entries = [json.loads(line) for line in f]
+        with open(path + ".blocks", "rb") as f:
+            data = f.read()
+        blocks = [end for end, _ in struct.iter_unpack("<QQ", data[4:])]
+        return spool, entries, blocks
+
+    def _lose_index(self, spool, entries, entry):
+        # the index lines after entry were not written before the crash
+        with open(spool.segment_paths()[-1] + ".index", "w") as f:
+            for line in entries[:entries.index(entry) + 1]:
+                f.write(json.dumps(line) + "\n")
+
+    def _indexed_ids(self, entry):
+        # transactions ending at or before the index entry
+        ids = []
+        for i, builder in enumerate(self.builders):
+            for j in range(3):
+                end = ("mysql-bin.%06d" % (i + 1),
+                       _log_pos(builder.events[4 + 4 * j]))
+                if end <= tuple(entry[:2]):
+                    ids.append(i * 10 + j)
+        return ids
+
+    def test_crash_tail(self):
+        spool, entries, blocks = self._crashed_spool(64 * 1024)
+        self.assertEqual(blocks, [])
+        entry = entries[-3]
+        self._lose_index(spool, entries, entry)
+
+        ids, _, log_pos = self._read(Spool(self.directory.name))
+        self.assertEqual(ids, [0, 1, 2, 10])
+        self.assertEqual(ids, self._indexed_ids(entry))
+        self.assertEqual(log_pos, entry[1])
+        spool.close()
+
+    def test_crash_cut_block(self):
+        spool, entries, blocks = self._crashed_spool(200)
+        # the last entry indexed is inside the last block listed, whose
+        # events were dropped from the tail when it was cut
+        inside = [e for e in entries if blocks[-2] < e[2] < blocks[-1]]
+        self.assertTrue(inside)
+        entry = inside[-1]
+        self._lose_index(spool, entries, entry)
+
+        ids, _, log_pos = self._read(Spool(self.directory.name))
+        self.assertEqual(ids, self._indexed_ids(entry))
+        self.assertEqual(log_pos, entry[1])
+        spool.close()
+
+    def test_reconnect(self):
+        events = self.builders[0].events
+        boundary = _log_pos(events[4])
+        # the dump is lost inside the second transaction and starts again
+        # from the end of the first one
+        stream = (self.stream[:7] +
+                  self.builders[0].dump_start("mysql-bin.000001", boundary) +
+                  self.stream[6:])
+        spool = Spool(self.directory.name)
+        for event in stream:
+            spool.append(event)
+        spool.close()
+        ids, _, _ = self._read(spool)
+        self.assertEqual(ids, [0, 1, 2, 10, 11, 12])
+
+    def test_retention(self):
+        spool = Spool(self.directory.name, segment_size=1, max_bytes=1000)
+        for event in self.stream:
+            spool.append(event)
+        spool.close()
+        paths = spool.segment_paths()
+        # index files count too
+        self.assertLessEqual(sum(
+            os.path.getsize(os.path.join(self.directory.name, name))
+            for name in os.listdir(self.directory.name)), 1000)
+        self.assertEqual(sorted(name for name in os.listdir(
+            self.directory.name) if not name.endswith(".index")),
+            [os.path.basename(path) for path in paths])
+
+        ids, _, _ = self._read(spool)
+        self.assertTrue(ids)
+        self.assertEqual(ids, [0, 1, 2, 10, 11, 12][-len(ids):])
+        with self.assertRaises(ValueError):
+            spool.locate("mysql-bin.000001", _log_pos(
+                self.builders[0].events[4]))
+
+    def test_retention_age(self):
+        spool = Spool(self.directory.name, segment_size=500, max_age=0.1)
+        for event in self.stream:
+            spool.append(event)
+        self.assertGreater(len(spool.segment_paths()), 2)
+        time.sleep(0.15)
+        # no segment closes, the flush expires the old ones
+        spool.flush()
+        self.assertEqual(len(spool.segment_paths()), 1)
+        spool.close()